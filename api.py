@@ -0,0 +1,223 @@
+"""
+API en mémoire : traiter une image sans passer par des fichiers ni par argparse.
+
+    from api import JobSettings, process, process_bytes
+
+    result = process(pil_image, JobSettings(mode=3, lpi=50, hdpi=720, vdpi=360), mire=template)
+    result.image()                      # PIL.Image, dpi et profil ICC conservés
+    data, meta = process_bytes(upload_bytes, JobSettings(mode=2), format="TIFF")
+
+La source peut être une image PIL, le contenu d'un fichier (bytes) ou un tableau
+numpy (H, W[, canaux]). Le template de mire peut être une image PIL ou un chemin ;
+TEMPLATES_DIR n'est consulté que si aucun n'est fourni.
+"""
+import io
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from center_padding import compute_padding
+from colors import NATIVE_MODES, array_mode
+from debug_artifacts import DebugArtifacts
+from models import Layout, PrintSettings
+from pipeline import PipelineContext
+from profiling import StageProfiler
+from templates import find_mire
+from writer import WriteOptions
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobSettings:
+    """Réglages d'un traitement, équivalents des options de la ligne de commande."""
+    mode: int = 1
+    lpi: float = 50.0
+    hdpi: int = 720
+    vdpi: int = 360
+    bord_mire: float = 4.0
+    cadre: int = 4
+    trait_noir_mm: float = 1.0
+    write: WriteOptions = field(default_factory=WriteOptions)
+
+    @classmethod
+    def from_args(cls, args, write: WriteOptions = WriteOptions()) -> "JobSettings":
+        return cls(
+            mode=args.mode, lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI, bord_mire=args.bord_mire,
+            cadre=args.cadre, trait_noir_mm=args.trait_noir_mm, write=write,
+        )
+
+    @property
+    def print_settings(self) -> PrintSettings:
+        return PrintSettings(lpi=self.lpi, hdpi=self.hdpi, vdpi=self.vdpi)
+
+    @property
+    def layout(self) -> Layout:
+        """Géométrie en pixels de ces réglages, partagée par tous les jobs identiques."""
+        return self.print_settings.layout(self.cadre, self.bord_mire, self.trait_noir_mm)
+
+    def mire(self, mire: Image.Image | Path | str | None = None) -> Image.Image | Path:
+        """Template à utiliser : celui fourni, sinon celui de TEMPLATES_DIR pour ces réglages."""
+        if mire is None:
+            return find_mire(self.lpi, self.hdpi, self.vdpi)
+        return mire if isinstance(mire, Image.Image) else Path(mire)
+
+
+@dataclass
+class Result:
+    """Image traitée (buffer dans son mode natif, dpi, profil ICC) et métadonnées du traitement."""
+    context: PipelineContext
+    metadata: dict
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.context.arr
+
+    def image(self) -> Image.Image:
+        """Image PIL du résultat ; dpi et profil ICC dans `info`, comme à l'ouverture d'un fichier."""
+        img = self.context.to_image()
+        img.info["dpi"] = self.context.dpi
+        if self.context.icc_profile:
+            img.info["icc_profile"] = self.context.icc_profile
+        return img
+
+    def to_bytes(self, format: str = "PNG", options: WriteOptions | None = None) -> bytes:
+        """
+        Résultat encodé : PNG et TIFF par les writers en flux (tous les modes, sauf
+        CMYK en PNG) ; les autres formats par Pillow, s'il accepte le mode du
+        résultat. Un résultat RGBA est posé sur papier blanc pour JPEG.
+        """
+        buffer = io.BytesIO()
+        self.context.save(buffer, options or WriteOptions(), format=format)
+        return buffer.getvalue()
+
+
+def load(
+    source: Image.Image | bytes | bytearray | memoryview | np.ndarray,
+    settings: PrintSettings,
+    mode: str | None = None,
+    copy: bool = False,
+) -> PipelineContext:
+    """
+    Contexte de traitement pour une source en mémoire. Un tableau numpy est utilisé
+    sans conversion (mode déduit du nombre de canaux, `mode="CMYK"` pour du CMYK) ;
+    `copy=True` le protège des modifications en place du Mode 2.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with Image.open(io.BytesIO(source)) as img:
+            return PipelineContext.from_image(img, settings)
+    if isinstance(source, Image.Image):
+        return PipelineContext.from_image(source, settings)
+    if isinstance(source, np.ndarray):
+        arr = source[..., None] if source.ndim == 2 else source
+        mode = mode or array_mode(arr)
+        if arr.dtype != np.uint8 or mode not in NATIVE_MODES:
+            raise ValueError(f"Tableau {arr.dtype} {mode} non géré (uint8 en {', '.join(NATIVE_MODES)})")
+        arr = arr.copy() if copy else arr
+        return PipelineContext(arr=arr, settings=settings, dpi=(settings.hdpi, settings.vdpi), mode=mode)
+    raise TypeError(f"Source non gérée : {type(source).__name__} (PIL.Image, bytes ou numpy.ndarray)")
+
+
+def render(
+    ctx: PipelineContext,
+    job: JobSettings,
+    mire: Image.Image | Path | None,
+    profiler: StageProfiler | None = None,
+    debug: DebugArtifacts | None = None,
+    dump_edits: Path | None = None,
+) -> dict:
+    """
+    Applique le mode de `job` au buffer de `ctx` (remplacé par le résultat) et
+    retourne les métadonnées du traitement. Le centrage n'est qu'un décalage
+    (pad_left, pad_right) : le padding n'est ajouté qu'une fois, dans le buffer
+    de sortie de chaque mode. `dump_edits` : fichier JSON de la liste d'édition.
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+    debug = debug or DebugArtifacts(Path("."), "", enabled=False)
+    settings = ctx.settings
+    input_size = [ctx.width, ctx.height]
+
+    # Mode 3 : le centrage est calculé avec le reste du plan (mode3.plan_mode3),
+    # il n'est recalculé ici que pour les aperçus --debug.
+    pad_left = pad_right = None
+    if job.mode != 3 or debug.enabled:
+        with profiler.stage("center_padding") as rec:
+            pad_left, pad_right = compute_padding(ctx.reader(), settings)
+            rec["pad"] = [pad_left, pad_right]
+    # Le Mode 2 sans padding modifie le buffer source en place : ses aperçus
+    # sont réduits avant, seul l'encodage passe en arrière-plan.
+    if debug.enabled:
+        with profiler.stage("debug"):
+            debug.inputs(ctx.reader(), settings, job.cadre, pad_left, pad_right, stable=job.mode != 2)
+
+    logger.info(f"Mode {job.mode}")
+    with profiler.stage(f"mode{job.mode}") as rec:
+        # Seul le module du mode demandé est chargé (démarrage de la ligne de commande)
+        if job.mode == 1:
+            from mode1 import apply_mode1
+            ctx.arr = apply_mode1(
+                ctx.reader(), mire, settings, bord_mire_mm=job.bord_mire,
+                pad_left=pad_left, pad_right=pad_right, dump_edits=dump_edits,
+            )
+        elif job.mode == 2:
+            from mode2 import apply_mode2
+            ctx.arr = apply_mode2(
+                ctx.reader(), settings, cadre_mm=job.cadre, trait_noir_mm=job.trait_noir_mm,
+                pad_left=pad_left, pad_right=pad_right, dump_edits=dump_edits,
+            )
+        elif job.mode == 3:
+            from mode3 import apply_mode3
+            ctx.arr = apply_mode3(
+                ctx.reader(), mire, settings,
+                cadre_mm=job.cadre, trait_noir_mm=job.trait_noir_mm, bord_mire_mm=job.bord_mire,
+                dump_edits=dump_edits,
+            )
+        else:
+            raise ValueError(f"Mode inconnu : {job.mode} (1, 2 ou 3)")
+        ctx.digest = None           # le buffer est maintenant la sortie, plus la source
+        rec["size"] = [ctx.width, ctx.height]
+
+    metadata = {
+        "mode": job.mode,
+        "image_mode": ctx.mode,
+        "input_size": input_size,
+        "output_size": [ctx.width, ctx.height],
+        "dpi": list(ctx.dpi),
+        "icc_profile": ctx.icc_profile is not None,
+    }
+    if pad_left is not None:
+        metadata["pad"] = [pad_left, pad_right]
+    return metadata
+
+
+def process(
+    source: Image.Image | bytes | bytearray | memoryview | np.ndarray,
+    job: JobSettings = JobSettings(),
+    mire: Image.Image | Path | str | None = None,
+    mode: str | None = None,
+) -> Result:
+    """
+    Traite une image en mémoire et retourne le résultat. La source n'est jamais
+    modifiée (un tableau numpy n'est copié que pour le Mode 2, qui travaille en place).
+    Un template donné par son chemin profite du cache des mires ; le Mode 2 n'en utilise pas.
+    """
+    Image.MAX_IMAGE_PIXELS = None
+    ctx = load(source, job.print_settings, mode=mode, copy=job.mode == 2)
+    metadata = render(ctx, job, job.mire(mire) if job.mode != 2 else None)
+    return Result(ctx, metadata)
+
+
+def process_bytes(
+    source: Image.Image | bytes | bytearray | memoryview | np.ndarray,
+    job: JobSettings = JobSettings(),
+    mire: Image.Image | Path | str | None = None,
+    format: str = "PNG",
+    mode: str | None = None,
+) -> tuple[bytes, dict]:
+    """Comme process(), avec le résultat encodé dans `format` (voir Result.to_bytes)."""
+    result = process(source, job, mire, mode)
+    data = result.to_bytes(format, job.write)
+    return data, {**result.metadata, "format": format.upper(), "bytes": len(data)}
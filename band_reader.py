@@ -0,0 +1,551 @@
+import io
+import logging
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from colors import array_mode, image_array, mode_color, native_mode
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# Tags TIFF utilisés pour relire un strip/tuile isolé
+# ─────────────────────────────────────────────
+
+TAG_WIDTH           = 256
+TAG_HEIGHT          = 257
+TAG_BITS            = 258
+TAG_COMPRESSION     = 259
+TAG_PHOTOMETRIC     = 262
+TAG_STRIP_OFFSETS   = 273
+TAG_SAMPLES         = 277
+TAG_ROWS_PER_STRIP  = 278
+TAG_STRIP_COUNTS    = 279
+TAG_PLANAR          = 284
+TAG_PREDICTOR       = 317
+TAG_TILE_WIDTH      = 322
+TAG_TILE_LENGTH     = 323
+TAG_TILE_OFFSETS    = 324
+TAG_TILE_COUNTS     = 325
+TAG_EXTRA_SAMPLES   = 338
+TAG_SAMPLE_FORMAT   = 339
+TAG_JPEG_TABLES     = 347
+TAG_YCBCR_SUBSAMPLE = 530
+
+# Tags recopiés tels quels dans le mini-TIFF d'un chunk : (tag, type TIFF)
+_COPIED_TAGS = [
+    (TAG_BITS,            3),
+    (TAG_COMPRESSION,     3),
+    (TAG_PHOTOMETRIC,     3),
+    (TAG_SAMPLES,         3),
+    (TAG_PLANAR,          3),
+    (TAG_PREDICTOR,       3),
+    (TAG_EXTRA_SAMPLES,   3),
+    (TAG_SAMPLE_FORMAT,   3),
+    (TAG_JPEG_TABLES,     7),
+    (TAG_YCBCR_SUBSAMPLE, 3),
+]
+
+
+def _as_tuple(value) -> tuple:
+    return tuple(value) if isinstance(value, (tuple, list)) else (value,)
+
+
+def wrap_tiff_chunk(tags: dict, width: int, height: int, data: bytes) -> bytes:
+    """
+    Construit un TIFF minimal (little-endian, une seule bande) contenant un
+    strip ou une tuile compressé(e) tel quel, pour le faire décoder par Pillow/libtiff
+    sans relire le reste du fichier.
+    """
+    entries = [
+        (TAG_WIDTH,          4, (width,)),
+        (TAG_HEIGHT,         4, (height,)),
+        (TAG_ROWS_PER_STRIP, 4, (height,)),
+        (TAG_STRIP_COUNTS,   4, (len(data),)),
+        (TAG_STRIP_OFFSETS,  4, (0,)),        # corrigé une fois la taille de l'IFD connue
+    ]
+    for tag, typ in _COPIED_TAGS:
+        if tag in tags:
+            value = tags[tag]
+            entries.append((tag, typ, value if typ == 7 else _as_tuple(value)))
+    entries.sort(key=lambda e: e[0])
+
+    sizes = {3: 2, 4: 4, 7: 1}
+    ifd_offset = 8
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra = bytearray()
+    extra_base = ifd_offset + ifd_size
+
+    def encode(typ, value):
+        if typ == 7:
+            return bytes(value)
+        fmt = "<" + ("H" if typ == 3 else "I") * len(value)
+        return struct.pack(fmt, *value)
+
+    # Les données hors IFD (valeurs > 4 octets) puis le chunk compressé
+    payloads = {}
+    for tag, typ, value in entries:
+        raw = encode(typ, value)
+        if len(raw) > 4:
+            payloads[tag] = extra_base + len(extra)
+            extra += raw
+            if len(extra) % 2:
+                extra += b"\0"
+    data_offset = extra_base + len(extra)
+
+    ifd = bytearray(struct.pack("<H", len(entries)))
+    for tag, typ, value in entries:
+        if tag == TAG_STRIP_OFFSETS:
+            value = (data_offset,)
+        raw = encode(typ, value)
+        count = len(raw) // sizes[typ]
+        field = struct.pack("<I", payloads[tag]) if tag in payloads else raw.ljust(4, b"\0")
+        ifd += struct.pack("<HHI", tag, typ, count) + field
+    ifd += struct.pack("<I", 0)
+
+    return b"II*\0" + struct.pack("<I", ifd_offset) + bytes(ifd) + bytes(extra) + data
+
+
+class TiffChunks:
+    """
+    Table des strips/tuiles d'un TIFF 8 bits entrelacé (PlanarConfig=1).
+    Sert à la lecture par bandes et à la réécriture incrémentale (tiff_rewrite.py).
+    """
+
+    def __init__(self, img: Image.Image, path: Path):
+        tags = img.tag_v2
+        bits = _as_tuple(tags.get(TAG_BITS, 1))
+        if any(b != 8 for b in bits) or tags.get(TAG_PLANAR, 1) != 1:
+            raise ValueError("TIFF non supporté pour la lecture par bandes")
+
+        self.path = path
+        self.tags = {tag: tags[tag] for tag, _ in _COPIED_TAGS if tag in tags}
+        self.mode = img.mode            # mode PIL des chunks décodés
+        self.width, self.height = img.size
+        self.tiled = TAG_TILE_OFFSETS in tags
+        if self.tiled:
+            self.chunk_w = int(tags[TAG_TILE_WIDTH])
+            self.chunk_h = int(tags[TAG_TILE_LENGTH])
+            self.offsets = _as_tuple(tags[TAG_TILE_OFFSETS])
+            self.counts  = _as_tuple(tags[TAG_TILE_COUNTS])
+        else:
+            self.chunk_w = self.width
+            self.chunk_h = min(int(tags.get(TAG_ROWS_PER_STRIP, self.height)), self.height)
+            self.offsets = _as_tuple(tags[TAG_STRIP_OFFSETS])
+            self.counts  = _as_tuple(tags[TAG_STRIP_COUNTS])
+        self.tiles_across = -(-self.width // self.chunk_w)
+
+    def chunk_box(self, index: int) -> tuple[int, int, int, int]:
+        """Rectangle (x0, y0, x1, y1) couvert par le chunk, borné à l'image."""
+        tx, ty = index % self.tiles_across, index // self.tiles_across
+        x0, y0 = tx * self.chunk_w, ty * self.chunk_h
+        return x0, y0, min(x0 + self.chunk_w, self.width), min(y0 + self.chunk_h, self.height)
+
+    def chunks_in(self, x0: int, y0: int, x1: int, y1: int) -> list[int]:
+        """Indices des chunks qui intersectent le rectangle demandé."""
+        cols = range(x0 // self.chunk_w, -(-x1 // self.chunk_w))
+        rows = range(y0 // self.chunk_h, -(-y1 // self.chunk_h))
+        return [ty * self.tiles_across + tx for ty in rows for tx in cols]
+
+    def read_raw(self, fh, index: int) -> bytes:
+        fh.seek(self.offsets[index])
+        return fh.read(self.counts[index])
+
+    def decode(self, index: int, data: bytes) -> Image.Image:
+        """Décode un chunk isolé et le recadre à la partie dans l'image."""
+        x0, y0, x1, y1 = self.chunk_box(index)
+        # Un strip en fin d'image est plus court ; une tuile garde sa taille nominale
+        rows = self.chunk_h if self.chunk_w != self.width else y1 - y0
+        mini = wrap_tiff_chunk(self.tags, self.chunk_w, rows, data)
+        with Image.open(io.BytesIO(mini)) as chunk:
+            chunk.load()
+            return chunk.crop((0, 0, x1 - x0, y1 - y0))
+
+    def region(self, x0: int, y0: int, x1: int, y1: int) -> Image.Image:
+        """Assemble le rectangle demandé en ne décodant que les chunks concernés."""
+        out = None
+        with open(self.path, "rb") as fh:
+            for index in self.chunks_in(x0, y0, x1, y1):
+                chunk = self.decode(index, self.read_raw(fh, index))
+                if out is None:
+                    out = Image.new(chunk.mode, (x1 - x0, y1 - y0))
+                cx0, cy0, _, _ = self.chunk_box(index)
+                out.paste(chunk, (cx0 - x0, cy0 - y0))
+        return out
+
+
+# ─────────────────────────────────────────────
+# PNG décodé par bandes glissantes
+# ─────────────────────────────────────────────
+
+# Bande PNG décodée gardée pour les régions suivantes (colonnes gauche puis droite d'une même bande)
+PNG_BAND_CACHE_BYTES = 64 * 1024**2
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Octets par pixel d'un PNG 8 bits, par type de couleur (gris, RGB, palette, gris+alpha, RGBA)
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Chunks recopiés dans le mini-PNG d'une bande : ils changent l'interprétation des pixels
+_PNG_COPIED = (b"PLTE", b"tRNS")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+class PngRows:
+    """
+    Décodage des lignes d'un PNG 8 bits non entrelacé par bandes glissantes,
+    sans jamais allouer plus d'une bande : le flux zlib des IDAT est décompressé
+    au fil de la lecture, et chaque bande est refiltrée par Pillow dans un
+    mini-PNG (compression nulle) dont la première ligne, sans filtre, est la
+    dernière ligne reconstruite de la bande précédente — les filtres Up, Average
+    et Paeth de la bande la référencent.
+
+    Les lignes qui précèdent la région demandée sont décodées puis oubliées :
+    le PNG ne se lit que depuis le haut.
+    """
+
+    def __init__(self, path: Path, band_rows: int = 64):
+        self.path = path
+        self.band_rows = band_rows
+        self.idat: list[tuple[int, int]] = []    # (offset, longueur) des chunks IDAT
+        ihdr = None
+        copied = []
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if fh.read(8) != PNG_SIGNATURE:
+                raise ValueError("signature PNG absente")
+            while True:
+                head = fh.read(8)
+                if len(head) < 8:
+                    raise ValueError("PNG tronqué")
+                length, kind = struct.unpack(">I4s", head)
+                if fh.tell() + length + 4 > size:
+                    raise ValueError(f"PNG tronqué (chunk {kind!r})")
+                if kind == b"IHDR":
+                    ihdr = fh.read(length)
+                    fh.seek(4, io.SEEK_CUR)
+                elif kind in _PNG_COPIED:
+                    copied.append(_png_chunk(kind, fh.read(length)))
+                    fh.seek(4, io.SEEK_CUR)
+                else:
+                    if kind == b"IDAT":
+                        self.idat.append((fh.tell(), length))
+                    fh.seek(length + 4, io.SEEK_CUR)
+                if kind == b"IEND":
+                    break
+        if ihdr is None or len(ihdr) != 13:
+            raise ValueError("chunk IHDR absent ou invalide")
+        self.width, self.height, bits, self.color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+        if bits != 8 or interlace or self.color_type not in _PNG_CHANNELS:
+            raise ValueError(f"PNG {bits} bits, type {self.color_type}, entrelacé={interlace}")
+        self.row_bytes = self.width * _PNG_CHANNELS[self.color_type]
+        self._copied = b"".join(copied)
+
+    def _inflate(self, fh, limit: int) -> Iterator[bytes]:
+        """Flux filtré des IDAT, par morceaux d'au plus `limit` octets (un PNG uni se décompresse ×1000)."""
+        stream = zlib.decompressobj()
+        for offset, length in self.idat:
+            fh.seek(offset)
+            while length:
+                data = fh.read(min(length, 1 << 20))
+                if not data:
+                    raise ValueError("PNG tronqué (IDAT)")
+                length -= len(data)
+                while data:
+                    yield stream.decompress(data, limit)
+                    data = stream.unconsumed_tail
+        yield stream.flush()
+
+    def _decode(self, previous: bytes | None, filtered: memoryview, n: int) -> Image.Image:
+        """Lignes filtrées `filtered` (n lignes) reconstruites à la suite de la ligne `previous`."""
+        rows = n + (previous is not None)
+        deflate = zlib.compressobj(0)
+        idat = (deflate.compress(b"\0" + previous) if previous is not None else b"") + deflate.compress(filtered)
+        idat += deflate.flush()
+        mini = io.BytesIO()
+        mini.write(PNG_SIGNATURE)
+        mini.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, rows, 8, self.color_type, 0, 0, 0)))
+        mini.write(self._copied)
+        mini.write(struct.pack(">I", len(idat)) + b"IDAT")
+        mini.write(idat)
+        mini.write(struct.pack(">I", zlib.crc32(idat, zlib.crc32(b"IDAT"))))
+        mini.write(_png_chunk(b"IEND", b""))
+        del idat
+        mini.seek(0)
+        with Image.open(mini) as band:
+            band.load()
+            return band.crop((0, rows - n, self.width, rows)) if previous is not None else band
+
+    def rows(self, y0: int, y1: int) -> Image.Image:
+        """Lignes [y0, y1) sur toute la largeur ; mémoire de pointe : une bande et la région."""
+        stride = self.row_bytes + 1                  # octet de filtre en tête de ligne
+        cuts = [*range(0, y0, self.band_rows), y0, y1]
+        pending = bytearray()
+        previous = None
+        with open(self.path, "rb") as fh:
+            stream = self._inflate(fh, stride * self.band_rows)
+            for a, b in zip(cuts, cuts[1:]):
+                need = (b - a) * stride
+                while len(pending) < need:
+                    piece = next(stream, None)
+                    if piece is None:
+                        raise ValueError("flux IDAT tronqué")
+                    pending += piece
+                with memoryview(pending) as view:
+                    band = self._decode(previous, view[:need], b - a)
+                del pending[:need]
+                if b == y1:
+                    return band
+                previous = band.crop((0, b - a - 1, self.width, b - a)).tobytes()
+                if len(previous) != self.row_bytes:
+                    raise ValueError(f"ligne décodée de {len(previous)} octets au lieu de {self.row_bytes}")
+
+
+# ─────────────────────────────────────────────
+# Lecteur de bandes
+# ─────────────────────────────────────────────
+
+class BandReader:
+    """
+    Lecture de régions rectangulaires (bandes de lignes, colonnes du cadre)
+    d'une image, sans jamais matérialiser l'image entière quand le format le permet.
+
+    Sources acceptées :
+    - np.ndarray (H, W, canaux) : la région est une vue, sans copie ;
+    - Image PIL déjà chargée : recadrage de la région ;
+    - chemin (ou Image PIL ouverte depuis un fichier, non chargée) :
+        * TIFF strips/tuiles : seuls les chunks intersectant la région sont décodés ;
+        * PNG 8 bits non entrelacé : lignes décodées par bandes glissantes (PngRows),
+          seule la bande demandée reste en mémoire ;
+        * autre format séquentiel (JPEG non progressif…) : seules les lignes [0, y1) sont décodées ;
+        * autres cas : chargement complet, une seule fois.
+
+    Les régions retournées sont en uint8 (H, W, canaux), dans le mode de travail
+    `mode` de la source (voir colors.native_mode). Pour un tableau, le mode est
+    déduit du nombre de canaux ; le préciser pour un tableau CMYK.
+
+    `digest` : empreinte du contenu lu (source_cache.py), qui permet de
+    retrouver les résultats de détection d'une même source ; None sinon.
+    """
+
+    def __init__(
+        self,
+        source: np.ndarray | Image.Image | Path | str,
+        mode: str | None = None,
+        digest: str | None = None,
+    ):
+        self.digest = digest
+        self._arr = None
+        self._img = None          # image chargée (source PIL ou repli)
+        self._path = None
+        self._tiff = None
+        self._png = None
+        self._png_band = None     # (y0, y1, bande) : dernière bande PNG décodée
+        self._sequential = False
+
+        if isinstance(source, np.ndarray):
+            self._arr = source[..., None] if source.ndim == 2 else source
+            self.height, self.width = source.shape[:2]
+            self.mode = mode or array_mode(source)
+            return
+
+        if isinstance(source, Image.Image):
+            self.width, self.height = source.size
+            self.mode = mode or native_mode(source.mode)
+            filename = getattr(source, "filename", "")
+            if not source.tile or not filename:
+                self._img = source
+                return
+            self._path = Path(filename)
+        else:
+            self._path = Path(source)
+
+        with Image.open(self._path) as img:
+            self.width, self.height = img.size
+            self.mode = mode or native_mode(img.mode)
+            if img.format == "TIFF":
+                try:
+                    self._tiff = TiffChunks(img, self._path)
+                except (ValueError, KeyError) as e:
+                    logger.debug(f"Lecture TIFF par chunks impossible ({e}) — repli")
+            if img.format == "PNG":
+                try:
+                    self._png = PngRows(self._path)
+                except (ValueError, OSError, struct.error, zlib.error) as e:
+                    logger.debug(f"Lecture PNG par bandes impossible ({e}) — repli")
+            self._sequential = (
+                len(img.tile) == 1
+                and tuple(img.tile[0][1]) == (0, 0, self.width, self.height)
+                and not img.info.get("interlace")
+                and not img.info.get("progressive")
+            )
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def streams_rows(self) -> bool:
+        """True quand iter_rows() ne charge jamais l'image entière (tableau, TIFF par chunks)."""
+        return self._arr is not None or self._tiff is not None
+
+    @property
+    def reads_regions(self) -> bool:
+        """True quand une région se lit sans charger l'image entière (déjà en mémoire, TIFF, format séquentiel)."""
+        return self.streams_rows or self._img is not None or self._sequential
+
+    @property
+    def tiff_chunks(self) -> TiffChunks | None:
+        """Table des strips/tuiles quand la source est un TIFF lu par chunks, sinon None."""
+        return self._tiff
+
+    @property
+    def array(self) -> np.ndarray | None:
+        """Buffer source quand le lecteur lit un tableau (modifiable en place), sinon None."""
+        return self._arr
+
+    def _decode_prefix(self, x0: int, y0: int, x1: int, y1: int) -> Image.Image:
+        """Décode seulement les y1 premières lignes d'un format séquentiel et en extrait la région."""
+        with Image.open(self._path) as img:
+            tile = img.tile[0]
+            img._size = (self.width, y1)
+            img.tile = [(tile[0], (0, 0, self.width, y1), *tile[2:])]
+            img.load()
+            return img.crop((x0, y0, x1, y1))
+
+    def _png_region(self, x0: int, y0: int, x1: int, y1: int) -> Image.Image:
+        """Région d'un PNG, servie par la dernière bande décodée quand elle la contient."""
+        cached = self._png_band
+        if cached is None or not (cached[0] <= y0 and y1 <= cached[1]):
+            cached = (y0, y1, self._png.rows(y0, y1))
+            small = (y1 - y0) * self._png.row_bytes <= PNG_BAND_CACHE_BYTES
+            self._png_band = cached if small else None
+        band_y0, _, band = cached
+        return band.crop((x0, y0 - band_y0, x1, y1 - band_y0))
+
+    def _region_image(self, x0: int, y0: int, x1: int, y1: int) -> Image.Image:
+        if self._img is not None:
+            return self._img.crop((x0, y0, x1, y1))
+        if self._tiff is not None:
+            return self._tiff.region(x0, y0, x1, y1)
+        if self._png is not None:
+            try:
+                return self._png_region(x0, y0, x1, y1)
+            except (OSError, ValueError, struct.error, zlib.error) as e:
+                logger.debug(f"Décodage PNG par bandes impossible ({e}) — repli")
+                self._png = self._png_band = None
+        if self._sequential:
+            try:
+                return self._decode_prefix(x0, y0, x1, y1)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Décodage partiel impossible ({e}) — repli")
+                self._sequential = False
+        logger.debug(f"Lecture par bandes non supportée pour {self._path.name} — chargement complet")
+        self._img = Image.open(self._path)
+        self._img.load()
+        return self._img.crop((x0, y0, x1, y1))
+
+    def region(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Rectangle [x0, x1) × [y0, y1) dans le mode de travail, shape (y1 - y0, x1 - x0, canaux)."""
+        if self._arr is not None:
+            return self._arr[y0:y1, x0:x1]
+        band = self._region_image(x0, y0, x1, y1)
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        return image_array(band)
+
+    def rows(self, y0: int, y1: int) -> np.ndarray:
+        """Bande de lignes [y0, y1) sur toute la largeur."""
+        return self.region(0, y0, self.width, y1)
+
+    def iter_rows(self, band_rows: int) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Parcourt l'image de haut en bas par bandes de lignes : (y0, bande).
+
+        Pour un TIFF, la hauteur de bande est alignée sur celle des strips/tuiles
+        afin que chaque chunk ne soit décodé qu'une fois. Pour un format séquentiel,
+        l'image est chargée une seule fois (le décodage partiel ne se fait que depuis le haut).
+        """
+        if self._tiff is not None:
+            band_rows = max(band_rows // self._tiff.chunk_h, 1) * self._tiff.chunk_h
+        elif self._arr is None and self._img is None:
+            self._img = Image.open(self._path)
+            self._img.load()
+        for y0 in range(0, self.height, band_rows):
+            yield y0, self.rows(y0, min(y0 + band_rows, self.height))
+
+
+def as_band_reader(source: "np.ndarray | Image.Image | Path | str | BandReader", mode: str | None = None) -> BandReader:
+    """Accepte indifféremment un BandReader ou une source brute (de mode `mode`)."""
+    return source if isinstance(source, BandReader) else BandReader(source, mode)
+
+
+class PaddedReader(BandReader):
+    """
+    Vue d'une source élargie de colonnes transparentes à gauche et à droite, sans
+    jamais allouer l'image élargie : seules les régions demandées sont complétées.
+    Les coordonnées sont celles de l'image élargie. Dans un mode sans alpha, les
+    colonnes ajoutées valent un pixel transparent converti dans ce mode (noir en
+    RGB), comme lorsque la détection travaillait sur une image convertie en RGBA.
+    """
+
+    def __init__(self, source: "np.ndarray | Image.Image | Path | str | BandReader", pad_left: int = 0, pad_right: int = 0):
+        self.source = as_band_reader(source)
+        self.pad_left = pad_left
+        self.pad_right = pad_right
+        self.width = self.source.width + pad_left + pad_right
+        self.height = self.source.height
+        self.mode = self.source.mode
+        self._arr = None
+        self._fill = mode_color(self.mode, "transparent")
+
+    @property
+    def digest(self) -> str | None:
+        """Empreinte de la source, suivie du padding : le contenu lu n'est pas le même."""
+        if self.source.digest is None or self.pad_left == self.pad_right == 0:
+            return self.source.digest
+        return f"{self.source.digest}+{self.pad_left},{self.pad_right}"
+
+    @property
+    def streams_rows(self) -> bool:
+        return self.source.streams_rows
+
+    @property
+    def reads_regions(self) -> bool:
+        return self.source.reads_regions
+
+    @property
+    def tiff_chunks(self) -> TiffChunks | None:
+        """Chunks de la source, seulement sans padding : les coordonnées sont alors les mêmes."""
+        return self.source.tiff_chunks if self.pad_left == self.pad_right == 0 else None
+
+    def region(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        sx0 = min(max(x0 - self.pad_left, 0), self.source.width)
+        sx1 = min(max(x1 - self.pad_left, 0), self.source.width)
+        if sx1 - sx0 == x1 - x0:
+            return self.source.region(sx0, y0, sx1, y1)
+        out = np.empty((y1 - y0, x1 - x0, len(self._fill)), dtype=np.uint8)
+        out[:] = self._fill
+        if sx0 < sx1:
+            dx = sx0 + self.pad_left - x0
+            out[:, dx:dx + sx1 - sx0] = self.source.region(sx0, y0, sx1, y1)
+        return out
+
+    def iter_rows(self, band_rows: int) -> Iterator[tuple[int, np.ndarray]]:
+        for y0, rows in self.source.iter_rows(band_rows):
+            if self.pad_left == self.pad_right == 0:
+                yield y0, rows
+                continue
+            out = np.empty((rows.shape[0], self.width, len(self._fill)), dtype=np.uint8)
+            out[:] = self._fill
+            out[:, self.pad_left:self.pad_left + self.source.width] = rows
+            yield y0, out
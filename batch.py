@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+import csv
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+
+from cli import parse_args, parse_batch_args
+from main import preload, run
+
+logger = logging.getLogger(__name__)
+
+
+# Extensions traitées quand une source est un dossier
+IMAGE_SUFFIXES = {".tif", ".tiff", ".png", ".jpg", ".jpeg"}
+
+# Suffixes des fichiers produits par miredit : jamais repris comme entrée
+OUTPUT_STEM_SUFFIXES = (
+    "_HC", "_mod", "_HC_mod", "_centered", "_debug_centre", "_debug_frame", "_debug_final",
+)
+
+# Options de traitement transmises telles quelles à parse_args (clés du manifeste)
+JOB_OPTIONS = [
+    "mire", "mode", "LPI", "HDPI", "VDPI", "bord_mire", "cadre", "trait_noir_mm",
+    "detect_samples", "detect_quorum", "output", "output_dir",
+    "cache_dir", "compress_level", "tiff_compression", "tiff_tile", "write_threads", "threads",
+    "max_memory_mb", "scratch_dir", "source_cache", "source_cache_mb", "debug_width",
+]
+FLAG_OPTIONS = ["stream", "incremental", "no_cache", "profile", "fast", "bigtiff", "debug", "dump_edits", "dry_run"]
+# Options répétables : liste (ligne de commande, JSON) ou valeurs séparées par « ; » (CSV).
+# Celles d'une ligne de manifeste s'ajoutent à celles de la ligne de commande.
+LIST_OPTIONS = ["variant"]
+
+
+@dataclass
+class Job:
+    image: Path
+    argv: list[str]       # arguments complets de parse_args pour ce fichier
+
+
+def _is_true(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "oui", "x")
+
+
+def _options_argv(options: dict) -> list[str]:
+    """Convertit des options (valeurs par défaut ou ligne de manifeste) en arguments CLI."""
+    argv = []
+    for key in JOB_OPTIONS:
+        value = options.get(key)
+        if value is not None and str(value).strip() != "":
+            argv += [f"--{key}", str(value)]
+    for key in FLAG_OPTIONS:
+        if key in options and _is_true(options[key]):
+            argv.append(f"--{key}")
+    for key in LIST_OPTIONS:
+        values = options.get(key) or []
+        if isinstance(values, str):
+            values = values.split(";")
+        argv += [arg for value in values if str(value).strip() for arg in (f"--{key}", str(value).strip())]
+    return argv
+
+
+def _is_image(path: Path) -> bool:
+    return path.suffix.lower() in IMAGE_SUFFIXES and not path.stem.endswith(OUTPUT_STEM_SUFFIXES)
+
+
+def _read_manifest(path: Path) -> list[dict]:
+    """Lit un manifeste CSV (avec en-tête) ou JSON (liste d'objets, {"jobs": [...]} ou un seul objet)."""
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as fh:
+            rows = list(csv.DictReader(fh))
+    else:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            rows = data["jobs"] if "jobs" in data else [data]
+        else:
+            rows = data
+
+    for i, row in enumerate(rows):
+        if not row.get("image"):
+            raise ValueError(f"{path.name} : entrée {i} sans clé 'image'")
+        image = Path(row["image"])
+        row["image"] = image if image.is_absolute() else path.parent / image
+    return rows
+
+
+def collect_jobs(sources: list[str], defaults: dict) -> list[Job]:
+    """
+    Construit la liste des traitements à partir des sources (dossiers, globs, manifestes).
+    Les options de `defaults` s'appliquent à tous les fichiers ; celles d'un manifeste
+    les surchargent pour le fichier concerné.
+    """
+    base_argv = _options_argv(defaults)
+    jobs = []
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            images = sorted(p for p in path.iterdir() if p.is_file() and _is_image(p))
+            jobs += [Job(p, ["-i", str(p)] + base_argv) for p in images]
+        elif path.suffix.lower() in (".csv", ".json") and path.is_file():
+            for row in _read_manifest(path):
+                jobs.append(Job(row["image"], ["-i", str(row["image"])] + base_argv + _options_argv(row)))
+        else:
+            images = sorted(Path(p) for p in glob.glob(source, recursive=True))
+            if not images:
+                logger.warning(f"Aucun fichier pour la source : {source}")
+            jobs += [Job(p, ["-i", str(p)] + base_argv) for p in images if p.is_file()]
+    return jobs
+
+
+# ─────────────────────────────────────────────
+# Processus de travail
+# ─────────────────────────────────────────────
+
+def _init_worker(memory_mb: int | None) -> None:
+    """Borne l'espace d'adressage du processus : un dépassement lève MemoryError."""
+    if memory_mb is None:
+        return
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Limite mémoire par processus non appliquée : {e}")
+
+
+def _process(job: Job) -> dict:
+    """Traite un fichier ; toute erreur est rapportée dans le résultat, jamais propagée."""
+    t0 = time.perf_counter()
+    result = {"image": str(job.image), "status": "ok", "error": None}
+    try:
+        report = run(parse_args(job.argv))
+        if report is not None:
+            result["preflight"] = report
+            if not report["ok"]:
+                result.update(status="error", error="; ".join(report["problems"]))
+    except SystemExit:
+        result.update(status="error", error=f"Arguments invalides : {' '.join(job.argv)}")
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def _worker_main(conn: Connection, initializer, initargs: tuple, maxtasks: int | None) -> None:
+    """Boucle d'un processus de travail : un Job reçu, un résultat renvoyé ; None arrête."""
+    if initializer is not None:
+        initializer(*initargs)
+    count = 0
+    while maxtasks is None or count < maxtasks:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        conn.send(_process(job))
+        count += 1
+
+
+def _exit_reason(exitcode: int | None) -> str:
+    if exitcode is not None and exitcode < 0:
+        try:
+            return f"arrêté par {signal.Signals(-exitcode).name}"
+        except ValueError:
+            pass
+    return f"sorti avec le code {exitcode}"
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    conn: Connection
+    task: tuple | None = None    # (job, callback, début) du travail en cours
+    count: int = 0               # travaux terminés
+
+
+class WorkerPool:
+    """
+    Processus de travail reliés chacun par leur propre tuyau : le superviseur
+    sait quel fichier tourne dans quel processus. Un processus qui meurt (OOM
+    killer, signal, segfault) donne un échec pour ce seul fichier et il est
+    remplacé. multiprocessing.Pool ne rapporte jamais ce résultat, et se bloque
+    si le processus tué attendait un travail (il tenait le verrou de la file).
+
+    `submit()` peut être appelé depuis n'importe quel thread ; `callback(result)`
+    est appelé depuis le thread de supervision.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        initializer=None,
+        initargs: tuple = (),
+        maxtasksperchild: int | None = None,
+    ):
+        if maxtasksperchild is not None and maxtasksperchild < 1:
+            raise ValueError(f"maxtasksperchild doit être ≥ 1 (reçu {maxtasksperchild})")
+        self._initializer = initializer
+        self._initargs = initargs
+        self._maxtasks = maxtasksperchild
+        self._lock = threading.Lock()
+        self._todo: deque = deque()
+        self._stopping = False
+        self._woken = False
+        self._wake_r, self._wake_w = multiprocessing.Pipe(duplex=False)
+        self._workers = [self._spawn() for _ in range(max(1, processes))]
+        self._thread = threading.Thread(target=self._supervise, name="workers", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def submit(self, job: Job, callback) -> None:
+        with self._lock:
+            self._todo.append((job, callback))
+            self._wake()
+
+    def close(self) -> None:
+        """Attend les travaux soumis, puis arrête les processus."""
+        with self._lock:
+            self._stopping = True
+            self._wake()
+        self._thread.join()
+
+    def terminate(self) -> None:
+        """Tue les processus sans attendre leurs travaux."""
+        with self._lock:
+            self._stopping = True
+            self._todo.clear()
+        for worker in self._workers:
+            worker.process.kill()
+
+    def _wake(self) -> None:
+        # Un seul réveil en attente suffit : le tuyau ne peut pas se remplir
+        if not self._woken:
+            self._woken = True
+            self._wake_w.send(None)
+
+    def _spawn(self) -> _Worker:
+        conn, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child, self._initializer, self._initargs, self._maxtasks),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        return _Worker(process, conn)
+
+    def _supervise(self) -> None:
+        while True:
+            with self._lock:
+                for worker in self._workers:
+                    if worker.task is None and self._todo:
+                        job, callback = self._todo.popleft()
+                        worker.task = (job, callback, time.perf_counter())
+                        try:
+                            worker.conn.send(job)
+                        except OSError:
+                            pass  # processus mort : sa sentinelle le signale ci-dessous
+                if self._stopping and not self._todo and all(w.task is None for w in self._workers):
+                    break
+            waitables = [self._wake_r]
+            for worker in self._workers:
+                waitables += [worker.conn, worker.process.sentinel]
+            ready = set(wait(waitables))
+            if self._wake_r in ready:
+                with self._lock:
+                    while self._wake_r.poll():
+                        self._wake_r.recv()
+                    self._woken = False
+            workers = []
+            for worker in self._workers:
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    worker = self._collect(worker)
+                if worker is not None:
+                    workers.append(worker)
+            self._workers = workers
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join()
+
+    def _collect(self, worker: _Worker) -> _Worker | None:
+        """
+        Remet le résultat du processus, ou l'échec de son travail s'il est mort.
+        Retourne le processus, son remplaçant, ou None s'il n'y a plus rien à traiter.
+        """
+        result = None
+        try:
+            if worker.conn.poll():
+                result = worker.conn.recv()
+        except (EOFError, OSError):
+            pass
+        if result is None:
+            worker.process.join()
+        if worker.task is not None and (result is not None or not worker.process.is_alive()):
+            job, callback, t0 = worker.task
+            if result is None:
+                result = _failed(job, f"Processus de travail {_exit_reason(worker.process.exitcode)}")
+                result["seconds"] = round(time.perf_counter() - t0, 3)
+            worker.task = None
+            worker.count += 1
+            try:
+                callback(result)
+            except Exception:
+                logger.exception(f"{job.image} : rappel en erreur")
+        elif result is None:
+            logger.warning(f"Processus de travail {worker.process.pid} {_exit_reason(worker.process.exitcode)}")
+        if worker.process.is_alive() and (self._maxtasks is None or worker.count < self._maxtasks):
+            return worker
+        worker.process.join()
+        worker.conn.close()
+        with self._lock:
+            if self._stopping and not self._todo:
+                return None
+        return self._spawn()
+
+
+def _failed(job: Job, error: str) -> dict:
+    return {"image": str(job.image), "status": "error", "error": error, "seconds": 0}
+
+
+def run_batch(
+    jobs: list[Job],
+    workers: int,
+    worker_memory_mb: int | None = None,
+    jobs_per_worker: int | None = None,
+) -> list[dict]:
+    """
+    Répartit les traitements sur un pool de processus et retourne un résultat par fichier.
+    Un processus tué pendant un traitement donne un échec pour ce fichier ; le lot continue.
+    """
+    results = []
+    done: queue.SimpleQueue = queue.SimpleQueue()
+    with WorkerPool(
+        processes=min(workers, len(jobs)),
+        initializer=_init_worker,
+        initargs=(worker_memory_mb,),
+        maxtasksperchild=jobs_per_worker,
+    ) as pool:
+        for job in jobs:
+            pool.submit(job, done.put)
+        for _ in jobs:
+            result = done.get()
+            if result["status"] == "ok":
+                logger.info(f"OK     {result['image']}  ({result['seconds']}s)")
+            else:
+                logger.error(f"ÉCHEC  {result['image']}  — {result['error']}")
+            results.append(result)
+    return results
+
+
+def main() -> int:
+    args = parse_batch_args()
+    # Les processus se partagent les cœurs pour la compression de sortie et les noyaux pleine image
+    if args.write_threads == 0:
+        args.write_threads = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    if args.threads == 0:
+        args.threads = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    jobs = collect_jobs(args.sources, vars(args))
+    if not jobs:
+        logger.error("Aucun fichier à traiter")
+        return 1
+
+    logger.info(f"{len(jobs)} fichier(s) — {args.workers} processus")
+    t0 = time.perf_counter()
+    preload()  # hérités par les workers au fork
+    results = run_batch(jobs, args.workers, args.worker_memory_mb, args.jobs_per_worker)
+    failed = [r for r in results if r["status"] != "ok"]
+
+    logger.info(
+        f"Bilan : {len(results) - len(failed)} réussi(s), {len(failed)} échec(s) "
+        f"en {time.perf_counter() - t0:.1f}s"
+    )
+    for r in failed:
+        logger.info(f"  échec : {r['image']}  — {r['error']}")
+
+    if args.summary:
+        args.summary.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        logger.info(f"Bilan écrit : {args.summary}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
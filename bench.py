@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Benchmarks des étapes du pipeline sur images synthétiques (synthetic.py).
+
+Mesure temps réel, CPU et pic mémoire de center_padding, detect_frame_lines,
+apply_mode1, apply_mode2 et de la chaîne Mode 3, pour plusieurs tailles et
+résolutions. Les résultats peuvent être enregistrés comme référence puis
+comparés d'une version à l'autre pour détecter les régressions.
+
+    python bench.py --mpx 10,100 --dpi 720x360,1440x720 --save-baseline bench_baseline.json
+    python bench.py --mpx 10,100 --dpi 720x360,1440x720 --baseline bench_baseline.json
+
+--startup vérifie le démarrage de la ligne de commande : --help, une option
+invalide et une mire introuvable doivent répondre sans charger NumPy ni Pillow,
+en moins de STARTUP_BUDGET_MS au-delà d'un interpréteur nu.
+
+    python bench.py --startup
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from center_padding import center_padding
+from mode1 import apply_mode1
+from mode2 import apply_mode2, detect_frame_lines
+from mode3 import apply_mode3
+from models import PrintSettings
+from parallel import KERNELS, configure_threads
+from profiling import StageProfiler
+from synthetic import SyntheticFrame, synthetic_mire
+
+logger = logging.getLogger(__name__)
+
+
+CADRE_MM = 4.0
+BORD_MIRE_MM = 4.0
+TRAIT_NOIR_MM = 1.0
+
+
+def _mode3(arr, mire, settings):
+    return apply_mode3(arr, mire, settings, cadre_mm=CADRE_MM, trait_noir_mm=TRAIT_NOIR_MM, bord_mire_mm=BORD_MIRE_MM)
+
+
+# Étape mesurée → fonction(buffer, mire, settings). Le buffer est une copie fraîche à chaque répétition.
+STAGES = {
+    "center_padding":     lambda arr, mire, s: center_padding(arr, s),
+    "detect_frame_lines": lambda arr, mire, s: detect_frame_lines(arr, s, cadre_mm=CADRE_MM),
+    "mode1":              lambda arr, mire, s: apply_mode1(arr, mire, s, bord_mire_mm=BORD_MIRE_MM),
+    "mode2":              lambda arr, mire, s: apply_mode2(arr, s, cadre_mm=CADRE_MM, trait_noir_mm=TRAIT_NOIR_MM),
+    "mode3":              _mode3,
+}
+
+
+# Démarrage de main.py : surcoût toléré par rapport à `python -c pass` (meilleur temps des répétitions)
+STARTUP_BUDGET_MS = 100
+
+# Commandes qui doivent répondre sans traiter d'image, ni charger les modules de HEAVY_MODULES
+STARTUP_COMMANDS = {
+    "help":             ["--help"],
+    "invalid_option":   ["-i", "plaque.tif", "--mode", "4"],
+    "missing_template": ["-i", "plaque.tif", "--HDPI", "1", "--VDPI", "1"],
+}
+HEAVY_MODULES = ("numpy", "PIL")
+
+# Exécute main.py comme en ligne de commande, puis affiche les modules lourds chargés (dernière ligne)
+_STARTUP_PROBE = """
+import json, runpy, sys
+sys.argv = ["main.py", *sys.argv[1:]]
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def _best_ms(argv: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(argv, cwd=Path(__file__).parent, capture_output=True)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def check_startup(repeat: int = 5, budget_ms: float = STARTUP_BUDGET_MS) -> tuple[dict, list[str]]:
+    """Mesure le démarrage de main.py pour chaque commande de STARTUP_COMMANDS ; retourne (mesures, problèmes)."""
+    baseline = _best_ms([sys.executable, "-c", "pass"], repeat)
+    results, problems = {"interpreter_ms": round(baseline, 1)}, []
+    probe = _STARTUP_PROBE.format(heavy=HEAVY_MODULES)
+    for name, args in STARTUP_COMMANDS.items():
+        overhead = _best_ms([sys.executable, "main.py", *args], repeat) - baseline
+        out = subprocess.run(
+            [sys.executable, "-c", probe, *args], cwd=Path(__file__).parent, capture_output=True, text=True,
+        )
+        loaded = json.loads(out.stdout.strip().splitlines()[-1])
+        results[name] = {"overhead_ms": round(overhead, 1), "heavy_modules": loaded}
+        logger.info(f"{name:<18} +{overhead:6.1f} ms  modules lourds : {', '.join(loaded) or 'aucun'}")
+        if overhead > budget_ms:
+            problems.append(f"{name} : +{overhead:.0f} ms au démarrage (budget {budget_ms:.0f} ms)")
+        if loaded:
+            problems.append(f"{name} : {', '.join(loaded)} chargé(s) au démarrage")
+    return results, problems
+
+
+def _parse_dpi(value: str) -> tuple[int, int]:
+    h, v = value.lower().split("x")
+    return int(h), int(v)
+
+
+def run_benchmarks(
+    megapixels: list[float],
+    dpis: list[tuple[int, int]],
+    stages: list[str],
+    repeat: int = 3,
+    lpi: float = 50.0,
+) -> dict:
+    """Retourne {"<étape>@<Mpx>MP@<H>x<V>": {wall_s, cpu_s, peak_bytes, size}} (meilleur temps sur `repeat`)."""
+    results = {}
+    mire = synthetic_mire()
+    for hdpi, vdpi in dpis:
+        settings = PrintSettings(lpi=lpi, hdpi=hdpi, vdpi=vdpi)
+        for mpx in megapixels:
+            frame = SyntheticFrame.from_megapixels(mpx, settings, cadre_mm=CADRE_MM)
+            source = frame.to_array()
+            logger.info(f"── {mpx:g} Mpx ({frame.width}x{frame.height}) @ {hdpi}x{vdpi} ──")
+
+            for name in stages:
+                profiler = StageProfiler(job=name)
+                for _ in range(repeat):
+                    arr = source.copy()
+                    with profiler.stage(name):
+                        STAGES[name](arr, mire, settings)
+                    del arr
+                profiler.close()
+
+                best = min(profiler.stages, key=lambda r: r["wall_s"])
+                key = f"{name}@{mpx:g}MP@{hdpi}x{vdpi}"
+                results[key] = {
+                    "wall_s": best["wall_s"],
+                    "cpu_s": best["cpu_s"],
+                    "peak_bytes": max(r["tracemalloc_peak_bytes"] for r in profiler.stages),
+                    "size": [frame.width, frame.height],
+                }
+                logger.info(
+                    f"{name:<20} {best['wall_s']:8.3f}s  CPU {best['cpu_s']:8.3f}s  "
+                    f"pic {results[key]['peak_bytes'] / 1e6:9.1f} Mo"
+                )
+            del source
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Liste des régressions : temps ou pic mémoire au-delà de (1 + tolerance) × la référence."""
+    regressions = []
+    for key, ref in baseline.get("results", {}).items():
+        cur = results.get(key)
+        if cur is None:
+            continue
+        for metric in ("wall_s", "peak_bytes"):
+            if ref[metric] > 0 and cur[metric] > ref[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric} : {ref[metric]} → {cur[metric]} (×{cur[metric] / ref[metric]:.2f})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks miredit sur images synthétiques.")
+    parser.add_argument("--mpx", default="10,50", help="Tailles en mégapixels, séparées par des virgules. (10,50)")
+    parser.add_argument("--dpi", default="720x360", help="Paires HDPIxVDPI, séparées par des virgules. (720x360)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Étapes mesurées. ({','.join(STAGES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure, le meilleur temps est gardé. (3)")
+    parser.add_argument("--LPI", type=float, default=50.0)
+    parser.add_argument("--threads", type=int, default=0, help="Threads des noyaux pleine image. (0 : un par cœur)")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="Enregistre les résultats comme référence.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare à une référence enregistrée.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart toléré avant régression. (0.25 = +25%%)")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Écrit les résultats bruts en JSON.")
+    parser.add_argument(
+        "--startup", action="store_true",
+        help=f"Vérifie seulement le démarrage de main.py (budget {STARTUP_BUDGET_MS} ms, sans NumPy ni Pillow).",
+    )
+    args = parser.parse_args()
+
+    if args.startup:
+        results, problems = check_startup(max(args.repeat, 5))
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+        for p in problems:
+            logger.error(f"DÉMARRAGE  {p}")
+        return 1 if problems else 0
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Étapes inconnues : {sorted(unknown)}")
+
+    configure_threads(args.threads)
+    results = run_benchmarks(
+        [float(m) for m in args.mpx.split(",")],
+        [_parse_dpi(d) for d in args.dpi.split(",")],
+        stages, repeat=args.repeat, lpi=args.LPI,
+    )
+    report = {
+        "machine": {"python": sys.version.split()[0], "numpy": np.__version__, "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "threads": KERNELS.workers},
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+        logger.info(f"Référence enregistrée : {args.save_baseline}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for r in regressions:
+            logger.error(f"RÉGRESSION  {r}")
+        if regressions:
+            return 1
+        logger.info("Aucune régression par rapport à la référence")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    logging.getLogger("mode1").setLevel(logging.WARNING)      # une ligne par mesure suffit
+    raise SystemExit(main())
@@ -2,86 +2,94 @@ import logging
 from pathlib import Path
 
 import numpy as np
-from PIL import Image, ImageDraw
 
+from band_reader import BandReader, as_band_reader
+from colors import is_red
+from detection import DETECTOR, warn_if_unsure
+from debug_artifacts import centre_preview
 from models import PrintSettings
+from pipeline import render_padded
+from source_cache import SOURCE_CACHE
 
 logger = logging.getLogger(__name__)
 
 
-def image_center(img: Image.Image) -> int:
+def image_center(arr: np.ndarray) -> int:
     """Retourne le pixel du milieu horizontal de l'image."""
-    return img.width // 2
+    return arr.shape[1] // 2
 
 
-def is_red(arr: np.ndarray) -> np.ndarray:
+def find_middle_red_center(
+    source: np.ndarray | BandReader,
+    settings: PrintSettings,
+) -> int | None:
     """
-    Masque booléen : pixel rouge si R est nettement supérieur à G et B (écart > 30).
-    arr : tableau numpy de shape (..., 3 ou 4), valeurs int.
+    Trouve la position x du centre de la ligne rouge du milieu dans l'image.
+    Scanne uniquement les 2mm supérieurs de l'image où se trouve la bande mire.
+    Retourne None si aucune ligne rouge n'est trouvée.
+
+    source : buffer partagé (lu sans copie) ou BandReader sur le fichier,
+    dont seule la bande des 2mm supérieurs est décodée. Le résultat est mis en
+    cache avec l'empreinte de la source (source_cache.py).
     """
-    r = arr[..., 0].astype(int)
-    g = arr[..., 1].astype(int)
-    b = arr[..., 2].astype(int)
-    return (r > g + 30) & (r > b + 30)
+    return middle_red_line(source, settings)["center"]
 
 
-def find_middle_red_center(img: Image.Image, settings: PrintSettings) -> int | None:
+def middle_red_line(source: np.ndarray | BandReader, settings: PrintSettings) -> dict:
     """
-    Trouve la position x du centre de la ligne rouge du milieu dans l'image.
-    Scanne uniquement les 2mm supérieurs de l'image où se trouve la bande mire.
-    Retourne None si aucune ligne rouge n'est trouvée.
+    Comme find_middle_red_center, avec la confiance du vote des lignes de la
+    bande (detection.RunDetector) : {"center": int | None, "confidence": float}.
     """
-    arr = np.array(img.convert("RGBA"))
-    scan_rows = settings.mm_to_px_v(2.0)
-    top_strip = arr[:scan_rows, :, :]
-    red_pixels = is_red(top_strip)
-    red_cols = red_pixels.any(axis=0)
+    reader = as_band_reader(source)
+    scan_rows = min(settings.layout().centre_scan_rows, reader.height)
+    found = SOURCE_CACHE.memo(
+        reader, "centre", (scan_rows, *DETECTOR.params), lambda: _scan_middle_red_center(reader, scan_rows),
+    )
+    warn_if_unsure("ligne rouge du milieu", found["confidence"])
+    return found
 
-    padded = np.concatenate(([False], red_cols, [False]))
-    starts = np.where(~padded[:-1] & padded[1:])[0]
-    ends   = np.where( padded[:-1] & ~padded[1:])[0] - 1
-    runs = list(zip(starts.tolist(), ends.tolist()))
 
-    logger.debug(f"Lignes rouges détectées ({len(runs)}) : {runs}")
-    logger.debug(f"Largeur image : {img.width}px  |  centre image : {img.width // 2}px")
+def _scan_middle_red_center(reader: BandReader, scan_rows: int) -> dict:
+    red = DETECTOR.detect(reader, 0, 0, reader.width, scan_rows, is_red)
+    runs = red["runs"]
+
+    logger.debug(f"Lignes rouges détectées ({len(runs)}) : {runs}  |  confiance {red['confidence']}")
+    logger.debug(f"Largeur image : {reader.width}px  |  centre image : {reader.width // 2}px")
 
     if not runs:
-        return None
+        return {"center": None, "confidence": red["confidence"]}
 
     mid_idx = len(runs) // 2
     xs, xe = runs[mid_idx]
     center = (xs + xe) // 2
     logger.debug(f"Ligne rouge du milieu [idx={mid_idx}] : x={xs}–{xe}  |  centre={center}px")
-    return center
+    return {"center": center, "confidence": red["confidence"]}
 
 
-def center_padding(
-    img: Image.Image,
+def compute_padding(
+    source: np.ndarray | BandReader,
     settings: PrintSettings,
-    debug_path: Path | None = None,
-) -> Image.Image:
+) -> tuple[int, int]:
     """
-    Détecte la ligne rouge du milieu (dans les 2mm supérieurs), calcule le padding
-    transparent nécessaire pour la centrer horizontalement, applique le padding
-    et retourne l'image centrée.
-
-    Si debug_path est fourni, sauvegarde l'image intermédiaire avec un trait vert
-    au centre pour vérification visuelle.
+    Calcule le padding transparent (pad_left, pad_right) nécessaire pour centrer
+    horizontalement la ligne rouge du milieu. Retourne (0, 0) si aucun centrage
+    n'est à appliquer. Ne lit que la bande des 2mm supérieurs.
     """
-    red_center = find_middle_red_center(img, settings)
+    reader = as_band_reader(source)
+    red_center = find_middle_red_center(reader, settings)
     if red_center is None:
         logger.warning("Aucune ligne rouge trouvée — pas de centrage appliqué")
-        return img
+        return 0, 0
+    return padding_for_center(red_center, reader.width)
 
-    w = img.width
-    mid = image_center(img)
+
+def padding_for_center(red_center: int, w: int) -> tuple[int, int]:
+    """Padding (pad_left, pad_right) qui amène la colonne `red_center` au milieu d'une image de largeur w."""
+    mid = w // 2
 
     if red_center == mid:
         logger.debug("Ligne rouge déjà centrée, pas de padding nécessaire")
-        return img
-
-    arr = np.array(img.convert("RGBA"))
-    h = arr.shape[0]
+        return 0, 0
 
     if red_center < mid:
         pad_left  = w - 2 * red_center
@@ -90,23 +98,47 @@ def center_padding(
         pad_left  = 0
         pad_right = 2 * red_center - w
 
-    new_w = w + pad_left + pad_right
-    new_arr = np.zeros((h, new_w, 4), dtype=arr.dtype)
-    new_arr[:, pad_left:pad_left + w, :] = arr
-
     logger.debug(
         f"Centrage ligne rouge milieu : x={red_center}, centre image={mid}  |  "
-        f"pad_left={pad_left}px  pad_right={pad_right}px  → nouvelle largeur={new_w}px"
+        f"pad_left={pad_left}px  pad_right={pad_right}px  → nouvelle largeur={w + pad_left + pad_right}px"
     )
+    return pad_left, pad_right
+
+
+def save_centered_debug(
+    source: np.ndarray | BandReader,
+    pad_left: int,
+    pad_right: int,
+    debug_path: Path,
+) -> None:
+    """
+    Aperçu de contrôle du centrage (trait vert au centre), réduit à au plus
+    PREVIEW_MAX_WIDTH px de large : l'image centrée n'est jamais allouée ni
+    encodée en pleine résolution. Le pipeline passe par debug_artifacts (--debug).
+    """
+    centre_preview(source, pad_left, pad_right).save(debug_path, compress_level=1)
+    logger.debug(f"Aperçu du centrage sauvegardé : {debug_path}")
 
-    result = Image.fromarray(new_arr, mode="RGBA")
 
-    if debug_path is not None:
-        debug_img = result.copy()
-        draw = ImageDraw.Draw(debug_img)
-        cx = image_center(debug_img)
-        draw.line([(cx, 0), (cx, debug_img.height - 1)], fill=(0, 255, 0, 255), width=3)
-        debug_img.save(str(debug_path))
-        logger.debug(f"Image centrée sauvegardée : {debug_path}  (trait vert = centre x={cx})")
+def center_padding(
+    source: np.ndarray | BandReader,
+    settings: PrintSettings,
+    debug_path: Path | None = None,
+) -> np.ndarray:
+    """
+    Détecte la ligne rouge du milieu (dans les 2mm supérieurs), calcule le padding
+    nécessaire pour la centrer horizontalement, applique le padding et retourne
+    le buffer centré.
+
+    Un buffer d'entrée est retourné tel quel si aucun padding n'est nécessaire ;
+    sinon un seul nouveau buffer élargi est alloué. Le pipeline n'utilise plus
+    cette fonction : il passe (pad_left, pad_right) de compute_padding() aux modes,
+    qui n'ajoutent le padding qu'à l'écriture de la sortie.
 
-    return result
+    Si debug_path est fourni, sauvegarde un aperçu réduit de l'image centrée
+    avec un trait vert au centre pour vérification visuelle.
+    """
+    pad_left, pad_right = compute_padding(source, settings)
+    if debug_path is not None and (pad_left or pad_right):
+        save_centered_debug(source, pad_left, pad_right, debug_path)
+    return render_padded(source, pad_left, pad_right)
@@ -1,19 +1,48 @@
 import argparse
+import os
 from pathlib import Path
 
 
-def parse_args():
-    """Définition des arguments CLI."""
-    parser = argparse.ArgumentParser(
-        description="Modifications sur images lenticulaires (ajout mire, traits de repérage)."
-    )
+def _int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier attendu : {value!r}") from None
 
-    parser.add_argument(
-        "-i", "--image",
-        type=Path,
-        required=True,
-        help="Chemin de l'image lenticulaire à modifier."
-    )
+
+def _non_negative_int(value: str) -> int:
+    n = _int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"doit être ≥ 0 : {value}")
+    return n
+
+
+def _positive_int(value: str) -> int:
+    n = _int(value)
+    if n <= 0:
+        raise argparse.ArgumentTypeError(f"doit être > 0 : {value}")
+    return n
+
+
+def _fraction(value: str) -> float:
+    try:
+        x = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"nombre attendu : {value!r}") from None
+    if not 0 <= x < 1:
+        raise argparse.ArgumentTypeError(f"doit être dans [0, 1) : {value}")
+    return x
+
+
+def _tile_size(value: str) -> int:
+    n = _int(value)
+    if n < 0 or n % 16:
+        raise argparse.ArgumentTypeError(f"0 ou un multiple de 16 attendu : {value}")
+    return n
+
+
+def _add_job_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options de traitement communes à une image seule et au mode batch."""
     parser.add_argument(
         "-m", "--mire",
         type=Path,
@@ -57,10 +86,98 @@ def parse_args():
         help="[Mode 1] Hauteur de la bande de mire à ajouter en mm. (4.0 par défaut)"
     )
     parser.add_argument(
-        "-o", "--output",
-        type=str,
+        "--stream",
+        action="store_true",
+        help=(
+            "Écrit la sortie en flux, bande par bande, sans la construire en mémoire "
+            "(sortie PNG ou TIFF). La mémoire de pointe reste de l'ordre d'une bande."
+        )
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Mode 2, source et sortie TIFF sans centrage : seules les tuiles/strips touchés par "
+            "le cadre sont réencodés, les autres recopiés octet pour octet (tuilage et compression "
+            "de la source conservés). Sinon, écriture en flux."
+        )
+    )
+    parser.add_argument(
+        "--max_memory_mb",
+        type=_positive_int,
         default=None,
-        help="Nom du fichier de sortie (sans chemin). Par défaut: <image>_mod.png"
+        help=(
+            "Budget mémoire du traitement, en Mo : la mémoire de pointe est estimée d'après "
+            "l'en-tête de l'image, le traitement se fait en mémoire s'il tient, sinon en flux, "
+            "et il est refusé avant tout décodage si rien ne tient. (aucun par défaut)"
+        )
+    )
+    parser.add_argument(
+        "--scratch_dir",
+        type=Path,
+        default=None,
+        help=(
+            "Place les buffers pleine taille (image décodée, canvas) en memmap dans ce dossier "
+            "(disque local rapide) au lieu de la RAM. Avec --max_memory_mb, seulement si le "
+            "planificateur retient cette stratégie. Par défaut: $MIREDIT_SCRATCH_DIR ou le dossier temporaire"
+        )
+    )
+    parser.add_argument(
+        "--variant",
+        action="append",
+        default=None,
+        metavar="SPEC",
+        help=(
+            "Sortie supplémentaire de la même image, décrite par clé=valeur séparés par des virgules "
+            "(mode, bord_mire, cadre, trait_noir_mm, output), ex. --variant mode=1 --variant "
+            "mode=3,bord_mire=6. Répétable : toutes les variantes sont produites d'un seul décodage, "
+            "centrage et détection du cadre partagés. Les clés absentes reprennent les options."
+        )
+    )
+    parser.add_argument(
+        "--compress_level",
+        type=int,
+        choices=range(0, 10),
+        default=6,
+        metavar="0-9",
+        help="Niveau de compression deflate de la sortie PNG/TIFF. (6 par défaut)"
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Préréglage épreuvage : compression minimale (niveau 1), écriture la plus rapide."
+    )
+    parser.add_argument(
+        "--tiff_compression",
+        choices=["deflate", "none"],
+        default="deflate",
+        help="Compression d'une sortie TIFF. (deflate par défaut, avec prédicteur horizontal)"
+    )
+    parser.add_argument(
+        "--tiff_tile",
+        type=_tile_size,
+        default=256,
+        help="Côté des tuiles d'une sortie TIFF en px (multiple de 16), 0 pour des strips. (256 par défaut)"
+    )
+    parser.add_argument(
+        "--bigtiff",
+        action="store_true",
+        help="Force le BigTIFF (sinon choisi automatiquement au-delà de ~4 Go)."
+    )
+    parser.add_argument(
+        "--write_threads",
+        type=_non_negative_int,
+        default=0,
+        help="Threads de compression de la sortie. (0 par défaut : un par cœur)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=_non_negative_int,
+        default=0,
+        help=(
+            "Threads des noyaux pleine image (décodage, collage, remplissages), répartis "
+            "par bandes horizontales. (0 par défaut : un par cœur)"
+        )
     )
     parser.add_argument(
         "-d", "--output_dir",
@@ -74,6 +191,92 @@ def parse_args():
         default=4,
         help="Cadre de mire crée par lenticular suite, 4mm par defaut"
     )
+    parser.add_argument(
+        "--detect_samples",
+        type=_positive_int,
+        default=9,
+        help=(
+            "Lignes échantillonnées par bande de détection (centre, colonnes noires, lignes "
+            "rouges) ; une plage est retenue au vote. 1 : une seule ligne de scan. (9 par défaut)"
+        )
+    )
+    parser.add_argument(
+        "--detect_quorum",
+        type=_fraction,
+        default=0.5,
+        help="Part des lignes votantes qui doit marquer une colonne pour la retenir. (0.5 par défaut)"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=None,
+        help=(
+            "Dossier du cache disque (bandes de mire prêtes à l'emploi). "
+            "Par défaut: $MIREDIT_CACHE_DIR ou ~/.cache/miredit"
+        )
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Désactive le cache disque des bandes de mire (le cache mémoire reste actif)."
+    )
+    parser.add_argument(
+        "--source_cache",
+        choices=["detection", "decoded"],
+        default=None,
+        help=(
+            "Cache disque des sources, par empreinte du contenu (dans --cache_dir/sources) : "
+            "'detection' garde centrage et lignes du cadre, 'decoded' aussi une copie brute de "
+            "l'image décodée, relue en memory-map. Un retraitement avec d'autres --LPI, "
+            "--bord_mire ou --trait_noir_mm saute décodage et détection."
+        )
+    )
+    parser.add_argument(
+        "--source_cache_mb",
+        type=int,
+        default=16384,
+        help="Taille maximale du cache des sources, en Mo ; les entrées les plus anciennes partent. (16384 par défaut)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Mesure chaque étape (temps réel, CPU, pic mémoire RSS/tracemalloc, dimensions) "
+            "et écrit un rapport JSON <image>_profile.json à côté de la sortie."
+        )
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help=(
+            "Écrit des aperçus de contrôle réduits à côté de la sortie : <image>_debug_centre.png "
+            "(centrage), _debug_frame.png (lignes du cadre détectées), _debug_final.png (sortie)."
+        )
+    )
+    parser.add_argument(
+        "--debug_width",
+        type=int,
+        default=2048,
+        help="Largeur maximale des aperçus --debug, en px. (2048 par défaut)"
+    )
+    parser.add_argument(
+        "--dump_edits",
+        action="store_true",
+        help=(
+            "Écrit la liste d'édition de la sortie (canvas, collages, rectangles pleins) "
+            "en JSON à côté d'elle : <sortie>_edits.json."
+        )
+    )
+    parser.add_argument(
+        "--dry_run", "--dry-run",
+        action="store_true",
+        help=(
+            "Vérifie la plaque sans la traiter : lit l'en-tête et les bandes de détection "
+            "(un PNG est décodé depuis le haut jusqu'au milieu, en mémoire bornée), "
+            "puis affiche en JSON la géométrie (centrage, lignes du cadre, rectangles, canvas, "
+            "traits de repérage) et la taille de sortie. Code de retour 1 si un problème est détecté."
+        )
+    )
     parser.add_argument(
         "--trait_noir_mm",
         type=float,
@@ -81,4 +284,154 @@ def parse_args():
         help="Hauteur en mm du trait noir à la jonction mire/image (modes 1 et 2). (1.0 par défaut)"
     )
 
-    return parser.parse_args()
+
+def build_parser() -> argparse.ArgumentParser:
+    """Parser d'un traitement sur une seule image."""
+    parser = argparse.ArgumentParser(
+        description="Modifications sur images lenticulaires (ajout mire, traits de repérage)."
+    )
+
+    parser.add_argument(
+        "-i", "--image",
+        type=Path,
+        required=True,
+        help="Chemin de l'image lenticulaire à modifier."
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default=None,
+        help="Nom du fichier de sortie (sans chemin). Par défaut: <image>_mod.png"
+    )
+    _add_job_arguments(parser)
+    return parser
+
+
+def parse_args(argv: list[str] | None = None):
+    """Définition des arguments CLI."""
+    return build_parser().parse_args(argv)
+
+
+def parse_batch_args(argv: list[str] | None = None):
+    """Arguments du mode batch : sources multiples, pool de processus."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Traitement par lot d'images lenticulaires. Les options de traitement "
+            "servent de valeurs par défaut, surchargées fichier par fichier par le manifeste."
+        )
+    )
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help=(
+            "Dossier(s), motif(s) glob (ex: 'plaques/*.tif') ou manifeste(s) CSV/JSON. "
+            "Colonnes/clés du manifeste : image (obligatoire), mode, LPI, HDPI, VDPI, "
+            "bord_mire, cadre, trait_noir_mm, detect_samples, detect_quorum, mire, output, output_dir, stream, compress_level, "
+            "fast, tiff_compression, tiff_tile, bigtiff, incremental, write_threads, threads, max_memory_mb, scratch_dir, source_cache, source_cache_mb, debug, debug_width, dump_edits, dry_run, variant (séparées par « ; » en CSV)."
+        )
+    )
+    parser.add_argument(
+        "-j", "--workers",
+        type=_positive_int,
+        default=os.cpu_count() or 1,
+        help="Nombre de processus de travail. (nombre de cœurs par défaut)"
+    )
+    parser.add_argument(
+        "--worker_memory_mb",
+        type=_positive_int,
+        default=None,
+        help=(
+            "Limite mémoire (espace d'adressage) par processus, en Mo. Un fichier qui la "
+            "dépasse échoue avec MemoryError au lieu d'être tué par le système. (aucune par défaut)"
+        )
+    )
+    parser.add_argument(
+        "--jobs_per_worker",
+        type=_positive_int,
+        default=None,
+        help="Recycle chaque processus après ce nombre de fichiers, pour rendre la mémoire. (jamais par défaut)"
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        default=None,
+        help="Écrit le bilan fichier par fichier (succès/échec) dans ce fichier JSON."
+    )
+    _add_job_arguments(parser)
+    return parser.parse_args(argv)
+
+
+
+def parse_daemon_args(argv: list[str] | None = None):
+    """Arguments du démon : sources de travaux, pool de processus persistant, budget mémoire."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Démon de traitement : surveille des dossiers chauds, des dossiers spool de "
+            "travaux JSON et/ou un socket local, avec des processus de travail gardés chauds. "
+            "Les options de traitement servent de valeurs par défaut à tous les travaux."
+        )
+    )
+    parser.add_argument(
+        "--watch",
+        type=Path,
+        action="append",
+        default=[],
+        help=(
+            "Dossier chaud : chaque image déposée est traitée puis déplacée dans done/ ou failed/. "
+            "Sorties dans <dossier>/out sauf -d. (répétable)"
+        )
+    )
+    parser.add_argument(
+        "--spool",
+        type=Path,
+        action="append",
+        default=[],
+        help=(
+            "Dossier spool : chaque fichier .json déposé (un travail, une liste ou {\"jobs\": [...]}, "
+            "mêmes clés que le manifeste batch) est traité puis déplacé dans done/ ou failed/. (répétable)"
+        )
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="Socket Unix : un travail JSON par ligne, réponse JSON par ligne (\"wait\": true pour attendre la fin)."
+    )
+    parser.add_argument(
+        "-j", "--workers",
+        type=_positive_int,
+        default=os.cpu_count() or 1,
+        help="Nombre de processus de travail, gardés chauds. (nombre de cœurs par défaut)"
+    )
+    parser.add_argument(
+        "--memory_budget_mb",
+        type=_positive_int,
+        default=None,
+        help=(
+            "Budget mémoire total, en Mo : un travail ne démarre que si son estimation tient "
+            "dans ce qui reste. (aucun par défaut)"
+        )
+    )
+    parser.add_argument(
+        "--worker_memory_mb",
+        type=_positive_int,
+        default=None,
+        help="Limite mémoire (espace d'adressage) par processus, en Mo. (aucune par défaut)"
+    )
+    parser.add_argument(
+        "--jobs_per_worker",
+        type=_positive_int,
+        default=None,
+        help="Recycle chaque processus après ce nombre de fichiers. (jamais par défaut)"
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=1.0,
+        help="Intervalle de scrutation des dossiers, en secondes. (1.0 par défaut)"
+    )
+    _add_job_arguments(parser)
+    args = parser.parse_args(argv)
+    if not (args.watch or args.spool or args.socket):
+        parser.error("au moins une source est nécessaire : --watch, --spool ou --socket")
+    return args
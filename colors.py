@@ -0,0 +1,108 @@
+import numpy as np
+from PIL import Image
+
+# Modes conservés tels quels de bout en bout : les buffers sont des tableaux uint8
+# (H, W, canaux) dans le mode de la source. Les autres sont convertis (voir native_mode).
+NATIVE_MODES = ("RGBA", "RGB", "CMYK", "L")
+
+# Couleurs de remplissage par mode de travail.
+# "empty"       : fond sans encre (transparent si le mode a un alpha, papier sinon)
+# "transparent" : un pixel RGBA transparent converti dans le mode — ce que la
+#                 détection lisait dans le padding quand tout était converti en RGBA
+MODE_COLORS = {
+    "RGBA": {"black": (0, 0, 0, 255), "white": (255, 255, 255, 255), "green": (0, 255, 0, 255),
+             "empty": (0, 0, 0, 0),   "transparent": (0, 0, 0, 0)},
+    "RGB":  {"black": (0, 0, 0),      "white": (255, 255, 255),      "green": (0, 255, 0),
+             "empty": (255, 255, 255), "transparent": (0, 0, 0)},
+    "CMYK": {"black": (0, 0, 0, 255), "white": (0, 0, 0, 0),         "green": (255, 0, 255, 0),
+             "empty": (0, 0, 0, 0),   "transparent": (255, 255, 255, 0)},
+    "L":    {"black": (0,),           "white": (255,),               "green": (128,),
+             "empty": (255,),         "transparent": (0,)},
+}
+
+# Mode par défaut d'un tableau numpy, selon son nombre de canaux
+_MODES_BY_CHANNELS = {1: "L", 3: "RGB", 4: "RGBA"}
+
+
+def native_mode(mode: str) -> str:
+    """Mode de travail pour une image PIL de mode `mode` (P, LA, I;16… → RGBA comme avant)."""
+    if mode in NATIVE_MODES:
+        return mode
+    if mode == "1":
+        return "L"
+    return "RGBA"
+
+
+def array_mode(arr: np.ndarray) -> str:
+    """Mode supposé d'un tableau (H, W[, canaux]) : 4 canaux → RGBA (passer le mode pour CMYK)."""
+    channels = 1 if arr.ndim == 2 else arr.shape[2]
+    return _MODES_BY_CHANNELS[channels]
+
+
+def mode_color(mode: str, name: str) -> tuple[int, ...]:
+    return MODE_COLORS[mode][name]
+
+
+def has_alpha(mode: str) -> bool:
+    return mode == "RGBA"
+
+
+def image_array(img: Image.Image) -> np.ndarray:
+    """Pixels d'une image PIL en tableau (H, W, canaux), y compris pour L."""
+    arr = np.asarray(img)
+    return arr[..., None] if arr.ndim == 2 else arr
+
+
+def array_image(arr: np.ndarray, mode: str) -> Image.Image:
+    """Image PIL d'un tableau (H, W, canaux) dans le mode de travail."""
+    if mode == "L":
+        return Image.fromarray(arr.reshape(arr.shape[:2]), mode="L")
+    return Image.fromarray(arr, mode=mode)
+
+
+def rgb_channels(arr: np.ndarray, mode: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Canaux R, G, B (int16) d'un tableau (..., canaux), calculés dans le mode natif.
+    CMYK : même formule que Pillow, R = (255 - C) × (255 - K) / 255 arrondi.
+    """
+    if mode == "L":
+        v = arr[..., 0].astype(np.int16)
+        return v, v, v
+    if mode == "CMYK":
+        k = 255 - arr[..., 3].astype(np.int32)
+        rgb = []
+        for i in range(3):
+            t = (255 - arr[..., i].astype(np.int32)) * k + 128
+            rgb.append((((t >> 8) + t) >> 8).astype(np.int16))
+        return tuple(rgb)
+    return tuple(arr[..., i].astype(np.int16) for i in range(3))
+
+
+def is_red(arr: np.ndarray, mode: str = "RGBA") -> np.ndarray:
+    """
+    Masque booléen : pixel rouge si R est nettement supérieur à G et B (écart > 30).
+    arr : tableau numpy de shape (..., canaux) dans le mode `mode`.
+    """
+    r, g, b = rgb_channels(arr, mode)
+    return (r > g + 30) & (r > b + 30)
+
+
+def is_neutral_dark(arr: np.ndarray, mode: str = "RGBA") -> np.ndarray:
+    """
+    Masque des lignes noires du cadre : canaux quasi égaux (gris neutre,
+    max - min < 10) et assez sombre pour ne pas être du blanc (max < 200).
+    """
+    r, g, b = rgb_channels(arr, mode)
+    hi = np.maximum(np.maximum(r, g), b)
+    lo = np.minimum(np.minimum(r, g), b)
+    return (hi - lo < 10) & (hi < 200)
+
+
+def is_white(arr: np.ndarray, mode: str = "RGBA") -> np.ndarray:
+    r, g, b = rgb_channels(arr, mode)
+    return (r > 200) & (g > 200) & (b > 200)
+
+
+def is_black(arr: np.ndarray, mode: str = "RGBA") -> np.ndarray:
+    r, g, b = rgb_channels(arr, mode)
+    return (r < 30) & (g < 30) & (b < 30)
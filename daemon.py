@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Démon de traitement : les travaux arrivent par dossier chaud, dossier spool ou
+socket Unix, et sont exécutés par un pool de processus gardé chaud (imports,
+cache des mires). Le nombre de travaux simultanés est borné par le nombre de
+processus et par un budget mémoire.
+
+    python daemon.py --watch /plaques/in -d /plaques/out --mode 2 -j 4 --memory_budget_mb 16000
+    python daemon.py --spool /plaques/spool --socket /tmp/miredit.sock
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from batch import Job, WorkerPool, _init_worker, _is_image, _options_argv, _read_manifest
+from cli import parse_args, parse_daemon_args
+from main import output_path, preload
+from planner import plan_memory
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_job_bytes(args) -> int:
+    """
+    Mémoire de pointe estimée d'un travail, d'après l'en-tête de l'image (rien n'est décodé) :
+    celle de la stratégie que retiendra le planificateur (voir planner.plan_memory),
+    avec le padding de centrage dans le pire cas.
+    """
+    return plan_memory(args, output_path(args), measure_padding=False).peak
+
+
+def _write_json(path: Path, data: dict) -> None:
+    """Écriture atomique : un lecteur ne voit jamais de fichier à moitié écrit."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _move_to(path: Path, folder: Path) -> Path:
+    folder.mkdir(exist_ok=True)
+    return Path(shutil.move(str(path), str(folder / path.name)))
+
+
+def _init_daemon_worker(memory_mb: int | None) -> None:
+    """
+    Processus de travail : Ctrl-C et SIGTERM, reçus par tout le groupe de
+    processus, sont ignorés — c'est le démon qui termine les travaux en cours
+    puis ferme le pool.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    _init_worker(memory_mb)
+
+
+def _status_name(image: Path, job_id: str) -> str:
+    """Nom du fichier de statut : l'id distingue deux travaux sur des images de même nom."""
+    safe_id = re.sub(r"[^\w.-]", "_", job_id)
+    return f"{image.stem}_{safe_id}_job.json"
+
+
+@dataclass
+class DaemonJob:
+    """Un travail du démon et son état, recopié dans <image>_<id>_job.json à chaque changement."""
+    id: str
+    job: Job
+    origin: str                      # "watch", "spool" ou "socket"
+    estimate: int = 0
+    status: dict = field(default_factory=dict)
+    status_path: Path | None = None
+    done: threading.Event = field(default_factory=threading.Event)
+    on_done: list = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def update(self, **info) -> None:
+        with self._lock:
+            self.status.update(info)
+            if self.status_path is None:
+                return
+            try:
+                _write_json(self.status_path, self.status)
+            except OSError as e:
+                logger.warning(f"Statut non écrit ({self.status_path}) : {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.status)
+
+    def when_done(self, callback) -> None:
+        """Appelle `callback(self)` à la fin du travail (tout de suite s'il est déjà terminé)."""
+        with self._lock:
+            if not self.done.is_set():
+                self.on_done.append(callback)
+                return
+        callback(self)
+
+    def complete(self) -> list:
+        """Marque le travail terminé ; retourne les rappels à exécuter."""
+        with self._lock:
+            self.done.set()
+            return list(self.on_done)
+
+
+class Daemon:
+    """
+    File de travaux et pool de processus persistant.
+
+    `submit()` peut être appelé depuis n'importe quel thread (scrutation des
+    dossiers, socket) ; les travaux démarrent dans l'ordre d'arrivée, tant
+    qu'il reste un processus libre et que leur estimation mémoire tient dans
+    le budget. Un travail plus gros que le budget entier démarre seul.
+
+    Un processus de travail tué (OOM killer, signal) fait échouer son seul
+    travail, dont la réservation mémoire est libérée (voir batch.WorkerPool).
+    """
+
+    def __init__(
+        self,
+        defaults: dict,
+        workers: int,
+        memory_budget_mb: int | None = None,
+        worker_memory_mb: int | None = None,
+        jobs_per_worker: int | None = None,
+    ):
+        self.base_argv = _options_argv(defaults)
+        self.output_dir = defaults.get("output_dir")
+        self.workers = max(1, workers)
+        self.budget = memory_budget_mb * 1024**2 if memory_budget_mb else None
+        self._pool = WorkerPool(
+            processes=self.workers,
+            initializer=_init_daemon_worker,
+            initargs=(worker_memory_mb,),
+            maxtasksperchild=jobs_per_worker,
+        )
+        self._lock = threading.RLock()
+        self._queue: deque[DaemonJob] = deque()
+        self._running: dict[str, DaemonJob] = {}
+        self._reserved = 0
+        self._counter = 0
+        self.finished = {"ok": 0, "error": 0}
+
+    def submit(self, image: Path, options: dict, origin: str, job_id: str | None = None) -> DaemonJob:
+        """Ajoute un travail (options : clés du manifeste batch, qui surchargent les défauts)."""
+        argv = ["-i", str(image)] + self.base_argv + _options_argv(options)
+        with self._lock:
+            self._counter += 1
+            job_id = job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{self._counter:04d}"
+        djob = DaemonJob(job_id, Job(Path(image), argv), origin)
+        djob.status = {"id": job_id, "image": str(image), "origin": origin, "submitted": time.time()}
+        # Avant toute validation : un travail refusé ici écrit aussi son statut (-d, dossier chaud, ou à côté de l'image)
+        out_dir = options.get("output_dir") or self.output_dir
+        djob.status_path = Path(out_dir or Path(image).parent) / _status_name(Path(image), job_id)
+        if out_dir:
+            try:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+            except OSError:
+                pass  # signalé à l'écriture du statut
+
+        try:
+            args = parse_args(argv)
+            djob.estimate = estimate_job_bytes(args)
+            out_path = output_path(args)
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            djob.status_path = out_path.parent / _status_name(args.image, job_id)
+        except SystemExit:
+            self._finish(djob, {"status": "error", "error": f"Arguments invalides : {' '.join(argv)}", "seconds": 0})
+            return djob
+        except Exception as e:
+            self._finish(djob, {"status": "error", "error": f"{type(e).__name__}: {e}", "seconds": 0})
+            return djob
+
+        djob.update(status="queued", estimate_bytes=djob.estimate, output=str(out_path))
+        with self._lock:
+            self._queue.append(djob)
+        self._dispatch()
+        return djob
+
+    def _fits(self, djob: DaemonJob) -> bool:
+        if self.budget is None or not self._running:
+            return True
+        return self._reserved + djob.estimate <= self.budget
+
+    def _dispatch(self) -> None:
+        """Démarre les travaux en tête de file tant que processus et budget le permettent."""
+        with self._lock:
+            while self._queue and len(self._running) < self.workers and self._fits(self._queue[0]):
+                djob = self._queue.popleft()
+                if self.budget is not None and djob.estimate > self.budget:
+                    logger.warning(
+                        f"{djob.job.image.name} : estimation {djob.estimate / 1024**2:.0f} Mo "
+                        f"au-delà du budget, traité seul"
+                    )
+                self._running[djob.id] = djob
+                self._reserved += djob.estimate
+                djob.update(status="running", started=time.time())
+                self._pool.submit(djob.job, lambda result, djob=djob: self._finish(djob, result))
+
+    def _finish(self, djob: DaemonJob, result: dict) -> None:
+        with self._lock:
+            if self._running.pop(djob.id, None) is not None:
+                self._reserved -= djob.estimate
+            self.finished["ok" if result["status"] == "ok" else "error"] += 1
+        djob.update(status=result["status"], error=result["error"], seconds=result["seconds"], finished=time.time())
+        if result["status"] == "ok":
+            logger.info(f"OK     {djob.job.image}  ({result['seconds']}s)  [{djob.origin} {djob.id}]")
+        else:
+            logger.error(f"ÉCHEC  {djob.job.image}  — {result['error']}  [{djob.origin} {djob.id}]")
+        for callback in djob.complete():
+            try:
+                callback(djob)
+            except OSError as e:
+                logger.warning(f"{djob.job.image.name} : {e}")
+        self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "running": len(self._running),
+                "reserved_bytes": self._reserved,
+                "budget_bytes": self.budget,
+                "finished": dict(self.finished),
+            }
+
+    def close(self) -> None:
+        """Abandonne les travaux en attente et attend ceux en cours."""
+        with self._lock:
+            cancelled, self._queue = list(self._queue), deque()
+        for djob in cancelled:
+            djob.update(status="cancelled", finished=time.time())
+            djob.complete()
+        self._pool.close()
+
+
+# ─────────────────────────────────────────────
+# Sources de travaux
+# ─────────────────────────────────────────────
+
+class HotFolder:
+    """
+    Dossier chaud : une image est prise quand sa taille et sa date n'ont pas
+    bougé entre deux scrutations (copie terminée). Traitée, elle est déplacée
+    dans done/ ou failed/ ; sorties dans <dossier>/out sauf -d explicite.
+    """
+
+    def __init__(self, folder: Path, daemon: Daemon, output_dir: Path | None = None):
+        self.folder = folder
+        self.daemon = daemon
+        self.output_dir = output_dir or folder / "out"
+        self._sizes: dict[Path, tuple[int, int]] = {}
+        self._active: set[Path] = set()
+
+    def scan(self) -> None:
+        seen = {}
+        for path in sorted(self.folder.iterdir()):
+            if not path.is_file() or not _is_image(path) or path in self._active:
+                continue
+            st = path.stat()
+            seen[path] = (st.st_size, st.st_mtime_ns)
+            if self._sizes.get(path) == seen[path]:
+                self._active.add(path)
+                djob = self.daemon.submit(path, {"output_dir": self.output_dir}, origin="watch")
+                djob.when_done(self._release)
+        self._sizes = seen
+
+    def _release(self, djob: DaemonJob) -> None:
+        path = djob.job.image
+        _move_to(path, self.folder / ("done" if djob.status["status"] == "ok" else "failed"))
+        self._active.discard(path)
+
+
+class SpoolFolder:
+    """
+    Dossier spool : un fichier .json par demande (un travail, une liste, ou
+    {"jobs": [...]}, mêmes clés que le manifeste batch). Le client l'écrit sous
+    un autre nom puis le renomme en .json. Le fichier passe dans running/ le temps
+    du traitement, puis dans done/ (tout a réussi) ou failed/. Au démarrage, les
+    demandes restées dans running/ (arrêt brutal) sont reprises.
+    """
+
+    def __init__(self, folder: Path, daemon: Daemon):
+        self.folder = folder
+        self.daemon = daemon
+        for path in sorted((folder / "running").glob("*.json")):
+            logger.info(f"Reprise de {path.name}")
+            shutil.move(str(path), str(folder / path.name))
+
+    def scan(self) -> None:
+        for path in sorted(self.folder.glob("*.json")):
+            try:
+                rows = _read_manifest(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Demande illisible {path.name} : {e}")
+                _move_to(path, self.folder / "failed")
+                continue
+            claimed = _move_to(path, self.folder / "running")
+            pending = {"count": len(rows), "failed": False}
+
+            def release(djob: DaemonJob, claimed=claimed, pending=pending) -> None:
+                pending["count"] -= 1
+                pending["failed"] |= djob.status["status"] != "ok"
+                if pending["count"] == 0:
+                    _move_to(claimed, self.folder / ("failed" if pending["failed"] else "done"))
+
+            for i, row in enumerate(rows):
+                image = row.pop("image")
+                job_id = row.pop("id", None) or f"{path.stem}-{i}"
+                djob = self.daemon.submit(image, row, origin="spool", job_id=job_id)
+                djob.when_done(release)
+
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    """
+    Une requête JSON par ligne :
+        {"image": "...", <options>, "wait": true}  → statut à l'arrivée (puis final si wait)
+        {"cmd": "status"}                          → état de la file
+    """
+
+    def _reply(self, data: dict) -> None:
+        self.wfile.write((json.dumps(data, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+
+    def handle(self) -> None:
+        daemon: Daemon = self.server.daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get("cmd") == "status":
+                    self._reply(daemon.stats())
+                    continue
+                wait = _is_wait(request.pop("wait", False))
+                image = request.pop("image")
+            except (ValueError, KeyError, AttributeError) as e:
+                self._reply({"status": "error", "error": f"Requête invalide : {e}"})
+                continue
+            djob = daemon.submit(image, request, origin="socket", job_id=request.pop("id", None))
+            self._reply(djob.snapshot())
+            if wait:
+                djob.done.wait()
+                self._reply(djob.snapshot())
+
+
+def _is_wait(value) -> bool:
+    return value is True or str(value).strip().lower() in ("1", "true", "yes", "oui")
+
+
+class SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, daemon: Daemon):
+        if path.exists():
+            path.unlink()
+        super().__init__(str(path), _SocketHandler)
+        self.daemon = daemon
+
+
+def send_job(socket_path: Path, request: dict) -> list[dict]:
+    """Client : envoie une requête au démon et retourne ses réponses (deux si "wait")."""
+    expected = 2 if _is_wait(request.get("wait", False)) and "cmd" not in request else 1
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall((json.dumps(request, default=str) + "\n").encode("utf-8"))
+        replies = []
+        with sock.makefile("r", encoding="utf-8") as fh:
+            for line in fh:
+                replies.append(json.loads(line))
+                if len(replies) == expected:
+                    break
+    return replies
+
+
+def main() -> int:
+    args = parse_daemon_args()
+    if args.write_threads == 0:
+        args.write_threads = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    if args.threads == 0:
+        args.threads = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    defaults = vars(args)
+    preload()  # workers chauds : les modules sont hérités au fork
+    daemon = Daemon(defaults, args.workers, args.memory_budget_mb, args.worker_memory_mb, args.jobs_per_worker)
+
+    folders = [HotFolder(folder, daemon, args.output_dir) for folder in args.watch]
+    folders += [SpoolFolder(folder, daemon) for folder in args.spool]
+    server = None
+    if args.socket:
+        server = SocketServer(args.socket, daemon)
+        threading.Thread(target=server.serve_forever, name="socket", daemon=True).start()
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    sources = [str(f.folder) for f in folders] + ([str(args.socket)] if args.socket else [])
+    logger.info(f"Démon prêt — {args.workers} processus, sources : {', '.join(sources)}")
+    while not stop.is_set():
+        for folder in folders:
+            try:
+                folder.scan()
+            except OSError as e:
+                logger.error(f"Scrutation de {folder.folder} : {e}")
+        stop.wait(args.poll)
+
+    logger.info("Arrêt : fin des travaux en cours…")
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        args.socket.unlink(missing_ok=True)
+    daemon.close()
+    logger.info(f"Arrêté — {daemon.stats()['finished']}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    raise SystemExit(main())
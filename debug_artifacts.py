@@ -0,0 +1,222 @@
+import logging
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from band_reader import BandReader, PaddedReader, as_band_reader
+from colors import array_image, image_array
+from models import PrintSettings
+from pipeline import iter_padded_bands
+
+logger = logging.getLogger(__name__)
+
+# Largeur maximale des aperçus ; le facteur de réduction en découle
+PREVIEW_MAX_WIDTH = 2048
+
+GREEN   = (0, 255, 0)
+BLUE    = (0, 90, 255)
+MAGENTA = (255, 0, 255)
+
+
+def preview_factor(width: int, max_width: int = PREVIEW_MAX_WIDTH) -> int:
+    """Facteur de réduction entier pour ramener `width` sous `max_width`."""
+    return max(1, -(-width // max_width))
+
+
+def reduce_bands(bands: Iterable[np.ndarray], mode: str, factor: int) -> Image.Image:
+    """
+    Aperçu réduit (moyenne par blocs, `Image.reduce`) d'une image fournie par bandes.
+    Les bandes sont regroupées par multiples de `factor` lignes : seule une bande
+    réduite est ajoutée à l'aperçu à chaque pas, l'image pleine résolution n'est jamais assemblée.
+    """
+    reduced, carry = [], None
+    for band in bands:
+        rows = band if carry is None else np.concatenate([carry, band])
+        usable = rows.shape[0] - rows.shape[0] % factor
+        if usable:
+            reduced.append(image_array(array_image(np.ascontiguousarray(rows[:usable]), mode).reduce(factor)))
+        carry = rows[usable:].copy() if usable < rows.shape[0] else None
+    if carry is not None:
+        reduced.append(image_array(array_image(carry, mode).reduce(factor)))
+    return array_image(np.concatenate(reduced), mode)
+
+
+def _viewable(img: Image.Image) -> Image.Image:
+    """Aperçu RGB lisible : transparence posée sur blanc, CMYK et L convertis."""
+    if img.mode == "RGBA":
+        white = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        return Image.alpha_composite(white, img).convert("RGB")
+    return img.convert("RGB")
+
+
+def _draw_centre(img: Image.Image, width: int, factor: int) -> None:
+    """Trait vert au centre d'une image de `width` px (pleine résolution)."""
+    from PIL import ImageDraw
+
+    cx = width // 2 // factor
+    ImageDraw.Draw(img).line([(cx, 0), (cx, img.height - 1)], fill=GREEN, width=3)
+
+
+def _draw_columns(img: Image.Image, columns: list[tuple[int, int]], factor: int, color: tuple) -> None:
+    """Colonnes [start, end] (pleine résolution, bornes incluses) tracées sur l'aperçu, 1 px minimum."""
+    from PIL import ImageDraw
+
+    draw = ImageDraw.Draw(img)
+    for start, end in columns:
+        x0 = start // factor
+        x1 = max(end // factor, x0)
+        draw.rectangle([x0, 0, x1, img.height - 1], fill=color)
+
+
+def centre_preview(
+    source: np.ndarray | BandReader,
+    pad_left: int,
+    pad_right: int,
+    max_width: int = PREVIEW_MAX_WIDTH,
+) -> Image.Image:
+    """Aperçu réduit (RGB) de l'image centrée avec le trait vert du centre, calculé tout de suite."""
+    reader = as_band_reader(source)
+    width = reader.width + pad_left + pad_right
+    factor = preview_factor(width, max_width)
+    preview = _viewable(reduce_bands(iter_padded_bands(reader, pad_left, pad_right), reader.mode, factor))
+    _draw_centre(preview, width, factor)
+    return preview
+
+
+class DebugArtifacts:
+    """
+    Aperçus de contrôle d'un traitement, désactivés par défaut (--debug) :
+
+    - `<image>_debug_centre.png` : image centrée, trait vert au centre ;
+    - `<image>_debug_frame.png`  : lignes du cadre détectées (noires en bleu, rouges en magenta) ;
+    - `<image>_debug_final.png`  : sortie finale (mires, traits de repérage).
+
+    Les aperçus sont réduits (au plus PREVIEW_MAX_WIDTH px de large) et écrits
+    par un thread d'arrière-plan. Une source qui peut encore être modifiée en
+    place (buffer partagé, `stable=False`) est réduite tout de suite ; le tracé
+    et l'encodage restent en arrière-plan. Une erreur d'aperçu est journalisée,
+    elle ne fait jamais échouer le traitement.
+    """
+
+    def __init__(self, out_dir: Path, stem: str, enabled: bool = False, max_width: int = PREVIEW_MAX_WIDTH):
+        self.out_dir = Path(out_dir)
+        self.stem = stem
+        self.enabled = enabled
+        self.max_width = max_width
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug") if enabled else None
+        self._futures: list[tuple[Path, Future]] = []
+
+    def path(self, name: str) -> Path:
+        return self.out_dir / f"{self.stem}_debug_{name}.png"
+
+    def _submit(
+        self,
+        name: str,
+        reader: BandReader,
+        bands: Callable[[], Iterable[np.ndarray]],
+        width: int,
+        draw: Callable[[Image.Image, int], None] | None,
+        stable: bool,
+    ) -> None:
+        factor = preview_factor(width, self.max_width)
+        path = self.path(name)
+
+        def reduce() -> Image.Image:
+            return reduce_bands(bands(), reader.mode, factor)
+
+        def write(preview: Image.Image) -> None:
+            preview = _viewable(preview)
+            if draw is not None:
+                draw(preview, factor)
+            preview.save(path, compress_level=1)
+            logger.debug(f"Aperçu écrit : {path}  (1/{factor})")
+
+        if stable or reader.array is None:
+            self._futures.append((path, self._executor.submit(lambda: write(reduce()))))
+        else:
+            preview = reduce()
+            self._futures.append((path, self._executor.submit(write, preview)))
+
+    def centre(
+        self,
+        source: np.ndarray | BandReader,
+        pad_left: int,
+        pad_right: int,
+        stable: bool = False,
+    ) -> None:
+        """Image centrée (padding compris) avec le trait vert du centre."""
+        if not self.enabled:
+            return
+        reader = as_band_reader(source)
+        width = reader.width + pad_left + pad_right
+
+        draw = lambda img, factor: _draw_centre(img, width, factor)
+        bands = lambda: iter_padded_bands(reader, pad_left, pad_right)
+        self._submit("centre", reader, bands, width, draw, stable)
+
+    def frame_lines(
+        self,
+        source: np.ndarray | BandReader,
+        lines: dict,
+        pad_left: int = 0,
+        pad_right: int = 0,
+        stable: bool = False,
+    ) -> None:
+        """
+        Image centrée avec les lignes du cadre détectées : `lines` est le dict de
+        detect_frame_lines, en coordonnées de l'image centrée.
+        """
+        if not self.enabled:
+            return
+        reader = as_band_reader(source)
+
+        def draw(img: Image.Image, factor: int) -> None:
+            _draw_columns(img, lines["black_left"] + lines["black_right"], factor, BLUE)
+            _draw_columns(img, lines["red_lines"], factor, MAGENTA)
+
+        bands = lambda: iter_padded_bands(reader, pad_left, pad_right)
+        self._submit("frame", reader, bands, reader.width + pad_left + pad_right, draw, stable)
+
+    def inputs(
+        self,
+        source: np.ndarray | BandReader,
+        settings: PrintSettings,
+        cadre_mm: float,
+        pad_left: int,
+        pad_right: int,
+        stable: bool = False,
+    ) -> None:
+        """Aperçus du centrage et des lignes du cadre, détectées sur l'image centrée."""
+        if not self.enabled:
+            return
+        # Chargés avec les aperçus seulement : un traitement sans --debug ne charge ni ImageDraw ni le Mode 2
+        from mode2 import detect_frame_lines
+
+        reader = as_band_reader(source)
+        self.centre(reader, pad_left, pad_right, stable=stable)
+        lines = detect_frame_lines(PaddedReader(reader, pad_left, pad_right), settings, cadre_mm)
+        self.frame_lines(reader, lines, pad_left, pad_right, stable=stable)
+
+    def final(self, source: np.ndarray | BandReader | Path, stable: bool = True, name: str = "final") -> None:
+        """
+        Sortie finale : buffer du résultat, ou fichier écrit (relu en arrière-plan).
+        `name` distingue les sorties d'une même image (variantes).
+        """
+        if not self.enabled:
+            return
+        reader = as_band_reader(source)
+        bands = lambda: (rows for _, rows in reader.iter_rows(256))
+        self._submit(name, reader, bands, reader.width, None, stable)
+
+    def close(self) -> None:
+        """Attend la fin des écritures en cours."""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        for path, future in self._futures:
+            if future.exception() is not None:
+                logger.warning(f"Aperçu non écrit ({path.name}) : {future.exception()}")
+        self._futures.clear()
@@ -0,0 +1,117 @@
+import logging
+from collections.abc import Callable
+
+import numpy as np
+
+from band_reader import BandReader
+
+logger = logging.getLogger(__name__)
+
+
+# Confiance en dessous de laquelle une détection est signalée (log, --dry_run)
+LOW_CONFIDENCE = 0.75
+
+
+def find_runs(mask: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Trouve les plages de pixels True consécutifs dans un masque 1D.
+    Retourne une liste de (start, end) en indices inclusifs.
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    starts = np.where(~padded[:-1] &  padded[1:])[0]         # False → True : début de plage
+    ends   = np.where( padded[:-1] & ~padded[1:])[0] - 1     # True → False : fin (-1 : décalage du padding)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class RunDetector:
+    """
+    Détection des plages d'une couleur (colonnes noires du cadre, lignes rouges)
+    par vote sur plusieurs lignes d'une même bande, au lieu d'une seule ligne de
+    scan : une poussière ou un pixel d'anticrénelage sur une ligne ne déplace ni
+    n'ajoute de plage.
+
+    - `samples` lignes réparties sur la bande sont classées en un seul passage
+      vectorisé (colors.is_red, is_neutral_dark : canaux en int16) ;
+    - chaque colonne est retenue si plus de `quorum` des lignes votantes la
+      marquent ; une ligne sans aucun pixel de la couleur s'abstient (une ligne
+      rouge qui ne couvre qu'une partie de la bande reste détectée) ;
+    - la confiance est l'accord le plus faible entre lignes votantes, sur les
+      colonnes marquées au moins une fois : 1.0 quand toutes les lignes
+      s'accordent, proche de `quorum` quand le vote est serré.
+
+    Seule la bande demandée est lue (BandReader.region), en une lecture.
+    `samples=1` revient au scan d'une seule ligne, au milieu de la bande.
+    """
+
+    def __init__(self, samples: int = 9, quorum: float = 0.5):
+        self.samples = samples
+        self.quorum = quorum
+
+    @property
+    def params(self) -> tuple:
+        """Réglages qui changent le résultat (clés du cache des sources)."""
+        return self.samples, self.quorum
+
+    def sample_rows(self, y0: int, y1: int) -> np.ndarray:
+        """Au plus `samples` lignes de [y0, y1), régulièrement espacées ; la ligne du milieu seule pour 1."""
+        if self.samples <= 1 or y1 - y0 <= 1:
+            return np.array([(y0 + y1 - 1) // 2])
+        return np.unique(np.linspace(y0, y1 - 1, min(self.samples, y1 - y0)).round().astype(np.int64))
+
+    def vote(self, masks: np.ndarray) -> dict:
+        """
+        Plages retenues par le vote des lignes de `masks` (n, largeur), booléen.
+        Retourne {"runs": [(start, end)…], "confidence": float, "run_confidence": [float…]}.
+        """
+        voters = masks[masks.any(axis=1)]
+        n = voters.shape[0]
+        if n == 0:
+            return {"runs": [], "confidence": 1.0, "run_confidence": []}
+        votes = np.count_nonzero(voters, axis=0)
+        kept = votes > self.quorum * n
+        runs = find_runs(kept)
+        marked = votes > 0
+        agree = np.where(kept, votes, n - votes)[marked]
+        return {
+            "runs": runs,
+            "confidence": round(float(agree.min()) / n, 3),
+            "run_confidence": [round(float(votes[s:e + 1].mean()) / n, 3) for s, e in runs],
+        }
+
+    def detect(
+        self,
+        reader: BandReader,
+        x0: int,
+        y0: int,
+        x1: int,
+        y1: int,
+        classify: Callable[[np.ndarray, str], np.ndarray],
+    ) -> dict:
+        """
+        Vote sur la bande [x0, x1) × [y0, y1) ; `classify(pixels, mode)` donne le
+        masque de la couleur cherchée. Les plages sont relatives à x0.
+        """
+        rows = self.sample_rows(y0, y1)
+        band = reader.region(x0, int(rows[0]), x1, int(rows[-1]) + 1)
+        return self.vote(classify(band[rows - rows[0]], reader.mode))
+
+
+# Détecteur partagé par tous les traitements du processus ; configuré par job (--detect_samples)
+DETECTOR = RunDetector()
+
+
+def configure_detection(samples: int = 9, quorum: float = 0.5) -> None:
+    """Nombre de lignes échantillonnées et quorum du vote de détection."""
+    if samples < 1 or not 0 <= quorum < 1:
+        raise ValueError(f"Détection : samples ≥ 1 et 0 ≤ quorum < 1 (reçu {samples}, {quorum})")
+    DETECTOR.samples = samples
+    DETECTOR.quorum = quorum
+
+
+def warn_if_unsure(name: str, confidence: float) -> None:
+    """Avertit quand le vote d'une détection est serré (confiance < LOW_CONFIDENCE)."""
+    if confidence < LOW_CONFIDENCE:
+        logger.warning(
+            f"Détection peu sûre ({name}) : confiance {confidence:.2f} — "
+            f"les lignes échantillonnées ne s'accordent pas, vérifier la plaque (--debug)"
+        )
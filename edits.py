@@ -0,0 +1,322 @@
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from band_reader import BandReader
+from parallel import KERNELS
+from scratch import SCRATCH
+from writer import WriteOptions, open_writer
+
+logger = logging.getLogger(__name__)
+
+# Rectangle (x0, y0, x1, y1), bornes exclusives, à remplir d'une couleur (dans le mode de travail)
+Fill = tuple[int, int, int, int, tuple[int, ...]]
+
+
+def apply_fills(band: np.ndarray, y_band: int, fills: list[Fill], x_shift: int = 0) -> None:
+    """
+    Applique les rectangles `fills` (dans l'ordre) sur une bande de lignes qui
+    commence à la ligne y_band de l'image ; x_shift décale les colonnes (marge du canvas).
+    """
+    n = band.shape[0]
+    for x0, y0, x1, y1, color in fills:
+        y0, y1 = max(y0, y_band), min(y1, y_band + n)
+        if y0 < y1:
+            band[y0 - y_band:y1 - y_band, x_shift + x0:x_shift + x1] = color
+
+
+def paste_alpha(dst: np.ndarray, src: np.ndarray) -> None:
+    """
+    Équivalent numpy de `Image.paste(src, box, src)` sur une zone transparente :
+    chaque canal est pondéré par l'alpha de src (même arrondi que Pillow, DIV255).
+    Écrit directement dans dst (vue sur le canvas), bande par bande.
+    """
+    band_rows = 256
+    for y in range(0, src.shape[0], band_rows):
+        band = src[y:y + band_rows]
+        alpha = band[..., 3:4]
+        if alpha.min() == 255:
+            dst[y:y + band_rows] = band
+            continue
+        tmp = band.astype(np.uint16) * alpha + 128
+        dst[y:y + band_rows] = ((tmp >> 8) + tmp) >> 8
+
+
+# ─────────────────────────────────────────────
+# Primitives
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True, eq=False)
+class Paste:
+    """
+    Collage d'un bloc à (x, y) du canvas, qui remplace ce qui est dessous :
+    `rows` (bande de mire…), ou l'image source de la liste si `rows` vaut None,
+    lue par bandes. Avec `blend`, les pixels sont pondérés par leur alpha.
+    """
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+    rows: np.ndarray | None = None
+    blend: bool = False
+    detail: str = ""
+
+    def apply(self, band: np.ndarray, y_band: int, image_rows: np.ndarray | None) -> None:
+        n = band.shape[0]
+        y0, y1 = max(self.y, y_band), min(self.y + self.height, y_band + n)
+        if y0 >= y1:
+            return
+        if self.rows is not None:
+            src = self.rows[y0 - self.y:y1 - self.y]
+        elif image_rows is not None:
+            src = image_rows
+        else:
+            return
+        dst = band[y0 - y_band:y1 - y_band, self.x:self.x + self.width]
+        if self.blend:
+            paste_alpha(dst, src)
+        else:
+            dst[:] = src
+
+    def to_dict(self) -> dict:
+        d = {"op": "paste", "source": self.name, "box": [self.x, self.y, self.x + self.width, self.y + self.height]}
+        if self.blend:
+            d["blend"] = "alpha"
+        if self.detail:
+            d["detail"] = self.detail
+        return d
+
+
+@dataclass(frozen=True)
+class FillRect:
+    """Rectangle plein [x0, x1) × [y0, y1) du canvas, dans le mode de travail."""
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    color: tuple[int, ...]
+    label: str = ""
+
+    def apply(self, band: np.ndarray, y_band: int, image_rows: np.ndarray | None = None) -> None:
+        apply_fills(band, y_band, [(self.x0, self.y0, self.x1, self.y1, self.color)])
+
+    def to_dict(self) -> dict:
+        d = {"op": "fill", "box": [self.x0, self.y0, self.x1, self.y1], "color": list(self.color)}
+        if self.label:
+            d["label"] = self.label
+        return d
+
+
+# ─────────────────────────────────────────────
+# Liste d'affichage
+# ─────────────────────────────────────────────
+
+@dataclass
+class EditList:
+    """
+    Ce que produit un mode, sans aucun pixel : un canvas (taille, mode, fond)
+    et la liste ordonnée des primitives à y appliquer — collages (image
+    source, bandes de mire) et rectangles pleins (colonnes du cadre, lignes
+    rouges, traits de repérage). Le centrage n'est que la position de l'image
+    dans un canvas plus large.
+
+    Une liste est rendue en une seule passe de haut en bas (iter_edit_bands) :
+    chaque pixel de sortie est écrit une fois par le fond ou par un collage,
+    puis par les rectangles qui le couvrent.
+    """
+    width: int
+    height: int
+    mode: str
+    background: tuple[int, ...]
+    source: BandReader
+    edits: list[Paste | FillRect] = field(default_factory=list)
+
+    @property
+    def channels(self) -> int:
+        return len(self.background)
+
+    @property
+    def image(self) -> Paste | None:
+        return next((e for e in self.edits if isinstance(e, Paste) and e.rows is None), None)
+
+    def paste_image(self, x: int, y: int, blend: bool = False) -> None:
+        self.edits.append(Paste("image", x, y, self.source.width, self.source.height, blend=blend))
+
+    def paste_rows(self, name: str, rows: np.ndarray, x: int, y: int, detail: str = "") -> None:
+        self.edits.append(Paste(name, x, y, rows.shape[1], rows.shape[0], rows=rows, detail=detail))
+
+    def fill(
+        self,
+        fills: Iterable[Fill],
+        label: str = "",
+        dx: int = 0,
+        dy: int = 0,
+        rows: tuple[int, int] | None = None,
+    ) -> None:
+        """Ajoute des rectangles décalés de (dx, dy), limités aux lignes `rows` (avant décalage)."""
+        for x0, y0, x1, y1, color in fills:
+            if rows is not None:
+                y0, y1 = max(y0, rows[0]), min(y1, rows[1])
+                if y0 >= y1:
+                    continue
+            self.edits.append(FillRect(x0 + dx, y0 + dy, x1 + dx, y1 + dy, tuple(color), label))
+
+    def to_dict(self) -> dict:
+        return {
+            "canvas": {"width": self.width, "height": self.height, "mode": self.mode,
+                       "background": list(self.background)},
+            "source": {"width": self.source.width, "height": self.source.height, "mode": self.source.mode},
+            "edits": [edit.to_dict() for edit in self.edits],
+        }
+
+    def dump(self, path: Path) -> None:
+        """Écrit la liste en JSON (audit d'une mise en page, sans rendu)."""
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        logger.info(f"Liste d'édition écrite : {path}")
+
+
+# ─────────────────────────────────────────────
+# Rendu
+# ─────────────────────────────────────────────
+
+def _covered(edits: EditList, y0: int, y1: int) -> list[tuple[int, int]]:
+    """Colonnes [x0, x1) que des collages couvrent sur toutes les lignes [y0, y1), triées."""
+    return sorted(
+        (e.x, e.x + e.width) for e in edits.edits
+        if isinstance(e, Paste) and e.y <= y0 and e.y + e.height >= y1
+    )
+
+
+def _fill_background(band: np.ndarray, covered: list[tuple[int, int]], color: tuple[int, ...]) -> None:
+    """Pose le fond hors des colonnes couvertes : chaque pixel n'est écrit qu'une fois."""
+    x = 0
+    for x0, x1 in covered:
+        if x0 > x:
+            band[:, x:x0] = color
+        x = max(x, x1)
+    if x < band.shape[1]:
+        band[:, x:] = color
+
+
+def _render_band(
+    edits: EditList,
+    band: np.ndarray,
+    y0: int,
+    image_rows: np.ndarray | None,
+    background: bool = True,
+) -> np.ndarray:
+    """Rend les lignes [y0, y0 + n) du canvas dans `band` ; `image_rows` : lignes de l'image qu'elles couvrent."""
+    if background:
+        _fill_background(band, _covered(edits, y0, y0 + band.shape[0]), edits.background)
+    for edit in edits.edits:
+        edit.apply(band, y0, image_rows)
+    return band
+
+
+def _segments(edits: EditList) -> list[tuple[int, int]]:
+    """Tranches [y0, y1) du canvas coupées aux bords des collages : chacune est couverte par les mêmes."""
+    cuts = {0, edits.height}
+    for edit in edits.edits:
+        if isinstance(edit, Paste):
+            cuts.update((edit.y, edit.y + edit.height))
+    cuts = sorted(c for c in cuts if 0 <= c <= edits.height)
+    return list(zip(cuts, cuts[1:]))
+
+
+def iter_edit_bands(
+    edits: EditList,
+    band_rows: int = 256,
+    canvas: np.ndarray | None = None,
+    background: bool = True,
+) -> Iterator[np.ndarray]:
+    """
+    Rend la liste de haut en bas, bande par bande. Les bandes sont coupées aux
+    bords des collages ; sur la hauteur de l'image, elles suivent la lecture de
+    la source (iter_rows), qui n'est parcourue qu'une fois.
+    Avec `canvas`, les bandes sont des vues sur ce buffer (rendu en mémoire) ;
+    sinon un unique buffer de bande est réutilisé (rendu en flux).
+    `background=False` : le canvas porte déjà le fond (memmap à zéro).
+    """
+    image = edits.image
+    scratch = None
+
+    def render(y0: int, n: int, image_rows: np.ndarray | None) -> np.ndarray:
+        nonlocal scratch
+        if canvas is not None:
+            band = canvas[y0:y0 + n]
+        else:
+            if scratch is None or scratch.shape[0] < n:
+                scratch = np.empty((n, edits.width, edits.channels), dtype=np.uint8)
+            band = scratch[:n]
+        return _render_band(edits, band, y0, image_rows, background)
+
+    for y, stop in _segments(edits):
+        if image is not None and image.y <= y < image.y + image.height:
+            if y == image.y:
+                for y_src, rows in edits.source.iter_rows(band_rows):
+                    yield render(image.y + y_src, rows.shape[0], rows)
+            continue
+        for y0 in range(y, stop, band_rows):
+            yield render(y0, min(band_rows, stop - y0), None)
+
+
+def render_edits(edits: EditList, in_place: bool = False) -> np.ndarray:
+    """
+    Rend la liste en mémoire, dans un buffer du stockage de travail (scratch.py).
+    Avec `in_place`, quand l'image source est un tableau qui occupe déjà tout
+    le canvas, seules les autres primitives sont appliquées, sur ce tableau.
+
+    Une source déjà en mémoire est rendue par bandes indépendantes, réparties
+    sur les threads des noyaux (parallel.KERNELS) ; une source lue depuis le
+    fichier l'est de haut en bas, en une seule lecture.
+    """
+    image, source = edits.image, edits.source
+    row_bytes = edits.width * edits.channels
+    if (
+        in_place and image is not None and source.array is not None and not image.blend
+        and (image.x, image.y, image.width, image.height) == (0, 0, edits.width, edits.height)
+    ):
+        others = [edit for edit in edits.edits if edit is not image]
+
+        def apply_others(y0: int, y1: int) -> None:
+            for edit in others:
+                edit.apply(source.array[y0:y1], y0, None)
+
+        KERNELS.map_rows(apply_others, edits.height, row_bytes)
+        return source.array
+    canvas = SCRATCH.empty((edits.height, edits.width, edits.channels))
+    # Fond nul en memmap : le fichier creux est déjà à zéro, aucune page n'est écrite
+    background = not (SCRATCH.enabled and not any(edits.background))
+    if source.array is None:
+        for _ in iter_edit_bands(edits, canvas=canvas, background=background):
+            pass
+        return canvas
+
+    def render(y0: int, y1: int) -> None:
+        image_rows = None
+        if image is not None and image.y <= y0 < image.y + image.height:
+            image_rows = source.array[y0 - image.y:y1 - image.y]
+        _render_band(edits, canvas[y0:y1], y0, image_rows, background)
+
+    KERNELS.run(render, [band for y0, y1 in _segments(edits) for band in KERNELS.split(y0, y1, row_bytes)])
+    return canvas
+
+
+def write_edits(
+    edits: EditList,
+    out_path: Path,
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    options: WriteOptions = WriteOptions(),
+    band_rows: int = 256,
+) -> None:
+    """Rend la liste en flux dans `out_path` (PNG ou TIFF), sans jamais allouer le canvas complet."""
+    with open_writer(out_path, edits.width, edits.height, edits.mode, dpi, icc_profile, options) as out:
+        for band in iter_edit_bands(edits, band_rows):
+            out.write_rows(band)
+
@@ -1,86 +1,371 @@
 #!/usr/bin/env python3
+from __future__ import annotations  # annotations non évaluées : les types viennent d'imports différés
+
 import logging
 from pathlib import Path
-from PIL import Image
+
+from typing import TYPE_CHECKING
 
 from cli import parse_args
-from models import PrintSettings
-from mode1 import apply_mode1
-from mode2 import apply_mode2, apply_red_lines_noir
-from center_padding import center_padding
+from templates import find_mire
+
+if TYPE_CHECKING:
+    from debug_artifacts import DebugArtifacts
+    from models import PrintSettings
+    from profiling import StageProfiler
+    from writer import WriteOptions
+
+# Démarrage : seuls argparse et pathlib sont chargés au niveau du module. NumPy,
+# Pillow et les modules de traitement sont importés dans les fonctions qui les
+# utilisent, le module du mode choisi seulement — --help, une option invalide
+# ou une mire introuvable répondent sans les charger (bench.py --startup).
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
-TEMPLATES_DIR = Path(__file__).parent.parent / "mires_templates" 
+# Suffixe du fichier de sortie par défaut, par mode
+OUTPUT_SUFFIXES = {1: "_HC", 2: "_mod", 3: "_HC_mod"}
 
 
+def default_output_name(image: Path, mode: int, source_mode: str) -> str:
+    """<image><suffixe>.png ; .tif pour une source CMYK, que le PNG ne sait pas stocker."""
+    extension = ".tif" if source_mode == "CMYK" else ".png"
+    return image.stem + OUTPUT_SUFFIXES[mode] + extension
 
-def find_mire(lpi: float, hdpi: int, vdpi: int) -> Path:
-    resolution_dir = TEMPLATES_DIR / f"{hdpi}x{vdpi}"
-    mire_path = resolution_dir / f"{int(lpi)}.png"
 
-    if not resolution_dir.exists():
-        available = [d.name for d in TEMPLATES_DIR.iterdir() if d.is_dir()]
-        raise FileNotFoundError(
-            f"Aucun dossier de templates pour {hdpi}x{vdpi}.\n"
-            f"Résolutions disponibles : {available}"
-        )
-    if not mire_path.exists():
-        available = [f.stem for f in resolution_dir.glob("*.png")]
-        raise FileNotFoundError(
-            f"Aucune mire pour LPI={int(lpi)} à {hdpi}x{vdpi}.\n"
-            f"LPI disponibles : {available}"
-        )
-    return mire_path
+def output_path(args) -> Path:
+    """Fichier de sortie d'un traitement : -o ou nom par défaut, dans -d ou à côté de l'image."""
+    out_dir = args.output_dir if args.output_dir else args.image.parent
+    if args.output:
+        return out_dir / args.output
+    from PIL import Image
 
+    from colors import native_mode
 
-def run(args):
-    Image.MAX_IMAGE_PIXELS = None
+    with Image.open(args.image) as img:
+        source_mode = native_mode(img.mode)
+    return out_dir / default_output_name(args.image, args.mode, source_mode)
 
-    settings = PrintSettings(lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI)
 
+def edits_path(args, out_path: Path) -> Path | None:
+    """Fichier JSON de la liste d'édition d'une sortie (--dump_edits), à côté d'elle."""
+    return out_path.with_name(out_path.stem + "_edits.json") if args.dump_edits else None
+
+
+def write_options(args) -> WriteOptions:
+    """Réglages d'écriture de la sortie ; --fast impose le préréglage épreuvage."""
+    from writer import FAST_WRITE, WriteOptions
+
+    return WriteOptions(
+        compress_level=FAST_WRITE.compress_level if args.fast else args.compress_level,
+        compression=args.tiff_compression,
+        tile=args.tiff_tile,
+        threads=args.write_threads,
+        bigtiff=True if args.bigtiff else None,
+    )
+
+
+def _run_streamed(
+    args,
+    settings: PrintSettings,
+    mire_path: Path,
+    out_path: Path,
+    profiler: StageProfiler,
+    debug: DebugArtifacts,
+) -> None:
+    """
+    Traitement sans décoder l'image en entier : centrage et cadre analysés sur
+    bande, sortie écrite en flux, le centrage appliqué comme un décalage.
+    """
+    from PIL import Image
+
+    from center_padding import compute_padding
+    from source_cache import SOURCE_CACHE
+    from writer import WRITER_SUFFIXES
+
+    if out_path.suffix.lower() not in WRITER_SUFFIXES:
+        raise ValueError(f"--stream n'écrit que du PNG ou du TIFF (sortie demandée : {out_path.name})")
+
+    reader = SOURCE_CACHE.reader(args.image)
+    with Image.open(args.image) as img:
+        icc_profile = img.info.get("icc_profile")
+        dpi         = img.info.get("dpi", (args.HDPI, args.VDPI))
+    profiler.note(input_size=list(reader.size))
+
+    fills, label = [], ""
+    if args.mode == 3:
+        from mode3 import RED_LINES_LABEL, plan_mode3
+
+        label = RED_LINES_LABEL
+        with profiler.stage("plan_mode3"):
+            pad_left, pad_right, fills = plan_mode3(
+                reader, settings, cadre_mm=args.cadre, trait_noir_mm=args.trait_noir_mm,
+            )
+    else:
+        with profiler.stage("center_padding"):
+            pad_left, pad_right = compute_padding(reader, settings)
+    if debug.enabled:
+        with profiler.stage("debug"):
+            debug.inputs(reader, settings, args.cadre, pad_left, pad_right, stable=True)
+    logger.info(f"Sauvegarde (flux) : {out_path}")
+    with profiler.stage(f"mode{args.mode}_stream"):
+        if args.mode == 2:
+            from mode2 import write_mode2_streamed
+
+            write_mode2_streamed(
+                reader, settings, args.cadre, args.trait_noir_mm, out_path,
+                dpi=dpi, icc_profile=icc_profile, pad_left=pad_left, pad_right=pad_right,
+                options=write_options(args), dump_edits=edits_path(args, out_path),
+                incremental=args.incremental,
+            )
+        else:
+            from mode1 import write_mode1_streamed
+
+            write_mode1_streamed(
+                reader, mire_path, settings, args.bord_mire, out_path,
+                dpi=dpi, icc_profile=icc_profile, pad_left=pad_left, pad_right=pad_right, fills=fills,
+                options=write_options(args), label=label,
+                dump_edits=edits_path(args, out_path),
+            )
+    debug.final(out_path)
+
+
+def _run_variants(
+    args,
+    settings: PrintSettings,
+    mire_path: Path,
+    out_dir: Path,
+    profiler: StageProfiler,
+    debug: DebugArtifacts,
+    stream: bool = False,
+) -> None:
+    """
+    Plusieurs sorties (--variant) d'un seul décodage : le centrage est calculé une
+    fois, la détection du cadre une fois par valeur de cadre, puis chaque variante
+    est écrite en flux depuis le buffer partagé, qui n'est jamais modifié.
+    `stream` (--stream, ou choix du planificateur) : l'image n'est pas décodée en
+    entier, chaque variante relit la source par bandes ; l'analyse reste partagée.
+    """
+    from PIL import Image
+
+    from pipeline import PipelineContext
+    from source_cache import SOURCE_CACHE
+    from variants import SharedAnalysis, Variant, parse_variant, write_variant
+
+    if args.output:
+        raise ValueError("-o ne s'applique pas aux variantes : utiliser la clé output= de --variant")
+    base = Variant.from_args(args)
+    variants = [parse_variant(spec, base) for spec in args.variant]
+
+    if stream:
+        reader = SOURCE_CACHE.reader(args.image)
+        with Image.open(args.image) as img:
+            icc_profile = img.info.get("icc_profile")
+            dpi         = img.info.get("dpi", (args.HDPI, args.VDPI))
+    else:
+        with profiler.stage("decode") as rec, Image.open(args.image) as img:
+            ctx = PipelineContext.from_image(img, settings)
+            rec["size"] = [ctx.width, ctx.height]
+        reader, dpi, icc_profile = ctx.reader(), ctx.dpi, ctx.icc_profile
+    profiler.note(input_size=list(reader.size))
+
+    out_paths = [
+        out_dir / variant.output_name(default_output_name(args.image, variant.mode, reader.mode), base)
+        for variant in variants
+    ]
+    if len(set(out_paths)) != len(out_paths):
+        raise ValueError(f"Plusieurs variantes ont la même sortie : {[p.name for p in out_paths]}")
+
+    shared = SharedAnalysis(reader, settings)
+    with profiler.stage("center_padding") as rec:
+        rec["pad"] = list(shared.padding)
+    if debug.enabled:
+        with profiler.stage("debug"):
+            debug.inputs(reader, settings, args.cadre, *shared.padding, stable=True)
+
+    for variant, out_path in zip(variants, out_paths):
+        logger.info(f"Variante mode {variant.mode} → {out_path}")
+        with profiler.stage(f"variant_mode{variant.mode}") as rec:
+            write_variant(
+                shared, variant, mire_path, out_path, dpi, icc_profile, write_options(args),
+                dump_edits=edits_path(args, out_path),
+            )
+            rec["output"] = str(out_path)
+            rec["bytes_written"] = out_path.stat().st_size
+        suffix = out_path.stem.removeprefix(args.image.stem)
+        debug.final(out_path, name="final" + (suffix if suffix.startswith("_") else "_" + suffix))
+    profiler.note(output=[str(p) for p in out_paths])
 
-    logger.debug(f"Chargement image : {args.image}")
-    img = Image.open(args.image)
-    logger.debug(f"Taille image : {img.size}")
-    icc_profile = img.info.get("icc_profile")
-    dpi         = img.info.get("dpi", (args.HDPI, args.VDPI))
+
+def _run(args, settings: PrintSettings, out_dir: Path, profiler: StageProfiler) -> None:
+    from debug_artifacts import DebugArtifacts
+    from scratch import configure_scratch
+
+    debug = DebugArtifacts(out_dir, args.image.stem, enabled=args.debug, max_width=args.debug_width)
+    try:
+        _run_job(args, settings, out_dir, profiler, debug)
+    finally:
+        configure_scratch(None)
+        if debug.enabled:
+            with profiler.stage("debug_wait"):
+                debug.close()
+
+
+def _run_job(
+    args,
+    settings: PrintSettings,
+    out_dir: Path,
+    profiler: StageProfiler,
+    debug: DebugArtifacts,
+) -> None:
+    from PIL import Image
+
+    from api import JobSettings, render
+    from mire_cache import DEFAULT_CACHE_DIR, configure_mire_cache
+    from parallel import configure_threads
+    from pipeline import PipelineContext
+    from scratch import DEFAULT_SCRATCH_DIR, configure_scratch
+    from source_cache import configure_source_cache
 
     mire_path = args.mire if args.mire else find_mire(args.LPI, args.HDPI, args.VDPI)
     logger.debug(f"Mire : {mire_path}")
-    mire = Image.open(mire_path)
-
-    debug_path = (args.output_dir if args.output_dir else args.image.parent) / (args.image.stem + "_centered.png")
-    img = center_padding(img, settings, debug_path=debug_path)
-
-    logger.info(f"Mode {args.mode}")
-    if args.mode == 1:
-        result = apply_mode1(img, mire, settings, bord_mire_mm=args.bord_mire)
-        out_name = args.output if args.output else (args.image.stem + "_HC.png")
-    elif args.mode == 2:
-        result = apply_mode2(img, settings, cadre_mm=args.cadre, trait_noir_mm=args.trait_noir_mm)
-        out_name = args.output if args.output else (args.image.stem + "_mod.png")
-    elif args.mode == 3:
-        img = apply_red_lines_noir(img, settings, cadre_mm=args.cadre, trait_noir_mm=args.trait_noir_mm)
-        result = apply_mode1(img, mire, settings, bord_mire_mm=args.bord_mire)
-        out_name = args.output if args.output else (args.image.stem + "_HC_mod.png")
-
-    out_dir  = args.output_dir if args.output_dir else args.image.parent
-    out_path = out_dir / out_name
+    configure_mire_cache(None if args.no_cache else (args.cache_dir or DEFAULT_CACHE_DIR) / "mires")
+    configure_source_cache(
+        (args.cache_dir or DEFAULT_CACHE_DIR) / "sources" if args.source_cache and not args.no_cache else None,
+        store_decoded=args.source_cache == "decoded",
+        max_disk_bytes=args.source_cache_mb * 1024**2,
+    )
+    out_path = out_dir / output_path(args).name
+
+    strategy = "stream" if args.stream else "mmap" if args.scratch_dir else "memory"
+    if args.max_memory_mb:
+        from planner import plan_memory
+
+        with profiler.stage("plan") as rec:
+            plan = plan_memory(args, out_path)
+            rec.update(plan.report())
+        logger.info(plan.describe())
+        strategy = plan.require().strategy
+    stream = strategy == "stream"
+    if args.incremental:
+        if args.mode == 2:
+            stream = True           # jamais de décodage complet : chunks recopiés, ou repli en flux
+        else:
+            logger.info("--incremental ne s'applique qu'au Mode 2 (la sortie des modes 1 et 3 est plus grande)")
+    configure_scratch((args.scratch_dir or DEFAULT_SCRATCH_DIR) if strategy == "mmap" else None)
+    configure_threads(args.threads)
+
+    if args.variant:
+        _run_variants(args, settings, mire_path, out_dir, profiler, debug, stream=stream)
+        logger.debug("Terminé.")
+        return
+
+    if stream:
+        logger.info(f"Mode {args.mode} (écriture en flux)")
+        _run_streamed(args, settings, mire_path, out_path, profiler, debug)
+        profiler.note(output=str(out_path))
+        logger.debug("Terminé.")
+        return
+
+    logger.debug(f"Chargement image : {args.image}")
+    with profiler.stage("decode") as rec, Image.open(args.image) as img:
+        logger.debug(f"Taille image : {img.size}")
+        ctx = PipelineContext.from_image(img, settings)
+        rec["size"] = [ctx.width, ctx.height]
+    profiler.note(input_size=[ctx.width, ctx.height])
+
+    render(
+        ctx, JobSettings.from_args(args, write_options(args)), mire_path, profiler, debug,
+        dump_edits=edits_path(args, out_path),
+    )
+
+    debug.final(ctx.reader())
     logger.info(f"Sauvegarde : {out_path}")
-    save_kwargs = {"dpi": dpi}
-    if icc_profile:
-        save_kwargs["icc_profile"] = icc_profile
-    result.save(str(out_path), **save_kwargs)
+    with profiler.stage("save") as rec:
+        ctx.save(out_path, write_options(args))
+        rec["bytes_written"] = out_path.stat().st_size
+    profiler.note(output=str(out_path), output_size=[ctx.width, ctx.height])
     logger.debug("Terminé.")
 
 
-def main():
+def run(args, profiler: StageProfiler | None = None) -> dict | None:
+    """
+    Traite une image. `profiler` permet à un appelant de récupérer les mesures
+    par étape (rappel `on_stage`, `report()`) ; avec --profile, le rapport JSON
+    est écrit à côté de la sortie (<image>_profile.json).
+    Avec --dry_run, rien n'est traité ni écrit : retourne le rapport de preflight.py.
+    """
+    from PIL import Image
+
+    from detection import configure_detection
+    from models import PrintSettings
+    from profiling import StageProfiler
+
+    Image.MAX_IMAGE_PIXELS = None
+
+    settings = PrintSettings(lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI)
+    out_dir = args.output_dir if args.output_dir else args.image.parent
+    configure_detection(args.detect_samples, args.detect_quorum)
+    if args.dry_run:
+        from preflight import preflight
+
+        return preflight(args, out_dir / output_path(args).name)
+
+    if profiler is None:
+        profiler = StageProfiler(job=str(args.image), enabled=args.profile)
+    profiler.note(
+        mode=args.mode, stream=args.stream,
+        settings={"lpi": args.LPI, "hdpi": args.HDPI, "vdpi": args.VDPI, "bord_mire": args.bord_mire,
+                  "cadre": args.cadre, "trait_noir_mm": args.trait_noir_mm},
+    )
+
+    try:
+        _run(args, settings, out_dir, profiler)
+    except Exception as e:
+        profiler.note(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        if args.profile:
+            profiler.write(out_dir / (args.image.stem + "_profile.json"))
+        profiler.close()
+    return None
+
+
+def preload() -> None:
+    """
+    Charge tous les modules de traitement. Pour les processus qui traitent
+    plusieurs images (batch.py, daemon.py) : appelé avant de créer le pool, les
+    workers en héritent au fork au lieu de les importer à leur première image.
+    """
+    import importlib
+
+    for module in ("api", "mode1", "mode2", "mode3", "planner", "preflight", "variants"):
+        importlib.import_module(module)
+
+
+def main() -> int:
     args = parse_args()
-    run(args)
+    if not args.dry_run and args.mire is None:
+        # Vérifiée avant tout import de NumPy ou Pillow : une mire absente est signalée immédiatement
+        try:
+            find_mire(args.LPI, args.HDPI, args.VDPI)
+        except FileNotFoundError as e:
+            logger.error(e)
+            return 2
+    try:
+        report = run(args)
+    except MemoryError as e:
+        # Refus du planificateur (--max_memory_mb) : rien ne tient dans le budget, rien n'a été décodé
+        logger.error(str(e) or "Mémoire insuffisante")
+        return 1
+    if report is not None:
+        import json
+
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0 if report["ok"] else 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
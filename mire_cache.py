@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+from models import PrintSettings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("MIREDIT_CACHE_DIR", Path.home() / ".cache" / "miredit"))
+
+
+def _fingerprint(path: Path) -> dict:
+    """Identité du template source : un changement de contenu change mtime ou taille."""
+    st = path.stat()
+    return {"path": str(path.resolve()), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+class MireCache:
+    """
+    Cache des bandes de mire prêtes à l'emploi (RGBA, recadrées, traits compris).
+
+    Clé : (hdpi, vdpi, lpi, hauteur de bande, largeur du canvas) + template source.
+    - en mémoire : LRU borné à `max_entries` bandes, partagé par tous les jobs du processus ;
+    - sur disque : un fichier .npy par clé, relu en memory-map (aucun décodage PNG),
+      avec un .json qui mémorise l'empreinte du template. Si le template change
+      (mtime ou taille), l'entrée est reconstruite. Le dossier est borné à
+      `max_disk_bytes`, les entrées les moins récemment utilisées partent en premier.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = DEFAULT_CACHE_DIR / "mires",
+        max_entries: int = 8,
+        max_disk_bytes: int = 2 * 1024**3,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[tuple, tuple[dict, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        mire_path: Path,
+        settings: PrintSettings,
+        strip_h: int,
+        total_w: int,
+        build: Callable[[], np.ndarray],
+        mode: str = "RGBA",
+    ) -> np.ndarray:
+        """Retourne la bande (lecture seule) ; `build()` n'est appelé qu'en cas d'absence."""
+        fingerprint = _fingerprint(Path(mire_path))
+        key = (settings.hdpi, settings.vdpi, settings.lpi, strip_h, total_w, fingerprint["path"])
+        if mode != "RGBA":
+            key += (mode,)          # clé inchangée en RGBA : le cache disque existant reste valide
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._memory.move_to_end(key)
+                logger.debug(f"Mire en cache (mémoire) : {key}")
+                return entry[1]
+
+        strip = self._load_disk(key, fingerprint)
+        if strip is None:
+            strip = build()
+            strip.setflags(write=False)
+            self._save_disk(key, fingerprint, strip)
+
+        with self._lock:
+            self._memory[key] = (fingerprint, strip)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return strip
+
+    def clear(self) -> None:
+        """Vide le cache mémoire (le cache disque est conservé)."""
+        with self._lock:
+            self._memory.clear()
+
+    # ── Cache disque ──────────────────────────────────────────────────────────
+
+    def _paths(self, key: tuple) -> tuple[Path, Path]:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.cache_dir / f"{name}.npy", self.cache_dir / f"{name}.json"
+
+    def _load_disk(self, key: tuple, fingerprint: dict) -> np.ndarray | None:
+        if self.cache_dir is None:
+            return None
+        data_path, meta_path = self._paths(key)
+        try:
+            if json.loads(meta_path.read_text()) != fingerprint:
+                logger.debug(f"Template modifié depuis la mise en cache — reconstruction : {key}")
+                return None
+            strip = np.load(data_path, mmap_mode="r")
+            os.utime(data_path)                      # LRU disque : date de dernier usage
+        except (OSError, ValueError):
+            return None
+        logger.debug(f"Mire en cache (disque) : {data_path.name}")
+        return strip
+
+    def _save_disk(self, key: tuple, fingerprint: dict, strip: np.ndarray) -> None:
+        if self.cache_dir is None:
+            return
+        data_path, meta_path = self._paths(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = data_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as fh:
+                np.save(fh, strip)
+            os.replace(tmp, data_path)
+            meta_path.write_text(json.dumps(fingerprint))
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Cache de mire non écrit ({e})")
+
+    def _evict_disk(self) -> None:
+        files = sorted(self.cache_dir.glob("*.npy"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        while files and total > self.max_disk_bytes:
+            oldest = files.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink(missing_ok=True)
+            oldest.with_suffix(".json").unlink(missing_ok=True)
+
+
+# Cache partagé par tous les traitements du processus (batch, démon…)
+MIRE_CACHE = MireCache()
+
+
+def configure_mire_cache(cache_dir: Path | None, max_entries: int = 8) -> None:
+    """Reconfigure le cache partagé ; cache_dir=None désactive le cache disque."""
+    MIRE_CACHE.cache_dir = Path(cache_dir) if cache_dir else None
+    MIRE_CACHE.max_entries = max_entries
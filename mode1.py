@@ -1,8 +1,15 @@
 import logging
+from pathlib import Path
+
 import numpy as np
-from PIL import Image, ImageDraw
+from PIL import Image
 
+from band_reader import BandReader, as_band_reader
+from colors import has_alpha, image_array, mode_color
+from edits import EditList, Fill, paste_alpha, render_edits, write_edits
+from mire_cache import MIRE_CACHE
 from models import PrintSettings
+from writer import WriteOptions
 
 logger = logging.getLogger(__name__)
 
@@ -28,37 +35,41 @@ def _crop_mire_centered(mire: Image.Image, target_w: int, target_h: int) -> Imag
     return mire.crop((left, top, right, bottom))
 
 
-def apply_mode1(
-    img: Image.Image,
-    mire: Image.Image,
-    settings: PrintSettings,
-    bord_mire_mm: float,
-) -> Image.Image:
-    """
-    Mode 1 — plaque physique plus grande que l'image lenticulaire.
-    """
-    img = img.convert("RGBA")
-    mire = mire.convert("RGBA")
-
-    w, h = img.size
-    strip_h = int(round(settings.mm_to_px_v(bord_mire_mm)))
-    margin = int(round(settings.mm_to_px_h(3.0)))
-
+def mode1_geometry(w: int, h: int, settings: PrintSettings, bord_mire_mm: float) -> dict:
+    """Dimensions du canvas Mode 1 et position des traits de repérage, pour une image w × h."""
+    layout = settings.layout(bord_mire_mm=bord_mire_mm)
+    strip_h, margin = layout.strip_h, layout.margin
     total_w = w + 2 * margin
     total_h = strip_h + h + strip_h
+    return {
+        "strip_h": strip_h, "margin": margin,
+        "total_w": total_w, "total_h": total_h,
+        # Colonnes [start, end) des 4 traits de repérage verticaux
+        "marks": layout.marks(total_w),
+    }
 
-    logger.info(f"Bande mire : {strip_h}px  |  marge : {margin}px  |  canvas : {total_w}x{total_h}px")
 
-    mire_strip = _crop_mire_centered(mire, total_w, strip_h)
-    logger.debug(f"Mire recadrée : {mire_strip.size}")
+def _draw_marks(rows: np.ndarray, geometry: dict, mode: str = "RGBA") -> None:
+    """Dessine les traits de repérage (pleine hauteur) sur une bande de lignes du canvas."""
+    black = mode_color(mode, "black")
+    for start, end in geometry["marks"]:
+        rows[:, start:end] = black
+
 
-    img_center = margin + w // 2          # centre de l'image dans le canvas
-    mire_x     = img_center - mire_strip.width // 2
+def _build_mire_strip(mire: Image.Image, geometry: dict, mode: str = "RGBA") -> np.ndarray:
+    """
+    Bande de mire finale (total_w × strip_h), telle qu'elle apparaît en haut et en bas
+    du canvas : mire centrée, collée sur fond transparent, traits de repérage compris.
+    Dans un mode sans alpha, la bande est posée sur blanc papier puis convertie
+    dans ce mode.
+    """
+    total_w, strip_h = geometry["total_w"], geometry["strip_h"]
+    mire = mire.convert("RGBA")
 
-    logger.info(f"Centre image dans canvas : {img_center}px  |  paste mire à x={mire_x}px")
+    mire_strip = _crop_mire_centered(mire, total_w, strip_h)
+    logger.debug(f"Mire recadrée : {mire_strip.size}")
 
     mire_strip_full = Image.new("RGBA", (total_w, strip_h), (0, 0, 0, 0))
-    #mire_strip_full = Image.new("RGBA", (total_w, strip_h), (0, 0, 0, 0))
 
     # Recadrer la mire à sa propre taille (juste pour limiter la hauteur à strip_h)
     mire_cropped = _crop_mire_centered(mire, mire.width, strip_h)
@@ -66,30 +77,144 @@ def apply_mode1(
     # Coller la mire centrée horizontalement
     x_offset = (total_w - mire_cropped.width) // 2
     mire_strip_full.paste(mire_cropped, (x_offset, 0), mire_cropped)  # masque alpha
-    
 
-    result = Image.new("RGBA", (total_w, total_h), (0, 0, 0, 0))
-    result.paste(mire_strip_full, (0, 0),            mire_strip_full)
-    result.paste(img,             (margin, strip_h), img)
-    result.paste(mire_strip_full, (0, strip_h + h),  mire_strip_full)
-    logger.info("Bandes mire et image collées")
+    rows = np.zeros((strip_h, total_w, 4), dtype=np.uint8)
+    paste_alpha(rows, np.asarray(mire_strip_full))
+    if not has_alpha(mode):
+        rows = _flatten_rgba(rows, mode)
+    _draw_marks(rows, geometry, mode)
+    return rows
+
+
+def _flatten_rgba(rows: np.ndarray, mode: str) -> np.ndarray:
+    """Bande RGBA posée sur papier blanc (ce qu'imprime la sortie RGBA), convertie dans `mode`."""
+    alpha = rows[..., 3:4].astype(np.uint16)
+    tmp = rows[..., :3] * alpha + 255 * (255 - alpha) + 128
+    rgb = (((tmp >> 8) + tmp) >> 8).astype(np.uint8)
+    if mode == "RGB":
+        return rgb
+    return image_array(Image.fromarray(rgb).convert(mode)).copy()
+
+
+def _mire_strip_rows(
+    mire: Image.Image | Path,
+    settings: PrintSettings,
+    geometry: dict,
+    mode: str = "RGBA",
+) -> np.ndarray:
+    """
+    Bande de mire pour ce canvas. Un template donné par son chemin passe par le
+    cache partagé (pas de décodage PNG ni de recadrage si la bande est déjà connue) ;
+    une image déjà ouverte est recadrée directement.
+    """
+    if isinstance(mire, Image.Image):
+        return _build_mire_strip(mire, geometry, mode)
+
+    def build() -> np.ndarray:
+        with Image.open(mire) as template:
+            return _build_mire_strip(template, geometry, mode)
+
+    return MIRE_CACHE.get(mire, settings, geometry["strip_h"], geometry["total_w"], build, mode=mode)
+
+
+def mode1_edits(
+    source: BandReader,
+    mire: Image.Image | Path,
+    settings: PrintSettings,
+    bord_mire_mm: float,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    label: str = "",
+) -> EditList:
+    """
+    Liste d'édition du Mode 1 : bande de mire haute, image collée à
+    (marge + pad_left, strip_h), bande de mire basse, puis les rectangles
+    `fills` (coordonnées de l'image centrée, limités à ses lignes) et les
+    traits de repérage sur toute la hauteur. Le centrage n'est qu'un décalage
+    de l'image dans le canvas.
+    """
+    w, h = source.width + pad_left + pad_right, source.height
+    geometry = mode1_geometry(w, h, settings, bord_mire_mm)
+    strip_h, margin = geometry["strip_h"], geometry["margin"]
+    total_w, total_h = geometry["total_w"], geometry["total_h"]
+
+    logger.info(f"Bande mire : {strip_h}px  |  marge : {margin}px  |  canvas : {total_w}x{total_h}px")
+    logger.info(f"Centre image dans canvas : {margin + w // 2}px")
+    logger.debug(f"Traits repérage (colonnes) : {geometry['marks']}")
+
+    strip_rows = _mire_strip_rows(mire, settings, geometry, source.mode)
+    template = "" if isinstance(mire, Image.Image) else str(mire)
+
+    edits = EditList(total_w, total_h, source.mode, mode_color(source.mode, "empty"), source)
+    edits.paste_rows("mire_haut", strip_rows, 0, 0, detail=template)
+    edits.paste_image(margin + pad_left, strip_h, blend=has_alpha(source.mode))
+    edits.paste_rows("mire_bas", strip_rows, 0, strip_h + h, detail=template)
+    edits.fill(fills, label, dx=margin, dy=strip_h, rows=(0, h))
+    black = mode_color(source.mode, "black")
+    edits.fill([(start, 0, end, total_h, black) for start, end in geometry["marks"]], "trait de repérage")
+    return edits
 
-    draw = ImageDraw.Draw(result)
-    black = (0, 0, 0, 255)
-    red = (255, 0, 0, 255)
 
-    x1 = margin - int(round(settings.mm_to_px_h(2.0)))
-    w1 = int(round(settings.line_frac_px(1 / 4)))
-    x2 = margin - int(round(settings.mm_to_px_h(1.0)))
-    w2 = int(round(settings.line_frac_px(1 / 6)))
+def apply_mode1(
+    source: np.ndarray | BandReader,
+    mire: Image.Image | Path,
+    settings: PrintSettings,
+    bord_mire_mm: float,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    label: str = "",
+    dump_edits: Path | None = None,
+) -> np.ndarray:
+    """
+    Mode 1 — plaque physique plus grande que l'image lenticulaire.
 
-    logger.debug(f"Traits repérage — x1={x1} w1={w1}px  |  x2={x2} w2={w2}px")
+    source : buffer (H, W, canaux) de l'image (ou BandReader), dans son mode natif.
+    Le canvas agrandi, dans le même mode, est le seul nouveau buffer alloué
+    (dans le stockage de travail, voir scratch.py) ; il est rendu en une passe
+    depuis la liste d'édition (mode1_edits), l'image y est copiée une seule fois.
+    mire : template ouvert, ou son chemin (bande servie par le cache de mires).
+    pad_left / pad_right : centrage appliqué comme décalage dans le canvas.
+    fills : rectangles colorés (x0, y0, x1, y1, couleur), en coordonnées de
+    l'image centrée (voir mode3).
+    dump_edits : fichier JSON où écrire la liste d'édition.
+    """
+    edits = mode1_edits(as_band_reader(source), mire, settings, bord_mire_mm, pad_left, pad_right, fills, label)
+    if dump_edits is not None:
+        edits.dump(dump_edits)
+    result = render_edits(edits)
+    logger.info("Bandes mire et image collées, traits de repérage dessinés")
+    return result
 
 
-    draw.rectangle([x1,                0, x1 + w1 - 1,           total_h - 1], fill=black)
-    draw.rectangle([x2,                0, x2 + w2 - 1,           total_h - 1], fill=black)
-    draw.rectangle([total_w - x1 - w1, 0, total_w - x1 - 1,      total_h - 1], fill=black)
-    draw.rectangle([total_w - x2 - w2, 0, total_w - x2 - 1,      total_h - 1], fill=black)
-    logger.info("Traits de repérage dessinés")
+def write_mode1_streamed(
+    source: BandReader,
+    mire: Image.Image | Path,
+    settings: PrintSettings,
+    bord_mire_mm: float,
+    out_path: Path,
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    band_rows: int = 256,
+    options: WriteOptions = WriteOptions(),
+    label: str = "",
+    dump_edits: Path | None = None,
+) -> None:
+    """
+    Mode 1 en flux : écrit le canvas directement dans `out_path` (PNG ou TIFF,
+    selon l'extension), bande par bande, sans jamais allouer le canvas complet.
 
-    return result
\ No newline at end of file
+    Ordre d'écriture : bande de mire haute, lignes de l'image (avec les traits
+    de repérage latéraux incrustés), bande de mire basse. Le centrage est appliqué
+    comme un simple décalage (pad_left, pad_right) de l'image dans le canvas.
+    Mémoire de pointe : une bande de `band_rows` lignes du canvas.
+    """
+    edits = mode1_edits(source, mire, settings, bord_mire_mm, pad_left, pad_right, fills, label)
+    if dump_edits is not None:
+        edits.dump(dump_edits)
+    write_edits(edits, out_path, dpi, icc_profile, options, band_rows)
+    logger.info("Canvas Mode 1 écrit en flux")
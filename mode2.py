@@ -1,70 +1,55 @@
 import logging
+from pathlib import Path
+
 import numpy as np
-from PIL import Image
 
+from band_reader import BandReader, PaddedReader, as_band_reader
 from models import PrintSettings
-from center_padding import is_red
+from colors import is_black, is_neutral_dark, is_red, is_white, mode_color
+from detection import DETECTOR, warn_if_unsure
+from edits import Fill, apply_fills, render_edits, write_edits
+from pipeline import padded_edits
+from source_cache import SOURCE_CACHE
+from tiff_rewrite import incremental_reason, rewrite_tiff
+from writer import WriteOptions
 
 logger = logging.getLogger(__name__)
 
-
-# ─────────────────────────────────────────────
-# Utilitaire : détection de plages dans un masque 1D
-# ─────────────────────────────────────────────
-
-def _find_runs(mask: np.ndarray) -> list[tuple[int, int]]:
-    """
-    Trouve les plages de pixels True consécutifs dans un masque 1D.
-    Retourne une liste de (start, end) en indices inclusifs.
-    """
-
-    padded = np.concatenate(([False], mask, [False])) #on ajoute false au début et à la fin 
-
-    # Indices où la valeur passe de False à True (début de plage)
-    starts = np.where(~padded[:-1] &  padded[1:])[0]
-
-    # Indices où la valeur passe de True à False (fin de plage, -1 car décalage du padding)
-    ends   = np.where( padded[:-1] & ~padded[1:])[0] - 1
-
-    return list(zip(starts.tolist(), ends.tolist()))
+# Plages retournées par detect_frame_lines, avec "confidence" (une confiance par clé)
+FRAME_LINES = ("black_left", "black_right", "red_lines")
 
 
 # ─────────────────────────────────────────────
 # Détection et affichage des lignes du cadre
 # ─────────────────────────────────────────────
 
-def debug_red_scan(img: Image.Image, settings: PrintSettings, cadre_mm: float) -> None:
+def debug_red_scan(source: np.ndarray | BandReader, settings: PrintSettings, cadre_mm: float) -> None:
     """
     Diagnostic : cherche tous les pixels non-blanc et non-noir dans
     une bande verticale de ±50px autour du centre horizontal,
     sur toute la hauteur de l'image.
     Permet de localiser les vraies positions des lignes rouges.
     """
-    arr = np.array(img.convert("RGBA"))
-    h, w = arr.shape[:2]
-    mid_x = w // 2
+    reader = as_band_reader(source)
 
     # Scan horizontal à mi-hauteur du cadre haut, sur toute la largeur
-    cadre_px_v = settings.mm_to_px_v(cadre_mm)
-    mid_cadre_y = cadre_px_v // 2
-    row = arr[mid_cadre_y, :, :]  # shape (W, 4)
+    mid_cadre_y = settings.layout(cadre_mm=cadre_mm).cadre_px_v // 2
+    row = reader.rows(mid_cadre_y, mid_cadre_y + 1)[0]  # shape (W, canaux)
 
     # Cherche tous les pixels ni blanc ni noir (= colorés, potentiellement rouges)
-    is_white = (row[:, 0] > 200) & (row[:, 1] > 200) & (row[:, 2] > 200)
-    is_black = (row[:, 0] <  30) & (row[:, 1] <  30) & (row[:, 2] <  30)
-    colored_xs = np.where(~is_white & ~is_black)[0]
+    colored_xs = np.where(~is_white(row, reader.mode) & ~is_black(row, reader.mode))[0]
 
     logger.debug(f"=== DEBUG scan rouge — ligne y={mid_cadre_y} (mi-hauteur cadre haut) ===")
     if len(colored_xs) == 0:
         logger.debug("  Aucun pixel coloré trouvé.")
     else:
+        channels = " ".join(f"{c}={{:3d}}" for c in reader.mode)
         for x in colored_xs:
-            r, g, b, a = arr[mid_cadre_y, x]
-            logger.debug(f"  x={x:5d}  R={r:3d} G={g:3d} B={b:3d} A={a:3d}")
+            logger.debug(f"  x={x:5d}  " + channels.format(*row[x]))
 
 
 def detect_frame_lines(
-    img: Image.Image,
+    source: np.ndarray | BandReader,
     settings: PrintSettings,
     cadre_mm: float,
 ) -> dict:
@@ -83,57 +68,60 @@ def detect_frame_lines(
         "black_right"  : liste de (x_start, x_end) — coordonnées absolues
         "red_top"      : liste de (y_start, y_end) — coordonnées absolues
         "red_bottom"   : liste de (y_start, y_end) — coordonnées absolues
-    """
-    arr = np.array(img.convert("RGBA"))  # shape (H, W, 4), valeurs 0-255 
-    h, w = arr.shape[:2]
+        "confidence"   : accord des lignes échantillonnées, par clé (detection.RunDetector)
 
-    # Largeur/hauteur du cadre en pixels
-    cadre_px_h = settings.mm_to_px_h(cadre_mm)  # pour les bords gauche/droite
-    cadre_px_v = settings.mm_to_px_v(cadre_mm)  # pour les bords haut/bas
+    source : buffer partagé (H, W, canaux), lu sans copie, ou BandReader sur le
+    fichier (la classification des couleurs se fait dans son mode natif) : seules
+    la bande du milieu (colonnes du cadre gauche et droit, hauteur d'un cadre) et
+    la moitié centrale du cadre haut sont décodées ; quelques lignes de chacune votent.
+    Le résultat est mis en cache avec l'empreinte de la source (source_cache.py).
+    """
+    reader = as_band_reader(source)
 
-    mid_y = h // 2        # ligne horizontale de scan (milieu vertical de l'image)
-    mid_cadre_y = cadre_px_v // 2  # ligne au milieu du cadre haut, pour scan rouge
+    # Largeur (bords gauche/droite) et hauteur (bords haut/bas) du cadre en pixels
+    layout = settings.layout(cadre_mm=cadre_mm)
+    cadre_px_h, cadre_px_v = layout.cadre_px_h, layout.cadre_px_v
 
-    # ── Lignes noires gauche ──────────────────────────────────────────────────
-    # On prend les pixels de la tranche horizontale à mid_y, dans les
-    # cadre_px_h premières colonnes.
-    # Un pixel est "noir" si R < 30 et G < 30 et B < 30.
-    left_row = arr[mid_y, :cadre_px_h, :3].astype(int)   # shape (cadre_px_h, 3)
-    black_left_mask = (
-        (left_row.max(axis=1) - left_row.min(axis=1) < 10) &  # canaux égaux (gris neutre)
-        (left_row.max(axis=1) < 200)                           # pas blanc
+    lines = SOURCE_CACHE.memo(
+        reader, "frame", (cadre_px_h, cadre_px_v, *DETECTOR.params),
+        lambda: _scan_frame_lines(reader, cadre_px_h, cadre_px_v),
     )
-    black_left = _find_runs(black_left_mask)        # positions relatives au bord gauche
+    for key, confidence in lines["confidence"].items():
+        warn_if_unsure(key, confidence)
+    return {**{key: [tuple(run) for run in lines[key]] for key in FRAME_LINES}, "confidence": lines["confidence"]}
 
-    #on obtiet un tableau True false true false true false
 
-    # ── Lignes noires droite ──────────────────────────────────────────────────
-    '''  - max(R,G,B) - min(R,G,B) < 10 → les 3 canaux sont quasi-égaux (pixel neutre, pas coloré)                                                       
-         - max(R,G,B) < 200 → assez sombre pour ne pas être du blanc  '''
+def _scan_frame_lines(reader: BandReader, cadre_px_h: int, cadre_px_v: int) -> dict:
+    w, h = reader.size
+
+    # ── Lignes noires gauche et droite ────────────────────────────────────────
+    # Vote sur une bande de la hauteur d'un cadre, centrée sur le milieu
+    # vertical de l'image, dans les cadre_px_h premières et dernières colonnes.
+    # Un pixel est "noir" s'il est neutre et sombre (is_neutral_dark) :
+    #   - max(R,G,B) - min(R,G,B) < 10 → les 3 canaux sont quasi-égaux
+    #   - max(R,G,B) < 200 → assez sombre pour ne pas être du blanc
+    mid_y = h // 2
+    y0, y1 = max(mid_y - cadre_px_v // 2, 0), min(mid_y + cadre_px_v // 2 + 1, h)
+    left = DETECTOR.detect(reader, 0, y0, cadre_px_h, y1, is_neutral_dark)     # relatives au bord gauche
+    right = DETECTOR.detect(reader, w - cadre_px_h, y0, w, y1, is_neutral_dark)
 
-    right_row = arr[mid_y, w - cadre_px_h:, :3].astype(int)   # shape (cadre_px_h, 3)
-    black_right_mask = (
-        (right_row.max(axis=1) - right_row.min(axis=1) < 10) &  # canaux égaux (gris neutre)
-        (right_row.max(axis=1) < 200)                            # pas blanc
-    )
-    
     # On convertit en coordonnées absolues (origine = bord gauche de l'image)
     offset_r = w - cadre_px_h
-    black_right = [(offset_r + s, offset_r + e) for s, e in _find_runs(black_right_mask)]
+    black_right = [(offset_r + s, offset_r + e) for s, e in right["runs"]]
 
     # ── Lignes rouges (scan horizontal dans le cadre du HAUT) ────────────────────
     # Les lignes rouges sont des traits VERTICAUX (colonnes) placés au centre
-    # horizontal de l'image, dans la zone du cadre haut.
-    # On scanne horizontalement à mi-hauteur du cadre pour trouver leurs positions x.
-    # Un pixel est "rouge" si R > 150 et G < 30 et B < 30 (rouge = R=219, G=0, B=0).
-    top_row = arr[mid_cadre_y, :, :]               # toute la largeur à mi-hauteur du cadre
-    red_mask = is_red(top_row)
-    red_lines = _find_runs(red_mask)        # positions en x (coordonnées absolues)
+    # horizontal de l'image, dans la zone du cadre haut : vote sur la moitié
+    # centrale de sa hauteur, toute la largeur, pour trouver leurs positions x.
+    # Un pixel est "rouge" si R dépasse G et B de plus de 30 (is_red).
+    red = DETECTOR.detect(reader, 0, cadre_px_v // 4, w, cadre_px_v - cadre_px_v // 4, is_red)
 
     return {
-        "black_left":  black_left,
+        "black_left":  left["runs"],
         "black_right": black_right,
-        "red_lines":   red_lines,
+        "red_lines":   red["runs"],
+        "confidence":  {"black_left": left["confidence"], "black_right": right["confidence"],
+                        "red_lines": red["confidence"]},
     }
 
 
@@ -162,65 +150,133 @@ def print_frame_analysis(lines: dict, settings: PrintSettings) -> None:
 # Modification lignes rouges (partagée modes 2 et 3)
 # ─────────────────────────────────────────────
 
-def apply_red_lines_noir(
-    img: Image.Image,
+def red_lines_noir_rects(
+    red_lines: list[tuple[int, int]],
+    h: int,
     settings: PrintSettings,
     cadre_mm: float,
     trait_noir_mm: float,
-) -> Image.Image:
-    """Met en noir la ligne rouge du milieu et ajoute un trait noir sur les lignes rouges extérieures."""
-    debug_red_scan(img, settings, cadre_mm)
+) -> list[tuple[int, int, int, int]]:
+    """
+    Rectangles (x0, y0, x1, y1), bornes exclusives, à mettre en noir dans une image
+    de hauteur h : ligne rouge du milieu sur toute la hauteur des cadres haut et bas,
+    et trait de trait_noir_mm côté image sur les lignes rouges extérieures.
+    Coordonnées de l'image analysée ; liste vide si aucune ligne rouge.
+    """
+    layout = settings.layout(cadre_mm=cadre_mm, trait_noir_mm=trait_noir_mm)
+    cadre_px_v, bord_px_v = layout.cadre_px_v, layout.trait_noir_px_v
+
+    n = len(red_lines)
+    if n == 0:
+        return []
+
+    rects = []
+    mid_idx = n // 2
+    xs, xe = red_lines[mid_idx]
+    rects.append((xs, 0,              xe + 1, cadre_px_v))
+    rects.append((xs, h - cadre_px_v, xe + 1, h))
+    logger.debug(f"Rouge milieu [{mid_idx}/{n}] : x={xs}–{xe}  →  noir cadre haut+bas")
+
+    for idx in (0, -1):
+        xs, xe = red_lines[idx]
+        rects.append((xs, cadre_px_v - bord_px_v, xe + 1, cadre_px_v))
+        rects.append((xs, h - cadre_px_v,         xe + 1, h - cadre_px_v + bord_px_v))
+        logger.debug(f"Rouge [{idx}] : x={xs}–{xe}  →  {trait_noir_mm}mm noir côté image")
+
+    return rects
+
+
+def analyse_red_lines(source: np.ndarray | BandReader, settings: PrintSettings, cadre_mm: float) -> dict:
+    """Détection du cadre avec son diagnostic (niveau DEBUG), partagée modes 2 et 3."""
+    if logger.isEnabledFor(logging.DEBUG):
+        debug_red_scan(source, settings, cadre_mm)
     logger.debug("Détection des lignes du cadre")
-    lines = detect_frame_lines(img, settings, cadre_mm)
+    lines = detect_frame_lines(source, settings, cadre_mm)
     logger.debug(
         f"Lignes détectées — noir gauche: {len(lines['black_left'])}, "
         f"noir droit: {len(lines['black_right'])}, "
         f"rouge: {len(lines['red_lines'])}"
     )
     print_frame_analysis(lines, settings)
+    if not lines["red_lines"]:
+        logger.warning("Aucune ligne rouge détectée — vérifier le cadre et les seuils de couleur")
+    return lines
 
-    arr = np.array(img.convert("RGBA"))
-    h = arr.shape[0]
-    black = (0, 0, 0, 255)
 
-    cadre_px_v = settings.mm_to_px_v(cadre_mm)
-    bord_px_v = settings.mm_to_px_v(trait_noir_mm)
+def apply_red_lines_noir(
+    arr: np.ndarray | BandReader,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+) -> np.ndarray:
+    """
+    Met en noir la ligne rouge du milieu et ajoute un trait noir sur les lignes rouges extérieures.
+    Modifie le buffer en place (un tableau, ou un BandReader sur tableau) et le retourne.
+    """
+    reader = as_band_reader(arr)
+    lines = analyse_red_lines(reader, settings, cadre_mm)
+    rects = red_lines_noir_rects(lines["red_lines"], reader.height, settings, cadre_mm, trait_noir_mm)
+    black = mode_color(reader.mode, "black")
+    apply_fills(reader.array, 0, [(*rect, black) for rect in rects])
+    return reader.array
 
-    red_lines = lines["red_lines"]
-    n = len(red_lines)
-    if n == 0:
-        logger.warning("Aucune ligne rouge détectée — vérifier le cadre et les seuils de couleur")
-        return Image.fromarray(arr, mode="RGBA")
 
-    mid_idx = n // 2
-    xs, xe = red_lines[mid_idx]
-    arr[0:cadre_px_v, xs:xe + 1] = black
-    arr[h - cadre_px_v:h, xs:xe + 1] = black
-    logger.debug(f"Rouge milieu [{mid_idx}/{n}] : x={xs}–{xe}  →  noir cadre haut+bas")
+# ─────────────────────────────────────────────
+# Point d'entrée Mode 2
+# ─────────────────────────────────────────────
 
-    xs, xe = red_lines[0]
-    arr[cadre_px_v - bord_px_v:cadre_px_v, xs:xe + 1] = black
-    arr[h - cadre_px_v:h - cadre_px_v + bord_px_v, xs:xe + 1] = black
-    logger.debug(f"Rouge [0] : x={xs}–{xe}  →  {trait_noir_mm}mm noir côté image")
+def mode2_fills(
+    lines: dict,
+    height: int,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+    mode: str = "RGBA",
+) -> list[Fill]:
+    """
+    Rectangles du Mode 2 à partir des lignes détectées (detect_frame_lines), dans
+    l'ordre où ils doivent être appliqués : colonnes noires mises en blanc, puis
+    lignes rouges mises en noir.
+    """
+    white, black = mode_color(mode, "white"), mode_color(mode, "black")
+    fills = []
 
-    xs, xe = red_lines[-1]
-    arr[cadre_px_v - bord_px_v:cadre_px_v, xs:xe + 1] = black
-    arr[h - cadre_px_v:h - cadre_px_v + bord_px_v, xs:xe + 1] = black
-    logger.debug(f"Rouge [-1] : x={xs}–{xe}  →  {trait_noir_mm}mm noir côté image")
+    x_start, x_end = lines["black_left"][2]
+    fills.append((x_start, 0, x_end + 1, height, white))
+    logger.debug(f"Bord gauche : colonne x={x_start}–{x_end} mise en blanc")
 
-    return Image.fromarray(arr, mode="RGBA")
+    x_start, x_end = lines["black_right"][-3]
+    fills.append((x_start, 0, x_end + 1, height, white))
+    logger.debug(f"Bord droit  : colonne x={x_start}–{x_end} mise en blanc")
 
+    rects = red_lines_noir_rects(lines["red_lines"], height, settings, cadre_mm, trait_noir_mm)
+    return fills + [(*rect, black) for rect in rects]
+
+
+def plan_mode2(
+    source: np.ndarray | BandReader,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+) -> list[Fill]:
+    """
+    Détection du cadre puis rectangles du Mode 2 (voir mode2_fills).
+    Coordonnées de `source` (un PaddedReader pour travailler dans l'image centrée).
+    """
+    reader = as_band_reader(source)
+    lines = analyse_red_lines(reader, settings, cadre_mm)
+    return mode2_fills(lines, reader.height, settings, cadre_mm, trait_noir_mm, reader.mode)
 
-# ─────────────────────────────────────────────
-# Point d'entrée Mode 2
-# ─────────────────────────────────────────────
 
 def apply_mode2(
-    img: Image.Image,
+    source: np.ndarray | BandReader,
     settings: PrintSettings,
     cadre_mm: float,
     trait_noir_mm: float,
-) -> Image.Image:
+    pad_left: int = 0,
+    pad_right: int = 0,
+    dump_edits: Path | None = None,
+) -> np.ndarray:
     """
     Mode 2 — modification du cadre de mire existant (créé par Lenticular Suite).
 
@@ -228,18 +284,54 @@ def apply_mode2(
     - Met en blanc la deuxième ligne noire depuis le bord gauche.
     - Met en blanc la deuxième ligne noire depuis le bord droit.
     - Met en noir la ligne rouge du milieu (cadre haut et bas).
-    """
-    lines = detect_frame_lines(img, settings, cadre_mm)
-    arr = np.array(img.convert("RGBA"))
-    white = (255, 255, 255, 255) #commentaire c'est du blanc
 
-    x_start, x_end = lines["black_left"][2]
-    arr[:, x_start:x_end + 1] = white
-    logger.debug(f"Bord gauche : colonne x={x_start}–{x_end} mise en blanc")
+    pad_left / pad_right : centrage, appliqué comme un décalage. La détection lit
+    l'image centrée à travers un PaddedReader ; le padding n'est ajouté qu'au rendu
+    de la liste d'édition (pipeline.padded_edits). Sans padding, un buffer source
+    est modifié en place et retourné.
+    dump_edits : fichier JSON où écrire la liste d'édition.
+    """
+    reader = as_band_reader(source)
+    fills = plan_mode2(PaddedReader(reader, pad_left, pad_right), settings, cadre_mm, trait_noir_mm)
+    edits = padded_edits(reader, pad_left, pad_right, fills, label="cadre")
+    if dump_edits is not None:
+        edits.dump(dump_edits)
+    return render_edits(edits, in_place=True)
 
-    x_start, x_end = lines["black_right"][-3]
-    arr[:, x_start:x_end + 1] = white
-    logger.debug(f"Bord droit  : colonne x={x_start}–{x_end} mise en blanc")
 
-    img_modified = Image.fromarray(arr, mode="RGBA")
-    return apply_red_lines_noir(img_modified, settings, cadre_mm, trait_noir_mm)
\ No newline at end of file
+def write_mode2_streamed(
+    source: BandReader,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+    out_path: Path,
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    band_rows: int = 256,
+    options: WriteOptions = WriteOptions(),
+    fills: list[Fill] | None = None,
+    dump_edits: Path | None = None,
+    incremental: bool = False,
+) -> None:
+    """
+    Mode 2 en flux : image centrée et cadre modifié écrits bande par bande (PNG ou TIFF).
+    `fills` : rectangles déjà planifiés (variantes d'une même image), sinon détectés ici.
+    `incremental` : pour une source et une sortie TIFF sans centrage, seuls les
+    chunks touchés par le cadre sont réencodés, les autres recopiés tels quels
+    (tiff_rewrite.py) ; sinon, écriture en flux habituelle.
+    """
+    if fills is None:
+        fills = plan_mode2(PaddedReader(source, pad_left, pad_right), settings, cadre_mm, trait_noir_mm)
+    edits = padded_edits(source, pad_left, pad_right, fills, label="cadre")
+    if dump_edits is not None:
+        edits.dump(dump_edits)
+    if incremental:
+        reason = incremental_reason(edits, out_path)
+        if reason is None:
+            rewrite_tiff(edits, out_path, dpi, icc_profile, options)
+            return
+        logger.info(f"Réécriture incrémentale impossible ({reason}) — écriture en flux")
+    write_edits(edits, out_path, dpi, icc_profile, options, band_rows)
+    logger.info("Image Mode 2 écrite en flux")
@@ -0,0 +1,76 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from band_reader import BandReader, as_band_reader
+from center_padding import compute_padding
+from colors import mode_color
+from mode1 import apply_mode1
+from mode2 import analyse_red_lines, red_lines_noir_rects
+from models import PrintSettings
+from edits import Fill
+
+logger = logging.getLogger(__name__)
+
+# Libellé des rectangles du Mode 3 dans la liste d'édition
+RED_LINES_LABEL = "lignes rouges"
+
+
+def mode3_fills(
+    red_lines: list[tuple[int, int]],
+    height: int,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+    mode: str = "RGBA",
+) -> list[Fill]:
+    """Rectangles noirs du Mode 3 pour des lignes rouges en coordonnées de l'image centrée."""
+    rects = red_lines_noir_rects(red_lines, height, settings, cadre_mm, trait_noir_mm)
+    black = mode_color(mode, "black")
+    return [(*rect, black) for rect in rects]
+
+
+def plan_mode3(
+    source: np.ndarray | BandReader,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+) -> tuple[int, int, list[Fill]]:
+    """
+    Calcule tout le Mode 3 avant d'écrire le moindre pixel :
+    padding de centrage (pad_left, pad_right) et rectangles à mettre en noir sur
+    les lignes rouges, en coordonnées de l'image centrée.
+
+    La détection se fait sur l'image source non centrée : le padding ne contient
+    jamais de rouge, les lignes rouges sont donc simplement décalées de pad_left.
+    """
+    reader = as_band_reader(source)
+    pad_left, pad_right = compute_padding(reader, settings)
+    lines = analyse_red_lines(reader, settings, cadre_mm)
+    red_lines = [(s + pad_left, e + pad_left) for s, e in lines["red_lines"]]
+    fills = mode3_fills(red_lines, reader.height, settings, cadre_mm, trait_noir_mm, reader.mode)
+    return pad_left, pad_right, fills
+
+
+def apply_mode3(
+    source: np.ndarray | BandReader,
+    mire: Image.Image | Path,
+    settings: PrintSettings,
+    cadre_mm: float,
+    trait_noir_mm: float,
+    bord_mire_mm: float,
+    dump_edits: Path | None = None,
+) -> np.ndarray:
+    """
+    Mode 3 fusionné — centrage, lignes rouges mises en noir et ajout des bandes de mire
+    en une seule passe : la géométrie finale est calculée d'abord, puis chaque pixel
+    source est copié une seule fois à sa position dans le canvas final.
+    """
+    pad_left, pad_right, fills = plan_mode3(source, settings, cadre_mm, trait_noir_mm)
+    return apply_mode1(
+        source, mire, settings, bord_mire_mm,
+        pad_left=pad_left, pad_right=pad_right, fills=fills, label=RED_LINES_LABEL, dump_edits=dump_edits,
+    )
+
@@ -1,7 +1,20 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 
+# Réglages par défaut du cadre, des bandes de mire et du trait noir (mêmes que la ligne de commande)
+DEFAULT_CADRE_MM = 4.0
+DEFAULT_BORD_MIRE_MM = 4.0
+DEFAULT_TRAIT_NOIR_MM = 1.0
 
-@dataclass
+# Profondeur de la bande haute scannée pour trouver la ligne rouge du milieu (centrage)
+CENTRE_SCAN_MM = 2.0
+# Marge latérale du canvas Mode 1, de part et d'autre de l'image
+MARGIN_MM = 3.0
+# Traits de repérage du Mode 1 : (distance à l'image en mm, largeur en fraction de ligne lenticulaire)
+MARKS = ((2.0, 1 / 4), (1.0, 1 / 6))
+
+
+@dataclass(frozen=True)
 class PrintSettings:
     lpi: float   # linéature (lignes par pouce)
     hdpi: int    # résolution horizontale d'impression
@@ -23,3 +36,66 @@ class PrintSettings:
     def line_frac_px(self, fraction: float) -> int:
         """Largeur en pixels d'une fraction de ligne lenticulaire. Ex: line_frac_px(1/4)"""
         return round(self.px_per_line * fraction)
+
+    def layout(
+        self,
+        cadre_mm: float = DEFAULT_CADRE_MM,
+        bord_mire_mm: float = DEFAULT_BORD_MIRE_MM,
+        trait_noir_mm: float = DEFAULT_TRAIT_NOIR_MM,
+    ) -> "Layout":
+        """Géométrie en pixels pour ces réglages, calculée une fois par processus (voir Layout)."""
+        return _layout(self, float(cadre_mm), float(bord_mire_mm), float(trait_noir_mm))
+
+
+@dataclass(frozen=True)
+class Layout:
+    """
+    Toutes les distances en pixels utilisées par les modes, dérivées une fois
+    par (lpi, hdpi, vdpi, cadre, bord_mire, trait_noir) : les traitements d'un
+    même lot ou du démon partagent le même objet (PrintSettings.layout), et
+    deux plans se comparent par simple égalité.
+
+    Les largeurs et décalages ne dépendent pas de la taille de l'image ; seules
+    les colonnes des traits de repérage en dépendent (marks).
+    """
+    settings: PrintSettings
+    cadre_mm: float
+    bord_mire_mm: float
+    trait_noir_mm: float
+    cadre_px_h: int            # largeur des bandes latérales du cadre
+    cadre_px_v: int            # hauteur des bandes haute et basse du cadre
+    trait_noir_px_v: int       # trait noir côté image sur les lignes rouges extérieures (≤ cadre_px_v)
+    centre_scan_rows: int      # lignes scannées pour la ligne rouge du milieu
+    strip_h: int               # hauteur des bandes de mire (Mode 1)
+    margin: int                # marge latérale du canvas (Mode 1)
+    mark_offsets: tuple[tuple[int, int], ...]  # (x, largeur) des traits de repérage gauches
+
+    def marks(self, total_w: int) -> list[tuple[int, int]]:
+        """Colonnes [start, end) des traits de repérage d'un canvas de largeur total_w : gauches puis droits."""
+        left = [(x, x + width) for x, width in self.mark_offsets]
+        right = [(total_w - x - width, total_w - x) for x, width in self.mark_offsets]
+        return left + right
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@lru_cache(maxsize=256)
+def _layout(settings: PrintSettings, cadre_mm: float, bord_mire_mm: float, trait_noir_mm: float) -> Layout:
+    cadre_px_v = settings.mm_to_px_v(cadre_mm)
+    margin = settings.mm_to_px_h(MARGIN_MM)
+    return Layout(
+        settings=settings,
+        cadre_mm=cadre_mm,
+        bord_mire_mm=bord_mire_mm,
+        trait_noir_mm=trait_noir_mm,
+        cadre_px_h=settings.mm_to_px_h(cadre_mm),
+        cadre_px_v=cadre_px_v,
+        trait_noir_px_v=min(settings.mm_to_px_v(trait_noir_mm), cadre_px_v),
+        centre_scan_rows=settings.mm_to_px_v(CENTRE_SCAN_MM),
+        strip_h=settings.mm_to_px_v(bord_mire_mm),
+        margin=margin,
+        mark_offsets=tuple(
+            (margin - settings.mm_to_px_h(mm), settings.line_frac_px(fraction)) for mm, fraction in MARKS
+        ),
+    )
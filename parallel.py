@@ -0,0 +1,73 @@
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# Taille minimale d'une bande confiée à un thread : en dessous, la répartition coûte plus qu'elle ne rapporte
+MIN_BAND_BYTES = 4 * 1024**2
+
+
+class BandPool:
+    """
+    Répartition des noyaux pleine image (copie, remplissage, collage, conversion)
+    sur des bandes horizontales indépendantes, exécutées par un pool de threads.
+    numpy et Pillow libèrent le GIL pendant ces opérations : une grande plaque
+    n'est plus limitée au débit mémoire d'un seul cœur.
+
+    `threads` : nombre de threads, 0 pour un par cœur, 1 pour tout exécuter
+    dans le thread appelant. Le pool est créé à la première bande parallèle.
+    """
+
+    def __init__(self, threads: int = 0):
+        self.threads = threads
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def workers(self) -> int:
+        return self.threads or os.cpu_count() or 1
+
+    def split(self, y0: int, y1: int, row_bytes: int, max_rows: int | None = None) -> list[tuple[int, int]]:
+        """
+        Bandes [y0, y1) : une par thread, d'au moins MIN_BAND_BYTES, et d'au plus
+        `max_rows` lignes (noyaux qui allouent un tampon par bande).
+        """
+        rows = max(-(-(y1 - y0) // self.workers), -(-MIN_BAND_BYTES // max(row_bytes, 1)), 1)
+        if max_rows:
+            rows = min(rows, max_rows)
+        return [(y, min(y + rows, y1)) for y in range(y0, y1, rows)]
+
+    def run(self, kernel: Callable[[int, int], None], bands: list[tuple[int, int]]) -> None:
+        """Applique kernel(y0, y1) à chaque bande ; la première erreur est relevée."""
+        if self.workers <= 1 or len(bands) <= 1:
+            for y0, y1 in bands:
+                kernel(y0, y1)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kernel")
+        futures = [self._executor.submit(kernel, y0, y1) for y0, y1 in bands]
+        for future in futures:
+            future.result()
+
+    def map_rows(self, kernel: Callable[[int, int], None], height: int, row_bytes: int) -> None:
+        """Applique kernel(y0, y1) sur toute la hauteur, découpée par split()."""
+        self.run(kernel, self.split(0, height, row_bytes))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Pool partagé par tous les traitements du processus ; configuré par job (--threads)
+KERNELS = BandPool()
+
+
+def configure_threads(threads: int) -> None:
+    """Nombre de threads des noyaux pleine image (0 : un par cœur)."""
+    if threads != KERNELS.threads:
+        KERNELS.shutdown()
+        KERNELS.threads = threads
+        logger.debug(f"Noyaux pleine image : {KERNELS.workers} thread(s)")
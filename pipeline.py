@@ -0,0 +1,187 @@
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image
+
+from band_reader import BandReader, as_band_reader
+from colors import array_image, image_array, mode_color, native_mode
+from edits import EditList, Fill, iter_edit_bands, render_edits
+from models import PrintSettings
+from parallel import KERNELS
+from scratch import SCRATCH
+from source_cache import SOURCE_CACHE
+from writer import WRITER_SUFFIXES, WriteOptions, open_writer
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes converties à la fois lors du décodage (borne la mémoire temporaire)
+DECODE_BAND_ROWS = 1024
+
+# Formats Pillow sans canal alpha : une sortie RGBA y est posée sur papier blanc (RGB)
+NO_ALPHA_FORMATS = ("JPEG", "EPS")
+
+def decode_native(img: Image.Image, band_rows: int = DECODE_BAND_ROWS) -> tuple[np.ndarray, str]:
+    """
+    Décode l'image dans un unique buffer numpy (H, W, canaux) modifiable, dans
+    son mode natif (RGBA, RGB, CMYK ou L — voir colors.native_mode).
+
+    Une éventuelle conversion est faite par bandes horizontales : on n'alloue
+    jamais une seconde copie pleine taille de l'image convertie.
+    Avec un stockage memmap (scratch.configure_scratch), une image pas encore
+    décodée est lue par bandes (BandReader) : un TIFF en strips ou tuilé n'est
+    jamais chargé en entier par Pillow. Sinon, une fois l'image chargée, les
+    bandes sont converties et copiées sur les threads des noyaux (parallel.py).
+    """
+    mode = native_mode(img.mode)
+    w, h = img.size
+    arr = SCRATCH.empty((h, w, len(mode_color(mode, "black"))))
+    if SCRATCH.enabled and img.tile:
+        for y, rows in BandReader(img, mode).iter_rows(band_rows):
+            arr[y:y + rows.shape[0]] = rows
+        return arr, mode
+
+    def copy_band(y0: int, y1: int) -> None:
+        band = img.crop((0, y0, w, y1))
+        if band.mode != mode:
+            band = band.convert(mode)
+        arr[y0:y1] = image_array(band)
+
+    img.load()
+    KERNELS.run(copy_band, KERNELS.split(0, h, w * arr.shape[2], max_rows=band_rows))
+    return arr, mode
+
+
+def padded_edits(
+    source: BandReader,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    label: str = "",
+) -> EditList:
+    """
+    Liste d'édition de l'image centrée : canvas élargi de colonnes de fond
+    (transparentes ou blanc papier selon le mode), image collée à pad_left,
+    puis les rectangles `fills`, en coordonnées de l'image centrée.
+    """
+    width = source.width + pad_left + pad_right
+    edits = EditList(width, source.height, source.mode, mode_color(source.mode, "empty"), source)
+    edits.paste_image(pad_left, 0)
+    edits.fill(fills, label)
+    return edits
+
+
+def iter_padded_bands(
+    source: BandReader,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    band_rows: int = 256,
+) -> Iterator[np.ndarray]:
+    """
+    Produit de haut en bas l'image centrée avec les rectangles `fills` appliqués.
+    Le padding n'existe qu'ici, en sortie : il n'est jamais recopié dans un
+    buffer intermédiaire ; un unique buffer de bande est réutilisé.
+    """
+    return iter_edit_bands(padded_edits(source, pad_left, pad_right, fills), band_rows)
+
+
+def render_padded(
+    source: np.ndarray | BandReader,
+    pad_left: int = 0,
+    pad_right: int = 0,
+    fills: list[Fill] = (),
+    label: str = "",
+) -> np.ndarray:
+    """
+    Image centrée avec `fills` appliqués, en mémoire. Sans padding, un buffer
+    source est modifié en place ; sinon la sortie est le seul buffer alloué
+    (dans le stockage de travail, voir scratch.py).
+    """
+    return render_edits(padded_edits(as_band_reader(source), pad_left, pad_right, fills, label), in_place=True)
+
+
+@dataclass
+class PipelineContext:
+    """
+    État partagé d'un traitement : l'image est décodée une seule fois dans `arr`,
+    dans son mode natif, que toutes les étapes (centrage, détection, modes 1/2/3)
+    lisent et modifient en place. La conversion vers PIL n'a lieu qu'à la sauvegarde.
+    """
+    arr: np.ndarray                      # buffer (H, W, canaux) partagé
+    settings: PrintSettings
+    dpi: tuple[float, float]
+    icc_profile: bytes | None = None
+    mode: str = "RGBA"
+    digest: str | None = None            # empreinte de la source (source_cache.py), tant que `arr` la contient
+
+    @classmethod
+    def from_image(cls, img: Image.Image, settings: PrintSettings) -> "PipelineContext":
+        """
+        Décode l'image et conserve ses métadonnées d'impression (dpi, profil ICC).
+        Avec le cache des sources, une image ouverte depuis un fichier porte son
+        empreinte ; son buffer décodé peut y être repris sans décodage.
+        """
+        icc_profile = img.info.get("icc_profile")
+        dpi = img.info.get("dpi", (settings.hdpi, settings.vdpi))
+        filename = getattr(img, "filename", "")
+        digest = SOURCE_CACHE.digest(filename) if filename else None
+        mode = native_mode(img.mode)
+        arr = SOURCE_CACHE.load_decoded(digest)
+        if arr is None or arr.shape[:2] != (img.height, img.width):
+            arr, mode = decode_native(img)
+            SOURCE_CACHE.save_decoded(digest, arr)
+        logger.debug(f"Buffer {mode} : {arr.shape[1]}x{arr.shape[0]}px  |  {arr.nbytes / 1e6:.1f} Mo")
+        return cls(arr=arr, settings=settings, dpi=dpi, icc_profile=icc_profile, mode=mode, digest=digest)
+
+    @property
+    def width(self) -> int:
+        return self.arr.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.arr.shape[0]
+
+    def reader(self) -> BandReader:
+        """Lecteur sur le buffer partagé, qui porte son mode (indispensable en CMYK) et son empreinte."""
+        return BandReader(self.arr, mode=self.mode, digest=self.digest)
+
+    def to_image(self) -> Image.Image:
+        """Unique conversion du buffer vers PIL (mémoire partagée quand c'est possible)."""
+        return array_image(self.arr, self.mode)
+
+    def save(
+        self,
+        path: Path | BinaryIO,
+        options: WriteOptions = WriteOptions(),
+        band_rows: int = 256,
+        format: str | None = None,
+    ) -> None:
+        """
+        Sauvegarde le buffer en conservant dpi et profil ICC de l'image source.
+        PNG et TIFF passent par les writers en flux (compression parallèle, TIFF
+        tuilé/BigTIFF) ; les autres formats par Pillow, dans le mode du buffer —
+        sauf RGBA vers un format sans alpha (JPEG), posé sur papier blanc en RGB.
+        `path` peut être un objet fichier binaire, avec `format` ("PNG", "TIFF", "JPEG"…).
+        """
+        streamed = format.upper() in ("PNG", "TIFF") if format else Path(path).suffix.lower() in WRITER_SUFFIXES
+        if streamed:
+            with open_writer(
+                path, self.width, self.height, self.mode, self.dpi, self.icc_profile, options, format=format,
+            ) as out:
+                for y in range(0, self.height, band_rows):
+                    out.write_rows(self.arr[y:y + band_rows])
+            return
+        save_kwargs = {"dpi": self.dpi}
+        if self.icc_profile:
+            save_kwargs["icc_profile"] = self.icc_profile
+        image = self.to_image()
+        pil_format = (format or Image.registered_extensions().get(Path(path).suffix.lower(), "")).upper()
+        if image.mode == "RGBA" and pil_format in NO_ALPHA_FORMATS:
+            paper = Image.new("RGB", image.size, mode_color("RGB", "white"))
+            paper.paste(image, mask=image.getchannel("A"))
+            image = paper
+        image.save(path if format else str(path), format=format, **save_kwargs)
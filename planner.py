@@ -0,0 +1,174 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+from band_reader import BandReader
+from center_padding import compute_padding
+from colors import mode_color
+from mode1 import mode1_geometry
+from models import PrintSettings
+from source_cache import SOURCE_CACHE
+from writer import DEFLATE_BLOCK_BYTES, WRITER_SUFFIXES, WriteOptions
+
+logger = logging.getLogger(__name__)
+
+
+# Mémoire fixe d'un processus : interpréteur, numpy, Pillow, cache des mires
+PROCESS_BASE_BYTES = 128 * 1024**2
+
+# Lignes lues à la fois par une lecture en flux (bandes alignées sur les chunks TIFF, marge comprise)
+STREAM_READ_ROWS = 1024
+
+# Lignes de la bande de sortie réutilisée par le rendu en flux
+STREAM_WRITE_ROWS = 256
+
+# Octets par pixel d'une image Pillow décodée (RGB et CMYK occupent 4 octets par pixel)
+_PIL_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2}
+
+# Stratégies, de la plus rapide à la plus lente
+STRATEGIES = ("memory", "stream", "mmap")
+STRATEGY_LABELS = {"memory": "en mémoire", "stream": "en flux", "mmap": "en memmap"}
+
+
+def format_bytes(n: int) -> str:
+    return f"{n / 1024**3:.1f} Go" if n >= 1024**3 else f"{n / 1024**2:.0f} Mo"
+
+
+@dataclass
+class MemoryPlan:
+    """
+    Stratégie d'exécution d'un traitement et mémoire de pointe estimée (octets)
+    de chaque stratégie possible. `strategy` vaut None si aucune ne tient dans `budget`.
+    """
+    strategy: str | None
+    estimates: dict[str, int]
+    budget: int | None = None
+    note: str = ""
+
+    @property
+    def peak(self) -> int:
+        """Estimation de la stratégie retenue, à défaut la plus économe."""
+        return self.estimates[self.strategy] if self.strategy else min(self.estimates.values())
+
+    def describe(self) -> str:
+        estimates = ", ".join(f"{STRATEGY_LABELS[s]} {format_bytes(n)}" for s, n in self.estimates.items())
+        budget = f"budget {format_bytes(self.budget)}" if self.budget else "sans budget"
+        choice = STRATEGY_LABELS[self.strategy] if self.strategy else "aucune stratégie ne tient"
+        return f"Mémoire estimée : {estimates} ({budget}) → {choice}"
+
+    def report(self) -> dict:
+        return {"strategy": self.strategy, "estimates": self.estimates, "budget": self.budget}
+
+    def require(self) -> "MemoryPlan":
+        """Refuse le traitement avant tout décodage si rien ne tient dans le budget."""
+        if self.strategy is None:
+            raise MemoryError(f"Traitement refusé — {self.describe()}" + (f". {self.note}" if self.note else ""))
+        return self
+
+
+def estimate_memory(
+    reader: BandReader,
+    pil_mode: str,
+    mode: int,
+    settings: PrintSettings,
+    bord_mire_mm: float,
+    pad: int,
+    out_suffix: str,
+    options: WriteOptions = WriteOptions(),
+    variants: bool = False,
+) -> dict[str, int]:
+    """
+    Mémoire de pointe de chaque stratégie possible, d'après les dimensions de
+    la source et la géométrie de la sortie (`pad` : padding de centrage total) :
+
+    - "memory" : image Pillow du décodage, puis source + sortie (canvas agrandi
+      des modes 1 et 3, image centrée du Mode 2 avec padding). La mémoire de
+      l'image Pillow, libérée après le décodage, reste en pratique acquise au
+      processus (tas de la libc) : elle compte jusqu'à la fin ;
+    - "stream" : bandes de lecture et de sortie, bande de mire, tampons de
+      compression. Une source qui ne se lit pas par bandes (PNG, JPEG…) est
+      chargée en entier par Pillow ;
+    - "mmap" : le rendu en mémoire, buffers pleine taille en memmap (scratch.py).
+      Leurs pages, adossées à un fichier, sont rendues au système à la demande
+      et ne comptent pas : il reste les bandes de lecture et d'écriture.
+
+    Les variantes partagent le buffer décodé et sont écrites en flux depuis lui ;
+    en flux, chacune relit la source par bandes, sans buffer décodé.
+    """
+    w, h = reader.size
+    channels = len(mode_color(reader.mode, "black"))
+    pil_bytes = w * h * _PIL_PIXEL_BYTES.get(pil_mode, 4)
+    source = w * h * channels
+
+    if mode == 2 and not variants:
+        out_w, out_h, strip = w + pad, h, 0
+    else:
+        geometry = mode1_geometry(w + pad, h, settings, bord_mire_mm)
+        out_w, out_h = geometry["total_w"], geometry["total_h"]
+        strip = geometry["strip_h"] * out_w * channels
+    output = out_w * out_h * channels
+
+    writes = out_suffix in WRITER_SUFFIXES
+    writer = 2 * options.workers * DEFLATE_BLOCK_BYTES
+    if out_suffix in (".tif", ".tiff"):
+        writer += 2 * options.tile * out_w * channels
+    band = STREAM_WRITE_ROWS * out_w * channels + strip + writer
+    read = STREAM_READ_ROWS * w * (channels + 4) if reader.streams_rows else pil_bytes
+
+    if variants:
+        return {
+            "memory": PROCESS_BASE_BYTES + pil_bytes + source + band,
+            "stream": PROCESS_BASE_BYTES + read + band,
+            "mmap": PROCESS_BASE_BYTES + read + band,
+        }
+
+    if mode == 2 and not pad:
+        processed = source                                  # modifié en place
+    else:
+        processed = source + output + strip
+    # Sortie non écrite en flux : Pillow recopie le buffer (RGB sur 4 octets) avant d'encoder
+    pillow_save = 0 if writes else output * 4 // channels
+    save = output + (band if writes else pillow_save)
+    estimates = {"memory": PROCESS_BASE_BYTES + pil_bytes + max(processed, save)}
+
+    streamable = writes and not (reader.mode == "CMYK" and out_suffix == ".png")
+    if streamable:
+        estimates["stream"] = PROCESS_BASE_BYTES + read + band
+    estimates["mmap"] = PROCESS_BASE_BYTES + read + max(band, pillow_save)
+    return estimates
+
+
+def plan_memory(args, out_path: Path, measure_padding: bool = True) -> MemoryPlan:
+    """
+    Choisit la stratégie d'un traitement : la plus rapide qui tient dans
+    --max_memory_mb (en mémoire, sinon en flux, sinon en memmap), --stream l'imposant.
+    Rien n'est décodé : seul l'en-tête est lu, plus la bande des 2 mm supérieurs
+    pour le centrage quand le format la lit sans charger l'image
+    (`measure_padding=False` : le pire cas, padding égal à la largeur).
+    """
+    settings = PrintSettings(lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI)
+    with Image.open(args.image) as img:
+        pil_mode = img.mode
+    reader = SOURCE_CACHE.reader(args.image)
+    if measure_padding and reader.reads_regions:
+        pad = sum(compute_padding(reader, settings))
+    else:
+        pad = reader.width
+
+    estimates = estimate_memory(
+        reader, pil_mode, args.mode, settings, args.bord_mire, pad, out_path.suffix.lower(),
+        WriteOptions(tile=args.tiff_tile, threads=args.write_threads), variants=bool(args.variant),
+    )
+    if args.stream:
+        estimates = {"stream": estimates["stream"]} if "stream" in estimates else {}
+    if not estimates:
+        raise ValueError(f"--stream n'écrit que du PNG ou du TIFF (sortie demandée : {out_path.name})")
+
+    budget = args.max_memory_mb * 1024**2 if args.max_memory_mb else None
+    fitting = [s for s in STRATEGIES if s in estimates and (budget is None or estimates[s] <= budget)]
+    note = ""
+    if not reader.streams_rows:
+        note = "La source est chargée en entier, même en flux ou en memmap : un TIFF tuilé ou en strips se lit par bandes"
+    return MemoryPlan(fitting[0] if fitting else None, estimates, budget, note)
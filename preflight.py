@@ -0,0 +1,148 @@
+import logging
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from templates import find_mire
+from band_reader import BandReader, PaddedReader
+from center_padding import middle_red_line, padding_for_center
+from colors import mode_color
+from detection import LOW_CONFIDENCE
+from mode1 import mode1_geometry
+from mode2 import detect_frame_lines, mode2_fills
+from mode3 import RED_LINES_LABEL, mode3_fills
+from models import PrintSettings
+from planner import estimate_memory
+from writer import WRITER_SUFFIXES, WriteOptions
+
+logger = logging.getLogger(__name__)
+
+
+# Colonnes noires nécessaires de chaque côté : le Mode 2 efface la 3e depuis le bord
+MIN_BLACK_COLUMNS = 3
+
+
+def _fills(fills: list, label: str) -> list[dict]:
+    return [{"box": [x0, y0, x1, y1], "color": list(color), "label": label} for x0, y0, x1, y1, color in fills]
+
+
+def preflight(args, out_path: Path) -> dict:
+    """
+    Vérification d'une plaque sans la traiter (--dry_run) : seuls l'en-tête, la
+    bande des 2 mm supérieurs (centrage), la bande du milieu et celle du cadre
+    haut (détection du cadre) sont lues. Un TIFF n'en décode que les chunks ;
+    un PNG, les lignes depuis le haut, par bandes glissantes (band_reader.PngRows).
+
+    Retourne la géométrie complète du traitement, dans les coordonnées de la
+    sortie : centrage, lignes du cadre détectées, rectangles à appliquer,
+    canvas (bande de mire, marge, traits de repérage), taille de la sortie et
+    mémoire estimée ; `confidence`, l'accord du vote de chaque détection
+    (detection.RunDetector). `problems` liste ce qui ferait échouer ou dévier le
+    traitement (ligne rouge absente, colonnes noires manquantes, mire introuvable).
+    """
+    t0 = time.perf_counter()
+    settings = PrintSettings(lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI)
+    problems = []
+
+    with Image.open(args.image) as img:
+        pil_mode, file_format = img.mode, img.format
+    reader = BandReader(args.image)
+    w, h = reader.size
+
+    # ── Centrage ──────────────────────────────────────────────────────────────
+    centre = middle_red_line(reader, settings)
+    red_center = centre["center"]
+    if red_center is None:
+        problems.append("Aucune ligne rouge dans les 2 mm supérieurs : pas de centrage")
+        pad_left = pad_right = 0
+    else:
+        pad_left, pad_right = padding_for_center(red_center, w)
+    width = w + pad_left + pad_right
+
+    # ── Cadre (coordonnées de l'image centrée) ────────────────────────────────
+    lines = detect_frame_lines(PaddedReader(reader, pad_left, pad_right), settings, args.cadre)
+    if not lines["red_lines"]:
+        problems.append("Aucune ligne rouge dans le cadre haut")
+    confidence = {"centre": centre["confidence"], **lines["confidence"]}
+    unsure = [f"{key} ({value:.2f})" for key, value in confidence.items() if value < LOW_CONFIDENCE]
+    if unsure:
+        problems.append(f"Détection peu sûre (confiance < {LOW_CONFIDENCE}) : {', '.join(unsure)}")
+
+    fills = []
+    if args.mode == 2:
+        missing = [
+            f"{side} ({len(lines[key])})" for side, key in (("gauche", "black_left"), ("droite", "black_right"))
+            if len(lines[key]) < MIN_BLACK_COLUMNS
+        ]
+        if missing:
+            problems.append(
+                f"Moins de {MIN_BLACK_COLUMNS} colonnes noires à {', '.join(missing)} : colonne à effacer introuvable"
+            )
+        else:
+            fills = _fills(mode2_fills(lines, h, settings, args.cadre, args.trait_noir_mm, reader.mode), "cadre")
+    elif args.mode == 3:
+        fills = _fills(
+            mode3_fills(lines["red_lines"], h, settings, args.cadre, args.trait_noir_mm, reader.mode),
+            RED_LINES_LABEL,
+        )
+
+    # ── Canvas de sortie ──────────────────────────────────────────────────────
+    if args.mode == 2:
+        canvas = {"width": width, "height": h, "image_box": [pad_left, 0, pad_left + w, h]}
+    else:
+        geometry = mode1_geometry(width, h, settings, args.bord_mire)
+        strip_h, margin = geometry["strip_h"], geometry["margin"]
+        x = margin + pad_left
+        canvas = {
+            "width": geometry["total_w"], "height": geometry["total_h"],
+            "strip_h": strip_h, "margin": margin,
+            "image_box": [x, strip_h, x + w, strip_h + h],
+            "marks": [list(mark) for mark in geometry["marks"]],
+        }
+        # Rectangles du Mode 3 : coordonnées de l'image centrée → canvas
+        for fill in fills:
+            x0, y0, x1, y1 = fill["box"]
+            fill["box"] = [x0 + margin, y0 + strip_h, x1 + margin, y1 + strip_h]
+        try:
+            mire = str(args.mire or find_mire(args.LPI, args.HDPI, args.VDPI))
+        except (FileNotFoundError, OSError) as e:
+            mire = None
+            problems.append(f"Mire introuvable : {e}")
+        canvas["mire"] = mire
+
+    channels = len(mode_color(reader.mode, "black"))
+    suffix = out_path.suffix.lower()
+    estimates = estimate_memory(
+        reader, pil_mode, args.mode, settings, args.bord_mire, pad_left + pad_right, suffix,
+        WriteOptions(tile=args.tiff_tile, threads=args.write_threads),
+    )
+
+    return {
+        "image": str(args.image),
+        "ok": not problems,
+        "problems": problems,
+        "mode": args.mode,
+        "settings": {"lpi": args.LPI, "hdpi": args.HDPI, "vdpi": args.VDPI, "bord_mire": args.bord_mire,
+                     "cadre": args.cadre, "trait_noir_mm": args.trait_noir_mm},
+        "layout": settings.layout(args.cadre, args.bord_mire, args.trait_noir_mm).to_dict(),
+        "source": {"width": w, "height": h, "mode": reader.mode, "format": file_format,
+                   "band_reads": reader.streams_rows},
+        "centre": {"red_found": red_center is not None, "red_center": red_center,
+                   "pad_left": pad_left, "pad_right": pad_right},
+        "frame": {
+            "black_left": [list(run) for run in lines["black_left"]],
+            "black_right": [list(run) for run in lines["black_right"]],
+            "red_lines": [list(run) for run in lines["red_lines"]],
+        },
+        "confidence": confidence,
+        "canvas": canvas,
+        "fills": fills,
+        "output": {
+            "path": str(out_path),
+            "format": WRITER_SUFFIXES.get(suffix, suffix.lstrip(".").upper()),
+            "raw_bytes": canvas["width"] * canvas["height"] * channels,
+        },
+        "memory": estimates,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
@@ -0,0 +1,113 @@
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+except ImportError:                      # Windows : pas de getrusage
+    resource = None
+
+
+def peak_rss_bytes() -> int | None:
+    """Pic de mémoire résidente du processus depuis son démarrage."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024     # Linux : en Ko
+
+
+class StageProfiler:
+    """
+    Mesure chaque étape du pipeline : temps réel, temps CPU, pic tracemalloc,
+    octets alloués (restés vivants) et pic RSS du processus.
+
+    Utilisation :
+        profiler = StageProfiler(job="plaque.tif")
+        with profiler.stage("center_padding") as rec:
+            ...
+            rec["output_size"] = [w, h]
+        profiler.write(path)
+
+    `on_stage` (optionnel) reçoit chaque mesure dès la fin de l'étape, pour
+    l'envoyer à un outil de supervision sans attendre la fin du job.
+    Désactivé (`enabled=False`), le profiler ne mesure rien et ne coûte rien.
+    """
+
+    def __init__(
+        self,
+        job: str = "",
+        enabled: bool = True,
+        trace_memory: bool = True,
+        on_stage: Callable[[dict], None] | None = None,
+    ):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.on_stage = on_stage
+        self.info: dict = {"job": job}
+        self.stages: list[dict] = []
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def note(self, **info) -> None:
+        """Ajoute des informations au niveau du job (dimensions, mode, réglages…)."""
+        if self.enabled:
+            self.info.update(info)
+
+    @contextmanager
+    def stage(self, name: str, **info) -> Iterator[dict]:
+        """Mesure le bloc ; le dict produit peut être complété (dimensions de sortie…)."""
+        record = {"stage": name, **info}
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            mem_before = tracemalloc.get_traced_memory()[0]
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - t0, 4)
+            record["cpu_s"] = round(time.process_time() - cpu0, 4)
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["allocated_bytes"] = current - mem_before
+                record["tracemalloc_peak_bytes"] = peak - mem_before
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            self.stages.append(record)
+            logger.debug(f"[profil] {name} : {record['wall_s']}s (CPU {record['cpu_s']}s)")
+            if self.on_stage is not None:
+                self.on_stage(record)
+
+    def report(self) -> dict:
+        """Rapport complet du job, sérialisable en JSON."""
+        return {
+            **self.info,
+            "stages": self.stages,
+            "total": {
+                "wall_s": round(time.perf_counter() - self._t0, 4),
+                "cpu_s": round(time.process_time() - self._cpu0, 4),
+                "peak_rss_bytes": peak_rss_bytes(),
+            },
+        }
+
+    def write(self, path: Path) -> None:
+        path.write_text(json.dumps(self.report(), indent=2, default=str), encoding="utf-8")
+        logger.info(f"Profil écrit : {path}")
+
+    def close(self) -> None:
+        """Arrête tracemalloc s'il a été démarré pour ce profiler."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
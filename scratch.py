@@ -0,0 +1,59 @@
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SCRATCH_DIR = Path(os.environ.get("MIREDIT_SCRATCH_DIR", tempfile.gettempdir()))
+
+
+class ScratchStorage:
+    """
+    Allocation des buffers pleine taille du pipeline : image décodée, canvas du
+    Mode 1, image centrée du Mode 2.
+
+    - sans dossier : tableaux numpy ordinaires, en mémoire ;
+    - avec un dossier (disque local rapide) : tableaux `numpy.memmap` sur des
+      fichiers creux, supprimés dès leur création (l'espace disque est rendu
+      quand le tableau est libéré). Le système pagine les buffers à la demande :
+      un remplissage de rectangle (fills du cadre) ne touche que les pages de
+      ses lignes et colonnes, et les pages déjà écrites peuvent repartir sur
+      disque plutôt que d'occuper la RAM.
+    """
+
+    def __init__(self, directory: Path | None = None):
+        self.directory = Path(directory) if directory else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def empty(self, shape: tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Buffer non initialisé (en memmap : des zéros, le fichier est creux)."""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.directory is None or nbytes == 0:
+            return np.empty(shape, dtype=dtype)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(prefix="miredit_", suffix=".raw", dir=self.directory)
+        try:
+            os.ftruncate(fd, nbytes)
+            with open(fd, "r+b", closefd=False) as fh:
+                arr = np.memmap(fh, dtype=dtype, mode="r+", shape=shape)
+        finally:
+            os.close(fd)
+            os.unlink(name)
+        logger.debug(f"Buffer memmap {shape} : {nbytes / 1e6:.1f} Mo dans {self.directory}")
+        return arr
+
+
+# Stockage partagé par tous les traitements du processus ; configuré par job (--scratch_dir)
+SCRATCH = ScratchStorage()
+
+
+def configure_scratch(directory: Path | None) -> None:
+    """Buffers pleine taille en memmap dans `directory`, ou en mémoire (None)."""
+    SCRATCH.directory = Path(directory) if directory else None
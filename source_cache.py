@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+from band_reader import BandReader
+
+logger = logging.getLogger(__name__)
+
+
+# Modes du cache : résultats de détection seuls, ou aussi une copie brute de l'image décodée
+SOURCE_CACHE_MODES = ("detection", "decoded")
+
+_MISSING = object()
+
+
+class SourceCache:
+    """
+    Cache disque des images sources, par contenu : une source retraitée avec
+    d'autres réglages (--LPI, --bord_mire, --trait_noir_mm…) n'est ni redécodée
+    ni réanalysée.
+
+    - empreinte : blake2b du fichier, mémorisée par (chemin, mtime, taille) :
+      un fichier inchangé n'est haché qu'une fois ;
+    - détection : un dossier par empreinte et un .json par résultat — centre
+      de la ligne rouge du milieu (par hauteur de bande scannée), lignes du
+      cadre (par taille de cadre en px et padding). Chaque fichier est écrit
+      d'un bloc (os.replace) : des processus qui traitent la même source ne
+      s'écrasent pas. Les lecteurs portent l'empreinte du contenu qu'ils lisent
+      (BandReader.digest) ; center_padding et mode2.detect_frame_lines passent
+      par memo() ;
+    - image décodée (`store_decoded`) : un .npy par empreinte, relu en memory-map
+      copie sur écriture — le Mode 2 peut modifier le buffer en place sans
+      toucher au fichier.
+
+    Le dossier est borné à `max_disk_bytes`, index des empreintes (paths/)
+    compris : les entrées les moins récemment utilisées partent en premier.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        store_decoded: bool = False,
+        max_disk_bytes: int = 16 * 1024**3,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.store_decoded = store_decoded
+        self.max_disk_bytes = max_disk_bytes
+        self._digests: dict[tuple, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    # ── Empreinte du contenu ──────────────────────────────────────────────────
+
+    def digest(self, path: Path | str) -> str | None:
+        """Empreinte du contenu de `path` (None si le cache est désactivé)."""
+        if not self.enabled:
+            return None
+        path = Path(path).resolve()
+        st = path.stat()
+        fingerprint = {"path": str(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        key = tuple(fingerprint.values())
+        if key in self._digests:
+            return self._digests[key]
+
+        index = self.cache_dir / "paths" / (hashlib.sha1(str(path).encode()).hexdigest() + ".json")
+        try:
+            known = json.loads(index.read_text())
+            if {k: known.get(k) for k in fingerprint} == fingerprint:
+                os.utime(index)
+                self._digests[key] = known["digest"]
+                return known["digest"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as fh:
+            while chunk := fh.read(1 << 20):
+                h.update(chunk)
+        digest = h.hexdigest()
+        logger.debug(f"Empreinte de {path.name} : {digest}")
+        self._digests[key] = digest
+        self._write(index, json.dumps({**fingerprint, "digest": digest}).encode())
+        return digest
+
+    def reader(self, path: Path | str, mode: str | None = None) -> BandReader:
+        """Lecteur de bandes sur le fichier, qui porte son empreinte."""
+        return BandReader(path, mode, digest=self.digest(path))
+
+    # ── Résultats de détection ────────────────────────────────────────────────
+
+    def memo(self, reader: BandReader, kind: str, params: tuple, compute: Callable[[], object]) -> object:
+        """
+        Résultat de `compute()` pour le contenu lu par `reader`, mis en cache sous
+        (kind, params) ; calculé directement si le lecteur n'a pas d'empreinte.
+        Les valeurs passent par JSON (les tuples reviennent en listes).
+        """
+        digest = getattr(reader, "digest", None)
+        if not self.enabled or digest is None:
+            return compute()
+        source, _, variant = digest.partition("+")
+        key = kind + ":" + ",".join(str(p) for p in params) + (f"+{variant}" if variant else "")
+
+        path = self.cache_dir / source / (hashlib.sha1(key.encode()).hexdigest() + ".json")
+        try:
+            entry = json.loads(path.read_text())
+            value = entry["value"] if entry.get("key") == key else _MISSING
+            os.utime(path)
+        except (OSError, ValueError, KeyError, AttributeError):
+            value = _MISSING
+        if value is not _MISSING:
+            logger.debug(f"Détection en cache : {key}")
+            return value
+
+        value = compute()
+        self._write(path, json.dumps({"key": key, "value": value}).encode())
+        self._evict()
+        return value
+
+    # ── Image décodée ─────────────────────────────────────────────────────────
+
+    def load_decoded(self, digest: str | None) -> np.ndarray | None:
+        """Image décodée en cache, en memory-map copie sur écriture, ou None."""
+        if not (self.enabled and self.store_decoded and digest):
+            return None
+        path = self.cache_dir / f"{digest}.npy"
+        try:
+            arr = np.load(path, mmap_mode="c")
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        logger.info(f"Image décodée en cache : {path.name}")
+        return arr
+
+    def save_decoded(self, digest: str | None, arr: np.ndarray) -> None:
+        if not (self.enabled and self.store_decoded and digest):
+            return
+        path = self.cache_dir / f"{digest}.npy"
+        if arr.nbytes > self.max_disk_bytes:
+            logger.debug(f"Image décodée plus grande que le cache, non conservée : {arr.nbytes / 1e6:.0f} Mo")
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as fh:
+                np.save(fh, arr)
+            os.replace(tmp, path)
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Image décodée non mise en cache ({e})")
+
+    # ── Disque ────────────────────────────────────────────────────────────────
+
+    def _write(self, path: Path, data: bytes) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Cache des sources non écrit ({e})")
+
+    def _evict(self) -> None:
+        if not self.cache_dir.is_dir():
+            return
+        files = []
+        for p in self.cache_dir.rglob("*"):
+            if p.suffix in (".npy", ".json"):
+                try:
+                    files.append((p.stat(), p))
+                except OSError:
+                    pass  # évincé entre-temps par un autre processus
+        files.sort(key=lambda f: f[0].st_mtime)
+        total = sum(st.st_size for st, _ in files)
+        while files and total > self.max_disk_bytes:
+            st, oldest = files.pop(0)
+            total -= st.st_size
+            oldest.unlink(missing_ok=True)
+            if oldest.parent != self.cache_dir:
+                try:
+                    oldest.parent.rmdir()  # seulement s'il est vide
+                except OSError:
+                    pass
+            logger.debug(f"Cache des sources : {oldest.relative_to(self.cache_dir)} évincé")
+
+
+# Cache partagé par tous les traitements du processus ; configuré par job (--source_cache)
+SOURCE_CACHE = SourceCache()
+
+
+def configure_source_cache(
+    cache_dir: Path | None,
+    store_decoded: bool = False,
+    max_disk_bytes: int = 16 * 1024**3,
+) -> None:
+    """Active le cache des sources dans `cache_dir` (None : désactivé)."""
+    SOURCE_CACHE.cache_dir = Path(cache_dir) if cache_dir else None
+    SOURCE_CACHE.store_decoded = store_decoded
+    SOURCE_CACHE.max_disk_bytes = max_disk_bytes
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Génère des images synthétiques au format Lenticular Suite (cadre de repérage),
+de 10 Mpx à plusieurs gigapixels, pour les benchmarks et les essais sans fichier client.
+"""
+import argparse
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from models import PrintSettings
+from writer import PngStreamWriter
+
+logger = logging.getLogger(__name__)
+
+RED   = (219, 0, 0, 255)      # rouge des lignes d'alignement Lenticular Suite
+BLACK = (0, 0, 0, 255)
+WHITE = (255, 255, 255, 255)
+
+
+@dataclass
+class SyntheticFrame:
+    """Paramètres d'une image synthétique ; `center_offset_px` décale la ligne rouge du milieu."""
+    width: int
+    height: int
+    settings: PrintSettings
+    cadre_mm: float = 4.0
+    n_black: int = 5             # colonnes noires par bande latérale
+    n_red: int = 5               # lignes rouges dans les cadres haut et bas
+    red_spacing_mm: float = 10.0
+    center_offset_px: int = 10
+
+    @classmethod
+    def from_megapixels(cls, megapixels: float, settings: PrintSettings, ratio: float = 3.0, **kwargs):
+        """Image d'environ `megapixels` Mpx, `ratio` fois plus large que haute."""
+        height = int((megapixels * 1e6 / ratio) ** 0.5)
+        return cls(width=int(height * ratio), height=height, settings=settings, **kwargs)
+
+    @property
+    def cadre_px_h(self) -> int:
+        return self.settings.mm_to_px_h(self.cadre_mm)
+
+    @property
+    def cadre_px_v(self) -> int:
+        return self.settings.mm_to_px_v(self.cadre_mm)
+
+    def black_columns(self) -> list[tuple[int, int]]:
+        """Colonnes noires [start, end) de la bande gauche ; la droite est symétrique."""
+        step = self.cadre_px_h // (self.n_black + 1)
+        col_w = max(step // 3, 1)
+        return [(i * step, i * step + col_w) for i in range(1, self.n_black + 1)]
+
+    def red_columns(self) -> list[tuple[int, int]]:
+        """Lignes rouges [start, end) : la ligne du milieu est à w/2 + center_offset_px."""
+        center = self.width // 2 + self.center_offset_px
+        spacing = self.settings.mm_to_px_h(self.red_spacing_mm)
+        half = self.n_red // 2
+        line_w = max(self.settings.line_frac_px(1 / 4), 1)
+        return [
+            (center + k * spacing - line_w // 2, center + k * spacing - line_w // 2 + line_w)
+            for k in range(-half, self.n_red - half)
+        ]
+
+    def _body_row(self) -> np.ndarray:
+        """Ligne type du corps de l'image : bandes verticales façon entrelacement lenticulaire."""
+        x = np.arange(self.width)
+        phase = (x % max(int(self.settings.px_per_line), 1)).astype(np.uint16)
+        row = np.empty((self.width, 4), dtype=np.uint8)
+        row[:, 0] = 40 + phase * 7 % 180
+        row[:, 1] = 60 + phase * 13 % 160
+        row[:, 2] = 80 + phase * 5 % 150
+        row[:, 3] = 255
+        return row
+
+    def _frame_rows(self) -> tuple[np.ndarray, np.ndarray]:
+        """Ligne type du corps et ligne type des cadres haut/bas, cadres latéraux compris."""
+        w, ch = self.width, self.cadre_px_h
+        body = self._body_row()
+        cadre = np.empty_like(body)
+        cadre[:] = WHITE
+        for row in (body, cadre):
+            row[:ch] = WHITE
+            row[w - ch:] = WHITE
+            for s, e in self.black_columns():
+                row[s:e] = BLACK
+                row[w - e:w - s] = BLACK
+        for s, e in self.red_columns():
+            cadre[max(s, 0):min(e, w)] = RED
+        return body, cadre
+
+    def bands(self, band_rows: int = 512):
+        """Génère l'image de haut en bas par bandes RGBA (y0, bande) ; mémoire : une bande."""
+        body, cadre = self._frame_rows()
+        cv, h = self.cadre_px_v, self.height
+        band = np.empty((band_rows, self.width, 4), dtype=np.uint8)
+        for y0 in range(0, h, band_rows):
+            n = min(band_rows, h - y0)
+            ys = np.arange(y0, y0 + n)
+            in_cadre = (ys < cv) | (ys >= h - cv)
+            view = band[:n]
+            view[:] = body
+            view[in_cadre] = cadre
+            yield y0, view
+
+    def to_array(self, out: np.ndarray | None = None) -> np.ndarray:
+        """Image complète en mémoire (ou dans `out`, par ex. un np.memmap)."""
+        if out is None:
+            out = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        for y0, band in self.bands():
+            out[y0:y0 + band.shape[0]] = band
+        return out
+
+    def write_png(self, path: Path, compress_level: int = 1) -> None:
+        """Écrit l'image en PNG par bandes, sans jamais la tenir entière en mémoire."""
+        dpi = (self.settings.hdpi, self.settings.vdpi)
+        with PngStreamWriter(path, self.width, self.height, dpi=dpi, compress_level=compress_level) as out:
+            for _, band in self.bands():
+                out.write_rows(band)
+
+
+def synthetic_mire(width: int = 4000, height: int = 200) -> Image.Image:
+    """Template de mire synthétique : damier de traits noirs sur fond transparent."""
+    arr = np.zeros((height, width, 4), dtype=np.uint8)
+    arr[:, ::4, 3] = 255
+    arr[::8, :, 3] = 255
+    return Image.fromarray(arr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Génère une image lenticulaire synthétique (PNG).")
+    parser.add_argument("output", type=Path, help="Fichier PNG de sortie.")
+    parser.add_argument("--mpx", type=float, default=10.0, help="Taille en mégapixels. (10 par défaut)")
+    parser.add_argument("--ratio", type=float, default=3.0, help="Rapport largeur/hauteur. (3 par défaut)")
+    parser.add_argument("--LPI", type=float, default=50.0)
+    parser.add_argument("--HDPI", type=int, default=720)
+    parser.add_argument("--VDPI", type=int, default=360)
+    parser.add_argument("--cadre", type=float, default=4.0, help="Cadre en mm. (4 par défaut)")
+    parser.add_argument("--offset", type=int, default=10, help="Décalage de la ligne rouge du milieu, en px.")
+    args = parser.parse_args()
+
+    settings = PrintSettings(lpi=args.LPI, hdpi=args.HDPI, vdpi=args.VDPI)
+    frame = SyntheticFrame.from_megapixels(
+        args.mpx, settings, ratio=args.ratio, cadre_mm=args.cadre, center_offset_px=args.offset,
+    )
+    logger.info(f"Image synthétique {frame.width}x{frame.height}px → {args.output}")
+    frame.write_png(args.output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    main()
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+# Ce module ne dépend que de pathlib : la ligne de commande vérifie la mire
+# avant de charger NumPy et Pillow (démarrage rapide, main.py).
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "mires_templates"
+
+
+def find_mire(lpi: float, hdpi: int, vdpi: int) -> Path:
+    resolution_dir = TEMPLATES_DIR / f"{hdpi}x{vdpi}"
+    mire_path = resolution_dir / f"{int(lpi)}.png"
+
+    if not resolution_dir.exists():
+        available = [d.name for d in TEMPLATES_DIR.iterdir() if d.is_dir()]
+        raise FileNotFoundError(
+            f"Aucun dossier de templates pour {hdpi}x{vdpi}.\n"
+            f"Résolutions disponibles : {available}"
+        )
+    if not mire_path.exists():
+        available = [f.stem for f in resolution_dir.glob("*.png")]
+        raise FileNotFoundError(
+            f"Aucune mire pour LPI={int(lpi)} à {hdpi}x{vdpi}.\n"
+            f"LPI disponibles : {available}"
+        )
+    return mire_path
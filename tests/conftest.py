@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les modules sont à la racine du dépôt
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import signal
+from pathlib import Path
+
+import pytest
+
+import batch
+from batch import Job, run_batch
+
+pytestmark = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="le faux traitement est hérité par les processus au fork",
+)
+
+
+def _fake_process(job: Job) -> dict:
+    if job.image.name == "killed.png":
+        os.kill(os.getpid(), signal.SIGKILL)
+    return {"image": str(job.image), "status": "ok", "error": None, "seconds": 0.0}
+
+
+def test_run_batch_returns_when_a_worker_is_killed(monkeypatch):
+    monkeypatch.setattr(batch, "_process", _fake_process)
+    jobs = [Job(Path(name), []) for name in ("a.png", "killed.png", "b.png", "c.png")]
+
+    results = {r["image"]: r for r in run_batch(jobs, workers=2)}
+
+    assert set(results) == {"a.png", "killed.png", "b.png", "c.png"}
+    assert results["killed.png"]["status"] == "error"
+    assert results["killed.png"]["error"] == "Processus de travail arrêté par SIGKILL"
+    assert all(results[name]["status"] == "ok" for name in ("a.png", "b.png", "c.png"))
+
+
+def test_run_batch_recycled_workers_are_not_lost(monkeypatch):
+    monkeypatch.setattr(batch, "_process", _fake_process)
+    jobs = [Job(Path(f"{i}.png"), []) for i in range(8)]
+
+    results = run_batch(jobs, workers=2, jobs_per_worker=1)
+
+    assert sorted(r["image"] for r in results) == sorted(f"{i}.png" for i in range(8))
+    assert all(r["status"] == "ok" for r in results)
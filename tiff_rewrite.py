@@ -0,0 +1,135 @@
+import io
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from band_reader import TAG_COMPRESSION, TAG_PHOTOMETRIC, TAG_PREDICTOR, TiffChunks
+from colors import array_image, image_array
+from edits import EditList, FillRect
+from writer import TIFF_MODES, WRITER_SUFFIXES, TiffChunkWriter, WriteOptions
+
+logger = logging.getLogger(__name__)
+
+
+# Compressions réencodables sans perte, à l'identique du fichier source : code TIFF → nom Pillow.
+# Deflate (8) et Adobe Deflate (32946) partagent le même flux zlib.
+REWRITE_COMPRESSIONS = {1: "raw", 5: "tiff_lzw", 8: "tiff_adobe_deflate", 32773: "packbits", 32946: "tiff_adobe_deflate"}
+
+
+def incremental_reason(edits: EditList, out_path: Path) -> str | None:
+    """
+    Pourquoi la liste d'édition ne peut pas être réécrite chunk par chunk dans
+    `out_path` ; None si elle le peut : sortie TIFF, source TIFF lue par chunks,
+    image qui couvre toute la sortie (pas de centrage ni de bandes de mire),
+    seulement des rectangles pleins par-dessus, compression sans perte.
+    """
+    if WRITER_SUFFIXES.get(out_path.suffix.lower()) != "TIFF":
+        return "sortie non TIFF"
+    chunks = edits.source.tiff_chunks
+    if chunks is None:
+        return "source non lue par chunks TIFF (8 bits, entrelacée)"
+    if out_path.resolve() == chunks.path.resolve():
+        return "la sortie remplacerait la source"
+    image = edits.image
+    if image is None or image.blend or (image.x, image.y, image.width, image.height) != (0, 0, edits.width, edits.height):
+        return "l'image ne couvre pas toute la sortie (centrage ou bandes de mire)"
+    if any(not isinstance(edit, FillRect) for edit in edits.edits if edit is not image):
+        return "collages autres que l'image"
+    if chunks.mode != edits.mode:
+        return f"chunks {chunks.mode} convertis en {edits.mode} à la lecture"
+    if chunks.tags.get(TAG_PHOTOMETRIC) != TIFF_MODES[edits.mode][0]:
+        return f"photométrie TIFF {chunks.tags.get(TAG_PHOTOMETRIC)} non gérée"
+    compression = chunks.tags.get(TAG_COMPRESSION, 1)
+    if compression not in REWRITE_COMPRESSIONS:
+        return f"compression TIFF {compression} non réencodable sans perte"
+    if chunks.tags.get(TAG_PREDICTOR, 1) not in (1, 2):
+        return f"prédicteur TIFF {chunks.tags[TAG_PREDICTOR]} non géré"
+    return None
+
+
+def _encode_chunk(chunk: np.ndarray, mode: str, compression: int, predictor: int) -> bytes:
+    """Chunk compressé comme ceux de la source : encodé par Pillow en un strip unique, puis extrait."""
+    buffer = io.BytesIO()
+    info = {278: chunk.shape[0]}
+    if predictor != 1:
+        info[317] = predictor
+    array_image(chunk, mode).save(buffer, "TIFF", compression=REWRITE_COMPRESSIONS[compression], tiffinfo=info)
+    with Image.open(buffer) as encoded:
+        offsets, counts = encoded.tag_v2[273], encoded.tag_v2[279]
+    if len(offsets) != 1:
+        raise ValueError(f"Chunk réencodé en {len(offsets)} strips au lieu d'un")
+    return buffer.getbuffer()[offsets[0]:offsets[0] + counts[0]].tobytes()
+
+
+def _patch_chunk(chunks: TiffChunks, index: int, data: bytes, fills: list[FillRect], mode: str) -> bytes:
+    """Décode un chunk, y applique les rectangles qui le touchent, le réencode à sa taille nominale."""
+    x0, y0, x1, y1 = chunks.chunk_box(index)
+    pixels = image_array(chunks.decode(index, data))
+    # Une tuile en bord d'image garde sa taille nominale, complétée de zéros ; un strip, sa hauteur
+    rows = chunks.chunk_h if chunks.tiled else y1 - y0
+    chunk = np.zeros((rows, chunks.chunk_w, pixels.shape[2]), dtype=np.uint8)
+    chunk[:y1 - y0, :x1 - x0] = pixels
+    for fill in fills:
+        fx0, fy0, fx1, fy1 = max(fill.x0, x0), max(fill.y0, y0), min(fill.x1, x1), min(fill.y1, y1)
+        if fx0 < fx1 and fy0 < fy1:
+            chunk[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0] = fill.color
+    return _encode_chunk(
+        chunk, mode, chunks.tags.get(TAG_COMPRESSION, 1), chunks.tags.get(TAG_PREDICTOR, 1),
+    )
+
+
+def rewrite_tiff(
+    edits: EditList,
+    out_path: Path,
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    options: WriteOptions = WriteOptions(),
+) -> dict:
+    """
+    Réécriture incrémentale (voir incremental_reason) : la sortie garde les
+    tuiles/strips et la compression de la source. Seuls les chunks touchés par
+    un rectangle sont décodés, modifiés et réencodés (en parallèle, sur
+    options.workers threads) ; tous les autres sont recopiés octet pour octet,
+    sans décodage. Retourne le nombre de chunks recopiés et réencodés.
+    """
+    chunks = edits.source.tiff_chunks
+    fills = [edit for edit in edits.edits if isinstance(edit, FillRect)]
+    dirty = set()
+    for fill in fills:
+        x0, y0 = max(fill.x0, 0), max(fill.y0, 0)
+        x1, y1 = min(fill.x1, chunks.width), min(fill.y1, chunks.height)
+        if x0 < x1 and y0 < y1:
+            dirty.update(chunks.chunks_in(x0, y0, x1, y1))
+
+    window = 4 * options.workers
+    with (
+        open(chunks.path, "rb") as src,
+        ThreadPoolExecutor(max_workers=options.workers, thread_name_prefix="tiff") as pool,
+        TiffChunkWriter(
+            out_path, chunks.width, chunks.height, edits.mode, chunks.chunk_w, chunks.chunk_h, chunks.tiled,
+            chunks.tags.get(TAG_COMPRESSION, 1), chunks.tags.get(TAG_PREDICTOR, 1),
+            dpi=dpi, icc_profile=icc_profile, bigtiff=options.bigtiff,
+        ) as out,
+    ):
+        pending: deque[bytes | Future] = deque()
+        for index in range(len(chunks.offsets)):
+            data = chunks.read_raw(src, index)
+            if index in dirty:
+                data = pool.submit(_patch_chunk, chunks, index, data, fills, edits.mode)
+            pending.append(data)
+            while len(pending) > window:
+                item = pending.popleft()
+                out.write_chunk(item.result() if isinstance(item, Future) else item)
+        for item in pending:
+            out.write_chunk(item.result() if isinstance(item, Future) else item)
+
+    stats = {"chunks": len(chunks.offsets), "copied": len(chunks.offsets) - len(dirty), "reencoded": len(dirty)}
+    logger.info(
+        f"Réécriture incrémentale : {stats['reencoded']} chunk(s) réencodé(s), "
+        f"{stats['copied']} recopié(s) sur {stats['chunks']}"
+    )
+    return stats
@@ -0,0 +1,140 @@
+import logging
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from band_reader import BandReader, PaddedReader, as_band_reader
+from center_padding import compute_padding
+from mode1 import write_mode1_streamed
+from mode2 import analyse_red_lines, mode2_fills, write_mode2_streamed
+from edits import Fill
+from mode3 import RED_LINES_LABEL, mode3_fills
+from models import PrintSettings
+from writer import WRITER_SUFFIXES, WriteOptions
+
+logger = logging.getLogger(__name__)
+
+# Clés d'une spécification --variant et leur conversion
+VARIANT_KEYS = {"mode": int, "bord_mire": float, "cadre": int, "trait_noir_mm": float, "output": str}
+
+
+@dataclass(frozen=True)
+class Variant:
+    """Une sortie demandée pour l'image : mode et réglages propres à ce mode."""
+    mode: int
+    bord_mire: float
+    cadre: int
+    trait_noir_mm: float
+    output: str | None = None
+
+    @classmethod
+    def from_args(cls, args) -> "Variant":
+        return cls(args.mode, args.bord_mire, args.cadre, args.trait_noir_mm, args.output)
+
+    def output_name(self, default_name: str, base: "Variant") -> str:
+        """
+        Nom de sortie : `output` s'il est donné, sinon le nom par défaut du mode,
+        suivi des réglages qui diffèrent de `base` (ex. plaque_HC_bord_mire6.png).
+        """
+        if self.output:
+            return self.output
+        name = Path(default_name)
+        diffs = "".join(
+            f"_{f.name}{getattr(self, f.name):g}"
+            for f in fields(self)
+            if f.name not in ("mode", "output") and getattr(self, f.name) != getattr(base, f.name)
+        )
+        return name.stem + diffs + name.suffix
+
+
+def parse_variant(spec: str, base: Variant) -> Variant:
+    """
+    Variante décrite par "clé=valeur,clé=valeur" (clés : mode, bord_mire, cadre,
+    trait_noir_mm, output), les clés absentes reprenant `base`. "3" équivaut à "mode=3".
+    """
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, sep, value = item.partition("=")
+        if not sep:
+            key, value = "mode", key
+        key = key.strip()
+        if key not in VARIANT_KEYS:
+            raise ValueError(f"Variante « {spec} » : clé inconnue {key!r} (attendu : {', '.join(VARIANT_KEYS)})")
+        values[key] = VARIANT_KEYS[key](value.strip())
+    variant = replace(base, **{"output": None, **values})
+    if variant.mode not in (1, 2, 3):
+        raise ValueError(f"Variante « {spec} » : mode {variant.mode} inconnu")
+    return variant
+
+
+class SharedAnalysis:
+    """
+    Résultats intermédiaires d'une image, calculés une fois et partagés par ses variantes :
+    padding de centrage (indépendant des réglages) et lignes du cadre, une détection par cadre.
+
+    La détection se fait dans l'image centrée (PaddedReader), comme pour le Mode 2.
+    Le padding ne contenant jamais de rouge, les lignes rouges sont aussi celles
+    du Mode 3 (détectées sur la source puis décalées de pad_left).
+    """
+
+    def __init__(self, source: np.ndarray | BandReader, settings: PrintSettings):
+        self.reader = as_band_reader(source)
+        self.settings = settings
+        self._padding: tuple[int, int] | None = None
+        self._lines: dict[int, dict] = {}
+
+    @property
+    def padding(self) -> tuple[int, int]:
+        if self._padding is None:
+            self._padding = compute_padding(self.reader, self.settings)
+        return self._padding
+
+    def lines(self, cadre_mm: float) -> dict:
+        if cadre_mm not in self._lines:
+            centered = PaddedReader(self.reader, *self.padding)
+            self._lines[cadre_mm] = analyse_red_lines(centered, self.settings, cadre_mm)
+        return self._lines[cadre_mm]
+
+    def fills(self, variant: Variant) -> list[Fill]:
+        """Rectangles du mode de la variante, en coordonnées de l'image centrée."""
+        if variant.mode == 1:
+            return []
+        lines, h, mode = self.lines(variant.cadre), self.reader.height, self.reader.mode
+        if variant.mode == 2:
+            return mode2_fills(lines, h, self.settings, variant.cadre, variant.trait_noir_mm, mode)
+        return mode3_fills(lines["red_lines"], h, self.settings, variant.cadre, variant.trait_noir_mm, mode)
+
+
+def write_variant(
+    shared: SharedAnalysis,
+    variant: Variant,
+    mire: Image.Image | Path,
+    out_path: Path,
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    options: WriteOptions = WriteOptions(),
+    dump_edits: Path | None = None,
+) -> None:
+    """
+    Écrit une variante en flux à partir de la source partagée : aucune copie
+    pleine taille, la source n'est jamais modifiée.
+    """
+    if out_path.suffix.lower() not in WRITER_SUFFIXES:
+        raise ValueError(f"Les variantes ne s'écrivent qu'en PNG ou TIFF (sortie demandée : {out_path.name})")
+    reader, settings = shared.reader, shared.settings
+    pad_left, pad_right = shared.padding
+    fills = shared.fills(variant)
+    if variant.mode == 2:
+        write_mode2_streamed(
+            reader, settings, variant.cadre, variant.trait_noir_mm, out_path,
+            dpi=dpi, icc_profile=icc_profile, pad_left=pad_left, pad_right=pad_right,
+            options=options, fills=fills, dump_edits=dump_edits,
+        )
+    else:
+        write_mode1_streamed(
+            reader, mire, settings, variant.bord_mire, out_path,
+            dpi=dpi, icc_profile=icc_profile, pad_left=pad_left, pad_right=pad_right, fills=fills,
+            options=options, label=RED_LINES_LABEL if variant.mode == 3 else "", dump_edits=dump_edits,
+        )
@@ -0,0 +1,544 @@
+import logging
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Types de couleur PNG par mode PIL (profondeur 8 bits)
+_PNG_COLOR_TYPES = {"L": (0, 1), "RGB": (2, 3), "RGBA": (6, 4)}
+
+# Taille cible des chunks IDAT écrits sur disque
+IDAT_CHUNK_BYTES = 1 << 20
+
+
+# Taille des blocs compressés indépendamment par la compression parallèle
+DEFLATE_BLOCK_BYTES = 1 << 20
+
+# Fenêtre deflate : chaque bloc est amorcé avec la fin du bloc précédent
+_DEFLATE_WINDOW = 32 * 1024
+
+
+@dataclass(frozen=True)
+class WriteOptions:
+    """Réglages d'écriture de la sortie (PNG ou TIFF, choisi par l'extension)."""
+    compress_level: int = 6
+    compression: str = "deflate"     # TIFF : "deflate" ou "none"
+    tile: int = 256                  # TIFF : côté des tuiles en px, 0 = strips
+    threads: int = 0                 # threads de compression, 0 = un par cœur
+    bigtiff: bool | None = None      # None : BigTIFF seulement si la taille l'exige
+
+    @property
+    def workers(self) -> int:
+        return self.threads or os.cpu_count() or 1
+
+
+# Préréglage épreuvage : compression minimale, écriture la plus rapide
+FAST_WRITE = WriteOptions(compress_level=1)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def _deflate_block(data: bytes, level: int, zdict: bytes, final: bool) -> bytes:
+    """Compresse un bloc en deflate brut, amorcé avec `zdict` ; aligné sur un octet s'il n'est pas final."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelDeflate:
+    """
+    Flux zlib compressé par blocs indépendants sur plusieurs threads (comme pigz).
+
+    Même interface que `zlib.compressobj` (compress / flush). Chaque bloc de
+    DEFLATE_BLOCK_BYTES est amorcé avec les 32 derniers Ko du bloc précédent
+    (le taux de compression reste proche d'un flux unique) et terminé par un
+    flush synchrone ; les blocs sont concaténés dans l'ordre, l'adler32 est
+    calculé sur le flux complet. zlib libère le GIL : les threads suffisent.
+    """
+
+    def __init__(self, level: int, threads: int, block_bytes: int = DEFLATE_BLOCK_BYTES):
+        self.level = level
+        self.block_bytes = block_bytes
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="deflate")
+        self._max_pending = 2 * threads
+        self._futures: deque[Future] = deque()
+        self._buffer = bytearray()
+        self._previous_tail = b""
+        self._adler = 1
+        self._header = b"\x78\x9c"
+
+    def _submit(self, data: bytes, final: bool) -> None:
+        self._adler = zlib.adler32(data, self._adler)
+        self._futures.append(self._executor.submit(_deflate_block, data, self.level, self._previous_tail, final))
+        self._previous_tail = data[-_DEFLATE_WINDOW:]
+
+    def _collect(self, keep: int) -> bytes:
+        out = bytearray(self._header)
+        self._header = b""
+        while len(self._futures) > keep:
+            out += self._futures.popleft().result()
+        return bytes(out)
+
+    def compress(self, data: bytes) -> bytes:
+        self._buffer += data
+        while len(self._buffer) >= self.block_bytes:
+            block = bytes(self._buffer[:self.block_bytes])
+            del self._buffer[:self.block_bytes]
+            self._submit(block, final=False)
+        return self._collect(keep=self._max_pending)
+
+    def flush(self) -> bytes:
+        self._submit(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        out = self._collect(keep=0) + struct.pack(">I", self._adler)
+        self._executor.shutdown()
+        return out
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+
+class PngStreamWriter:
+    """
+    Écrit un PNG ligne par ligne (par bandes) sans jamais tenir l'image entière en mémoire.
+
+    Chaque bande reçue est filtrée (filtre PNG « Up », vectorisé sur la bande),
+    compressée au fil de l'eau et écrite dans des chunks IDAT. Les métadonnées
+    d'impression (dpi → pHYs, profil ICC → iCCP) sont écrites dans l'en-tête,
+    comme le fait Pillow. Avec `threads` > 1, la compression est répartie sur
+    plusieurs cœurs (ParallelDeflate).
+
+    Utilisation :
+        with PngStreamWriter(path, w, h, dpi=dpi, icc_profile=icc) as out:
+            for band in bands:
+                out.write_rows(band)
+
+    `path` peut aussi être un objet fichier binaire ouvert (io.BytesIO…), laissé ouvert.
+    """
+
+    def __init__(
+        self,
+        path: Path | BinaryIO,
+        width: int,
+        height: int,
+        mode: str = "RGBA",
+        dpi: tuple[float, float] | None = None,
+        icc_profile: bytes | None = None,
+        compress_level: int = 6,
+        threads: int = 1,
+    ):
+        if mode not in _PNG_COLOR_TYPES:
+            raise ValueError(f"Mode {mode} non supporté par l'écriture PNG en flux")
+        color_type, self.channels = _PNG_COLOR_TYPES[mode]
+        self.path = None if hasattr(path, "write") else Path(path)
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._previous = np.zeros((1, width * self.channels), dtype=np.uint8)
+        # Un seul thread : flux zlib classique ; sinon compression parallèle par blocs
+        self._compressor = (
+            zlib.compressobj(compress_level) if threads <= 1 else ParallelDeflate(compress_level, threads)
+        )
+        self._pending = bytearray()
+
+        self._fh = path if self.path is None else open(self.path, "wb")
+        self._closed = False
+        self._fh.write(b"\x89PNG\r\n\x1a\n")
+        self._fh.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        if icc_profile:
+            self._fh.write(_png_chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(icc_profile)))
+        if dpi:
+            ppm_x, ppm_y = (int(d / 0.0254 + 0.5) for d in dpi)
+            self._fh.write(_png_chunk(b"pHYs", struct.pack(">IIB", ppm_x, ppm_y, 1)))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Ajoute une bande de lignes, shape (n, width, channels), uint8."""
+        n = rows.shape[0]
+        if rows.shape[1:] != (self.width, self.channels):
+            raise ValueError(f"Bande de shape {rows.shape} incompatible avec {self.width}x{self.channels}")
+        if self.rows_written + n > self.height:
+            raise ValueError("Trop de lignes écrites pour la hauteur déclarée")
+
+        flat = np.ascontiguousarray(rows).reshape(n, -1)
+        filtered = np.empty((n, flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2                                  # filtre Up : différence avec la ligne du dessus
+        np.subtract(flat[:1], self._previous, out=filtered[:1, 1:])
+        np.subtract(flat[1:], flat[:-1], out=filtered[1:, 1:])
+        self._previous = flat[-1:].copy()
+
+        self._pending += self._compressor.compress(filtered.tobytes())
+        self.rows_written += n
+        self._flush_idat(IDAT_CHUNK_BYTES)
+
+    def _flush_idat(self, threshold: int) -> None:
+        if len(self._pending) >= threshold:
+            self._fh.write(_png_chunk(b"IDAT", bytes(self._pending)))
+            self._pending.clear()
+
+    def close(self) -> None:
+        """Termine le flux zlib et écrit IEND. Vérifie que toutes les lignes ont été reçues."""
+        if self._closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"{self.rows_written} lignes écrites sur {self.height} attendues")
+            self._pending += self._compressor.flush()
+            self._flush_idat(1)
+            self._fh.write(_png_chunk(b"IEND", b""))
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        """Ferme le fichier ouvert par le writer ; un objet fichier fourni reste ouvert."""
+        self._closed = True
+        if self.path is not None:
+            self._fh.close()
+
+    def __enter__(self) -> "PngStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            if isinstance(self._compressor, ParallelDeflate):
+                self._compressor.close()
+            self._release()
+
+
+# ─────────────────────────────────────────────
+# TIFF / BigTIFF tuilé ou en strips
+# ─────────────────────────────────────────────
+
+# Photometric et canaux par mode PIL
+TIFF_MODES = {"L": (1, 1), "RGB": (2, 3), "RGBA": (2, 4), "CMYK": (5, 4)}
+TIFF_COMPRESSIONS = {"none": 1, "deflate": 8}
+
+# Types TIFF : (code, taille, format struct)
+_SHORT, _LONG, _RATIONAL, _UNDEFINED, _LONG8 = (3, 2, "H"), (4, 4, "I"), (5, 8, "II"), (7, 1, "B"), (16, 8, "Q")
+
+# Hauteur visée d'un strip, en octets non compressés
+_STRIP_BYTES = 1 << 20
+
+
+def _compress_chunk(chunk: np.ndarray, compression: str, level: int) -> bytes:
+    """Compresse une tuile/un strip ; en deflate, avec le prédicteur horizontal (Predictor=2)."""
+    if compression == "none":
+        return chunk.tobytes()
+    diff = chunk.copy()
+    np.subtract(chunk[:, 1:], chunk[:, :-1], out=diff[:, 1:])
+    return zlib.compress(diff.tobytes(), level)
+
+
+class TiffStreamWriter:
+    """
+    Écrit un TIFF (ou BigTIFF) tuilé ou en strips, par bandes, sans tenir l'image
+    entière en mémoire. Les tuiles d'une rangée sont compressées en parallèle
+    (deflate + prédicteur horizontal, ou sans compression) et écrites dans l'ordre ;
+    l'IFD est écrit à la fin et son offset reporté dans l'en-tête.
+
+    dpi → XResolution/YResolution, profil ICC → tag 34675, comme le fait Pillow.
+    BigTIFF est choisi automatiquement si la taille non compressée approche 4 Go.
+    `path` peut aussi être un objet fichier binaire avec seek, en position 0, laissé ouvert.
+    """
+
+    def __init__(
+        self,
+        path: Path | BinaryIO,
+        width: int,
+        height: int,
+        mode: str = "RGBA",
+        dpi: tuple[float, float] | None = None,
+        icc_profile: bytes | None = None,
+        compression: str = "deflate",
+        compress_level: int = 6,
+        tile: int = 256,
+        threads: int = 1,
+        bigtiff: bool | None = None,
+    ):
+        if mode not in TIFF_MODES:
+            raise ValueError(f"Mode {mode} non supporté par l'écriture TIFF")
+        if compression not in TIFF_COMPRESSIONS:
+            raise ValueError(f"Compression TIFF inconnue : {compression} ({', '.join(TIFF_COMPRESSIONS)})")
+        if tile < 0 or tile % 16:
+            raise ValueError(f"La taille de tuile doit être 0 ou un multiple de 16 (reçu {tile})")
+        self.photometric, self.channels = TIFF_MODES[mode]
+        self.path = None if hasattr(path, "write") else Path(path)
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.dpi = dpi
+        self.icc_profile = icc_profile
+        self.compression = compression
+        self.compression_code = TIFF_COMPRESSIONS[compression]
+        self.predictor = 2 if compression == "deflate" else 1
+        self.compress_level = compress_level
+        self.tile = tile
+        self.rows_written = 0
+
+        raw_bytes = width * height * self.channels
+        self.big = bigtiff if bigtiff is not None else raw_bytes * 1.01 + (1 << 20) >= 1 << 32
+        if tile:
+            self.chunk_w, self.chunk_h = tile, tile
+        else:
+            self.chunk_w = width
+            self.chunk_h = max(1, min(height, _STRIP_BYTES // max(width * self.channels, 1)))
+
+        self._rows = np.empty((self.chunk_h, width, self.channels), dtype=np.uint8)
+        self._filled = 0
+        self._offsets: list[int] = []
+        self._counts: list[int] = []
+        self._executor = ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix="tiff")
+
+        self._fh = path if self.path is None else open(self.path, "wb")
+        self._closed = False
+        if self.big:
+            self._fh.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, 0))
+        else:
+            self._fh.write(b"II" + struct.pack("<HI", 42, 0))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Ajoute une bande de lignes, shape (n, width, channels), uint8."""
+        rows = rows.reshape(rows.shape[0], rows.shape[1], -1)
+        if rows.shape[1:] != (self.width, self.channels):
+            raise ValueError(f"Bande de shape {rows.shape} incompatible avec {self.width}x{self.channels}")
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("Trop de lignes écrites pour la hauteur déclarée")
+        self.rows_written += rows.shape[0]
+        while rows.shape[0]:
+            n = min(self.chunk_h - self._filled, rows.shape[0])
+            self._rows[self._filled:self._filled + n] = rows[:n]
+            self._filled += n
+            rows = rows[n:]
+            if self._filled == self.chunk_h:
+                self._write_chunk_row()
+
+    def _chunks(self) -> list[np.ndarray]:
+        """Découpe la rangée en cours en tuiles pleine taille (bords complétés de zéros) ou en un strip."""
+        if not self.tile:
+            return [self._rows[:self._filled]]
+        if self._filled < self.chunk_h:
+            self._rows[self._filled:] = 0
+        chunks = []
+        for x0 in range(0, self.width, self.chunk_w):
+            chunk = self._rows[:, x0:x0 + self.chunk_w]
+            if chunk.shape[1] < self.chunk_w:
+                padded = np.zeros((self.chunk_h, self.chunk_w, self.channels), dtype=np.uint8)
+                padded[:, :chunk.shape[1]] = chunk
+                chunk = padded
+            chunks.append(chunk)
+        return chunks
+
+    def _write_chunk_row(self) -> None:
+        futures = [
+            self._executor.submit(_compress_chunk, chunk, self.compression, self.compress_level)
+            for chunk in self._chunks()
+        ]
+        for future in futures:
+            data = future.result()
+            self._offsets.append(self._fh.tell())
+            self._counts.append(len(data))
+            self._fh.write(data)
+        self._filled = 0
+
+    def _ifd_entries(self) -> list[tuple[int, tuple, list]]:
+        offsets_type = _LONG8 if self.big else _LONG
+        entries = [
+            (256, _LONG, [self.width]),
+            (257, _LONG, [self.height]),
+            (258, _SHORT, [8] * self.channels),
+            (259, _SHORT, [self.compression_code]),
+            (262, _SHORT, [self.photometric]),
+            (277, _SHORT, [self.channels]),
+            (284, _SHORT, [1]),
+        ]
+        if self.tile:
+            entries += [
+                (322, _LONG, [self.chunk_w]),
+                (323, _LONG, [self.chunk_h]),
+                (324, offsets_type, self._offsets),
+                (325, offsets_type, self._counts),
+            ]
+        else:
+            entries += [
+                (273, offsets_type, self._offsets),
+                (278, _LONG, [self.chunk_h]),
+                (279, offsets_type, self._counts),
+            ]
+        if self.predictor != 1:
+            entries.append((317, _SHORT, [self.predictor]))
+        if self.mode == "RGBA":
+            entries.append((338, _SHORT, [2]))                     # alpha non prémultiplié
+        if self.mode == "CMYK":
+            entries.append((332, _SHORT, [1]))                     # InkSet : CMJN
+        if self.dpi:
+            x, y = (Fraction(d).limit_denominator(1 << 20) for d in self.dpi)
+            entries += [
+                (282, _RATIONAL, [x.numerator, x.denominator]),
+                (283, _RATIONAL, [y.numerator, y.denominator]),
+                (296, _SHORT, [2]),
+            ]
+        if self.icc_profile:
+            entries.append((34675, _UNDEFINED, list(self.icc_profile)))
+        return sorted(entries, key=lambda e: e[0])
+
+    def _write_ifd(self) -> None:
+        """Écrit l'IFD (valeurs longues à la suite) en fin de fichier et reporte son offset."""
+        big = self.big
+        entries = self._ifd_entries()
+        inline = 8 if big else 4
+        ifd_offset = self._fh.tell()
+        ifd_offset += ifd_offset % 2
+        entry_size = 20 if big else 12
+        ifd_size = (8 if big else 2) + len(entries) * entry_size + (8 if big else 4)
+
+        ifd = bytearray(struct.pack("<Q" if big else "<H", len(entries)))
+        extra = bytearray()
+        for tag, (code, size, fmt), values in entries:
+            count = len(values) // 2 if code == 5 else len(values)
+            if code == 7:
+                data = bytes(values)
+            else:
+                data = struct.pack("<" + fmt[0] * len(values), *values)
+            if len(data) <= inline:
+                field = data.ljust(inline, b"\0")
+            else:
+                field = struct.pack("<Q" if big else "<I", ifd_offset + ifd_size + len(extra))
+                extra += data + b"\0" * (len(data) % 2)
+            ifd += struct.pack("<HHQ" if big else "<HHI", tag, code, count) + field
+        ifd += b"\0" * (8 if big else 4)                            # pas d'IFD suivant
+
+        self._fh.seek(ifd_offset)
+        self._fh.write(bytes(ifd) + bytes(extra))
+        self._fh.seek(8 if big else 4)
+        self._fh.write(struct.pack("<Q" if big else "<I", ifd_offset))
+
+    def close(self) -> None:
+        """Termine la dernière rangée, écrit l'IFD. Vérifie que toutes les lignes ont été reçues."""
+        if self._closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"{self.rows_written} lignes écrites sur {self.height} attendues")
+            if self._filled:
+                self._write_chunk_row()
+            self._write_ifd()
+        finally:
+            self._executor.shutdown()
+            self._release()
+
+    def _release(self) -> None:
+        """Ferme le fichier ouvert par le writer ; un objet fichier fourni reste ouvert."""
+        self._closed = True
+        if self.path is not None:
+            self._fh.close()
+
+    def __enter__(self) -> "TiffStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
+            self._release()
+
+
+class TiffChunkWriter(TiffStreamWriter):
+    """
+    TIFF écrit chunk par chunk, déjà compressés, avec la géométrie (tuiles ou
+    strips) et la compression d'une source : base de la réécriture incrémentale
+    (tiff_rewrite.py), où les chunks intacts sont recopiés octet pour octet.
+    Les chunks sont attendus dans l'ordre du fichier (de gauche à droite, de haut en bas).
+    """
+
+    def __init__(
+        self,
+        path: Path | BinaryIO,
+        width: int,
+        height: int,
+        mode: str,
+        chunk_w: int,
+        chunk_h: int,
+        tiled: bool,
+        compression_code: int,
+        predictor: int = 1,
+        dpi: tuple[float, float] | None = None,
+        icc_profile: bytes | None = None,
+        bigtiff: bool | None = None,
+    ):
+        super().__init__(
+            path, width, height, mode=mode, dpi=dpi, icc_profile=icc_profile,
+            compression="none", tile=chunk_w if tiled else 0, bigtiff=bigtiff,
+        )
+        self.chunk_w, self.chunk_h = chunk_w, chunk_h
+        self.compression_code = compression_code
+        self.predictor = predictor
+        self.chunk_count = -(-width // chunk_w) * -(-height // chunk_h)
+
+    def write_chunk(self, data: bytes) -> None:
+        """Ajoute le chunk suivant, compressé."""
+        if len(self._offsets) == self.chunk_count:
+            raise ValueError(f"Trop de chunks écrits ({self.chunk_count} attendus)")
+        self._offsets.append(self._fh.tell())
+        self._counts.append(len(data))
+        self._fh.write(data)
+
+    def close(self) -> None:
+        """Écrit l'IFD. Vérifie que tous les chunks ont été reçus."""
+        if self._closed:
+            return
+        try:
+            if len(self._offsets) != self.chunk_count:
+                raise ValueError(f"{len(self._offsets)} chunks écrits sur {self.chunk_count} attendus")
+            self._write_ifd()
+        finally:
+            self._executor.shutdown()
+            self._release()
+
+
+# Extensions de sortie gérées par les writers en flux
+WRITER_SUFFIXES = {".png": "PNG", ".tif": "TIFF", ".tiff": "TIFF"}
+
+
+def open_writer(
+    path: Path | BinaryIO,
+    width: int,
+    height: int,
+    mode: str = "RGBA",
+    dpi: tuple[float, float] | None = None,
+    icc_profile: bytes | None = None,
+    options: WriteOptions = WriteOptions(),
+    format: str | None = None,
+) -> "PngStreamWriter | TiffStreamWriter":
+    """
+    Writer en flux adapté à l'extension de `path` (.png ou .tif/.tiff), ou à `format`
+    ("PNG", "TIFF") pour un objet fichier binaire (io.BytesIO…, avec seek pour le TIFF).
+    """
+    kind = format.upper() if format else WRITER_SUFFIXES.get(Path(path).suffix.lower())
+    if kind == "PNG":
+        if mode not in _PNG_COLOR_TYPES:
+            raise ValueError(f"Le PNG ne peut pas stocker une image {mode} — utiliser une sortie .tif")
+        return PngStreamWriter(
+            path, width, height, mode=mode, dpi=dpi, icc_profile=icc_profile,
+            compress_level=options.compress_level, threads=options.workers,
+        )
+    if kind == "TIFF":
+        return TiffStreamWriter(
+            path, width, height, mode=mode, dpi=dpi, icc_profile=icc_profile,
+            compression=options.compression, compress_level=options.compress_level,
+            tile=options.tile, threads=options.workers, bigtiff=options.bigtiff,
+        )
+    raise ValueError(f"Format de sortie non géré en flux : {format or Path(path).name} (.png, .tif)")